@@ -0,0 +1,159 @@
+import array
+import statistics
+
+from .LoadReport import LoadReport
+
+class Benchmark:
+    """
+    The samples of a procedure repeated with `"repeat": {"n": 20, "warmup": 3}`.
+    The warmup repetitions are not recorded. The measured times are kept in a float array of ms
+    and summarized into min/median/mean/p95/max/stddev, one of which is checked against `expectTime`.
+    """
+
+    # the statistics expectTime can be checked against
+    statisticNames = ['min', 'median', 'mean', 'p95', 'max']
+
+    # how the browser is brought back to the state before the first repetition
+    resets = ['none', 'reload', 'state']
+
+    def __init__(self, repeat):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        repeat : int | dict
+            The `repeat` property of a procedure, see getOptions
+        """
+
+        options = self.getOptions(repeat)
+
+        self.n = options['n']
+        self.warmup = options['warmup']
+        self.statistic = options['statistic']
+        self.reset = options['reset']
+        self.samples = array.array('d')
+
+    @classmethod
+    def getOptions(cls, repeat):
+        """
+        Normalize the `repeat` property of a procedure
+
+        Parameters
+        ----------
+        repeat : int | dict
+            The number of measured repetitions, or {'n', 'warmup' (default 0), 'statistic' (default median), 'reset' (default none)}
+
+        Return
+        ----------
+        dict
+        The options
+
+        Raises
+        ----------
+        ValueError
+        If an option is invalid
+        """
+
+        if not isinstance(repeat, dict):
+            repeat = {'n': repeat}
+
+        options = {
+            'n': repeat.get('n'),
+            'warmup': repeat.get('warmup', 0),
+            'statistic': repeat.get('statistic', 'median'),
+            'reset': repeat.get('reset', 'none'),
+        }
+
+        if not isinstance(options['n'], int) or isinstance(options['n'], bool) or options['n'] < 1:
+            raise ValueError("repeat n must be a positive integer")
+
+        if not isinstance(options['warmup'], int) or isinstance(options['warmup'], bool) or options['warmup'] < 0:
+            raise ValueError("repeat warmup must be a non-negative integer")
+
+        if options['statistic'] not in cls.statisticNames:
+            raise ValueError("repeat statistic must be one of " + ', '.join(cls.statisticNames))
+
+        if options['reset'] not in cls.resets:
+            raise ValueError("repeat reset must be one of " + ', '.join(cls.resets))
+
+        return options
+
+    def getRepetitions(self):
+        """
+        Get the number of repetitions including the warmup
+
+        Return
+        ----------
+        int
+        The number of repetitions
+        """
+
+        return self.warmup + self.n
+
+    def add(self, repetition, timeConsumption):
+        """
+        Record the time of a repetition
+
+        Parameters
+        ----------
+        repetition : int
+            The index of the repetition, the first `warmup` ones are not recorded
+
+        timeConsumption : number
+            The time in ms
+        """
+
+        if repetition >= self.warmup:
+            self.samples.append(timeConsumption)
+
+    def summarize(self):
+        """
+        Summarize the recorded samples
+
+        Return
+        ----------
+        dict
+        The options, the samples and their statistics in ms, or None if no sample was recorded
+        """
+
+        if len(self.samples) == 0:
+            return None
+
+        ordered = sorted(self.samples)
+
+        result = {
+            'n': len(self.samples),
+            'warmup': self.warmup,
+            'statistic': self.statistic,
+            'samples': self.samples,
+            'min': round(ordered[0], 2),
+            'median': round(statistics.median(ordered), 2),
+            'mean': round(statistics.fmean(ordered), 2),
+            'p95': round(LoadReport.percentile(ordered, 95), 2),
+            'max': round(ordered[-1], 2),
+            'stddev': round(statistics.stdev(ordered), 2) if len(ordered) > 1 else 0.0,
+        }
+
+        result['value'] = result[self.statistic]
+
+        return result
+
+    @staticmethod
+    def format(result):
+        """
+        Format a summary for the log
+
+        Parameters
+        ----------
+        result : dict
+            The result of summarize()
+
+        Return
+        ----------
+        string
+        The formatted statistics
+        """
+
+        return ("n=" + str(result['n']) + " (+" + str(result['warmup']) + " warmup) min " + str(result['min']) + " | median " + str(result['median'])
+            + " | p95 " + str(result['p95']) + " | max " + str(result['max']) + " | stddev " + str(result['stddev']) + " ms")
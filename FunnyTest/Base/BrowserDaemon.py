@@ -0,0 +1,558 @@
+import json
+import time
+import uuid
+import shutil
+import tempfile
+import threading
+import subprocess
+import urllib.request
+import urllib.error
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from ..Log.TestLog import TestLog
+
+class BrowserDaemon:
+    """
+    Long-running local daemon keeping a pool of pre-launched headless Chrome instances with remote debugging enabled.
+    FunnyTestBase processes lease a browser over HTTP and attach to it through its debuggerAddress instead of launching one.
+    Crashed browsers and browsers returned unhealthy are replaced; leases which are neither renewed nor returned in time are reclaimed.
+
+    HTTP API (on 127.0.0.1):
+        POST /acquire              -> {"lease": id, "debuggerAddress": "127.0.0.1:port"}, 503 if no browser is idle
+        POST /renew?lease=id       -> 404 if the lease is unknown, e.g. reclaimed
+        POST /release?lease=id&healthy=0|1
+        GET  /status
+    """
+
+    chromeBinaries = ['google-chrome', 'google-chrome-stable', 'chromium', 'chromium-browser', 'chrome']
+
+    def __init__(self, browsers = 2, port = 8765, firstDebugPort = 9300, windowSize = "1920,1080", chromeBinary = None, healthInterval = 5, leaseTimeOut = 3600):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        browsers : int
+            The number of browsers kept in the pool
+
+        port : int
+            The port of the HTTP API
+
+        firstDebugPort : int
+            The remote debugging port of the first browser. The next browsers use the following ports.
+
+        windowSize : string
+            The window size of the browsers
+
+        chromeBinary : string
+            The Chrome executable. If None, it is searched in PATH.
+
+        healthInterval : number
+            The seconds between two health checks of the browsers
+
+        leaseTimeOut : number
+            The seconds after which a browser whose lease was neither renewed nor returned is reclaimed and replaced
+        """
+
+        self.port = port
+        self.windowSize = windowSize
+        self.chromeBinary = chromeBinary if chromeBinary is not None else self.findChrome()
+        self.healthInterval = healthInterval
+        self.leaseTimeOut = leaseTimeOut
+        self.lock = threading.Lock()
+        self.stopEvent = threading.Event()
+        self.logUtil = TestLog()
+        self.server = None
+
+        # debug port -> {'process', 'profile', 'lease', 'leasedAt'}
+        self.browsers = dict((firstDebugPort + idx, None) for idx in range(browsers))
+
+        # the debug ports of the browsers being probed or replaced outside the lock
+        self.reserved = set()
+
+    def findChrome(self):
+        """
+        Find the Chrome executable in PATH
+
+        Return
+        ----------
+        string
+        The path of the executable
+        """
+
+        for name in self.chromeBinaries:
+            path = shutil.which(name)
+
+            if path is not None:
+                return path
+
+        raise RuntimeError("Chrome executable not found. Please set chromeBinary.")
+
+    def launch(self, debugPort):
+        """
+        Launch a headless browser listening on a remote debugging port
+
+        Parameters
+        ----------
+        debugPort : int
+            The remote debugging port
+        """
+
+        profile = tempfile.mkdtemp(prefix = 'funnytest-daemon-')
+        process = subprocess.Popen([
+            self.chromeBinary,
+            '--headless',
+            '--no-sandbox',
+            '--disable-gpu',
+            '--no-first-run',
+            '--window-size=' + self.windowSize,
+            '--remote-debugging-port=' + str(debugPort),
+            '--user-data-dir=' + profile,
+            'about:blank',
+        ], stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL)
+
+        self.browsers[debugPort] = {'process': process, 'profile': profile, 'lease': None, 'leasedAt': None}
+
+        # wait until the debugging port answers, so the browser can be attached to right away
+        deadline = time.monotonic() + 15
+
+        while not self.isHealthy(debugPort) and time.monotonic() < deadline and process.poll() is None:
+            time.sleep(0.1)
+
+    def terminate(self, debugPort):
+        """
+        Stop a browser and remove its profile
+
+        Parameters
+        ----------
+        debugPort : int
+            The remote debugging port
+        """
+
+        browser = self.browsers[debugPort]
+
+        if browser is None:
+            return
+
+        browser['process'].kill()
+        browser['process'].wait()
+        shutil.rmtree(browser['profile'], ignore_errors = True)
+        self.browsers[debugPort] = None
+
+    def replace(self, debugPort):
+        """
+        Replace a browser with a new one
+
+        Parameters
+        ----------
+        debugPort : int
+            The remote debugging port
+        """
+
+        self.terminate(debugPort)
+        self.launch(debugPort)
+
+    def isHealthy(self, debugPort):
+        """
+        Check if a browser is running and answers on its debugging port
+
+        Parameters
+        ----------
+        debugPort : int
+            The remote debugging port
+
+        Return
+        ----------
+        bool
+        Return True if healthy.
+        Otherwise False.
+        """
+
+        browser = self.browsers[debugPort]
+
+        if browser is None or browser['process'].poll() is not None:
+            return False
+
+        try:
+            with urllib.request.urlopen('http://127.0.0.1:' + str(debugPort) + '/json/version', timeout = 5) as response:
+                return response.status == 200
+        except (urllib.error.URLError, OSError):
+            return False
+
+    def closeExtraTabs(self, debugPort):
+        """
+        Close all page targets of a browser but one, through the DevTools HTTP endpoints
+
+        Parameters
+        ----------
+        debugPort : int
+            The remote debugging port
+        """
+
+        base = 'http://127.0.0.1:' + str(debugPort)
+
+        try:
+            with urllib.request.urlopen(base + '/json/list', timeout = 5) as response:
+                pages = [target for target in json.loads(response.read().decode('utf-8')) if target.get('type') == 'page']
+
+            for page in pages[1:]:
+                urllib.request.urlopen(base + '/json/close/' + page['id'], timeout = 5).close()
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            self.logUtil.log("Tabs of browser " + str(debugPort) + " not closed: " + str(e), 'warning')
+
+    def acquire(self):
+        """
+        Lease an idle healthy browser
+
+        Return
+        ----------
+        dict
+        {'lease', 'debuggerAddress'}, or None if no browser is idle
+        """
+
+        # the slot is reserved under the lock, the health probe and the relaunch run outside it
+        with self.lock:
+            debugPort = None
+
+            for port in self.browsers:
+                browser = self.browsers[port]
+
+                if browser is not None and browser['lease'] is None and port not in self.reserved:
+                    debugPort = port
+                    self.reserved.add(port)
+                    break
+
+        if debugPort is None:
+            return None
+
+        try:
+            if not self.isHealthy(debugPort):
+                self.replace(debugPort)
+        except Exception:
+            with self.lock:
+                self.reserved.discard(debugPort)
+            raise
+
+        with self.lock:
+            self.reserved.discard(debugPort)
+            browser = self.browsers[debugPort]
+            browser['lease'] = uuid.uuid4().hex
+            browser['leasedAt'] = time.time()
+
+        return {'lease': browser['lease'], 'debuggerAddress': '127.0.0.1:' + str(debugPort)}
+
+    def renew(self, lease):
+        """
+        Extend a lease, telling the daemon its client is still using the browser
+
+        Parameters
+        ----------
+        lease : string
+            The lease id
+
+        Return
+        ----------
+        bool
+        Return True if the lease existed.
+        Otherwise False.
+        """
+
+        with self.lock:
+            for (debugPort, browser) in self.browsers.items():
+                if browser is not None and browser['lease'] == lease and debugPort not in self.reserved:
+                    browser['leasedAt'] = time.time()
+                    return True
+
+        return False
+
+    def release(self, lease, healthy = True):
+        """
+        Return a leased browser to the pool
+
+        Parameters
+        ----------
+        lease : string
+            The lease id
+
+        healthy : bool
+            False if the client saw the browser misbehave. It is replaced then.
+
+        Return
+        ----------
+        bool
+        Return True if the lease existed.
+        Otherwise False.
+        """
+
+        with self.lock:
+            debugPort = None
+
+            for port in self.browsers:
+                browser = self.browsers[port]
+
+                if browser is not None and browser['lease'] == lease and port not in self.reserved:
+                    debugPort = port
+                    self.reserved.add(port)
+                    break
+
+        if debugPort is None:
+            return False
+
+        try:
+            if healthy and self.isHealthy(debugPort):
+                self.closeExtraTabs(debugPort)
+            else:
+                self.logUtil.log("Replacing browser " + str(debugPort) + ".", 'warning')
+                self.replace(debugPort)
+        finally:
+            with self.lock:
+                self.reserved.discard(debugPort)
+                browser = self.browsers[debugPort]
+
+                if browser is not None:
+                    browser['lease'] = None
+                    browser['leasedAt'] = None
+
+        return True
+
+    def status(self):
+        """
+        Get the state of the pool
+
+        Return
+        ----------
+        dict
+        The state of each browser
+        """
+
+        with self.lock:
+            return dict((str(debugPort), {
+                'running': browser is not None and browser['process'].poll() is None,
+                'leased': browser is not None and browser['lease'] is not None,
+            }) for (debugPort, browser) in self.browsers.items())
+
+    def checkHealth(self):
+        """
+        Replace crashed idle browsers and reclaim expired leases
+        """
+
+        expired = []
+        idle = []
+
+        with self.lock:
+            for debugPort in self.browsers:
+                browser = self.browsers[debugPort]
+
+                if debugPort in self.reserved:
+                    continue
+
+                if browser is not None and browser['lease'] is not None:
+                    if time.time() - browser['leasedAt'] > self.leaseTimeOut:
+                        expired.append(debugPort)
+                        self.reserved.add(debugPort)
+
+                    continue
+
+                idle.append(debugPort)
+                self.reserved.add(debugPort)
+
+        # probed and replaced outside the lock, one at a time, so the other browsers can be leased meanwhile
+        for debugPort in expired + idle:
+            try:
+                if debugPort in expired:
+                    self.logUtil.log("Lease of browser " + str(debugPort) + " expired.", 'warning')
+                    self.replace(debugPort)
+                elif not self.isHealthy(debugPort):
+                    self.logUtil.log("Browser " + str(debugPort) + " is not healthy. Replacing it.", 'warning')
+                    self.replace(debugPort)
+            finally:
+                with self.lock:
+                    self.reserved.discard(debugPort)
+
+    def serve(self):
+        """
+        Launch the browsers and serve the HTTP API until stop() is called or KeyboardInterrupt
+        """
+
+        with self.lock:
+            for debugPort in self.browsers:
+                self.launch(debugPort)
+
+        daemon = self
+
+        class Handler(BrowserDaemonHandler):
+            browserDaemon = daemon
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', self.port), Handler)
+        serverThread = threading.Thread(target = self.server.serve_forever, daemon = True)
+        serverThread.start()
+
+        self.logUtil.log("Browser daemon listening on 127.0.0.1:" + str(self.port) + " with " + str(len(self.browsers)) + " browsers.", 'success')
+
+        try:
+            while not self.stopEvent.wait(self.healthInterval):
+                self.checkHealth()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.server.shutdown()
+
+            with self.lock:
+                for debugPort in self.browsers:
+                    self.terminate(debugPort)
+
+    def stop(self):
+        """
+        Make serve() return
+        """
+
+        self.stopEvent.set()
+
+class BrowserDaemonHandler(BaseHTTPRequestHandler):
+    """
+    The HTTP handler of the BrowserDaemon API
+    """
+
+    browserDaemon = None
+
+    def sendJSON(self, status, content):
+        """
+        Send a json response
+        """
+
+        body = json.dumps(content).encode('utf-8')
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def getQuery(self):
+        """
+        Parse the query string of the request path
+        """
+
+        query = {}
+
+        if '?' in self.path:
+            for pair in self.path.split('?', 1)[1].split('&'):
+                if '=' in pair:
+                    (key, value) = pair.split('=', 1)
+                    query[key] = value
+
+        return query
+
+    def do_GET(self):
+        if self.path.startswith('/status'):
+            self.sendJSON(200, self.browserDaemon.status())
+        else:
+            self.sendJSON(404, {'error': 'not found'})
+
+    def do_POST(self):
+        if self.path.startswith('/acquire'):
+            lease = self.browserDaemon.acquire()
+
+            if lease is None:
+                self.sendJSON(503, {'error': 'no idle browser'})
+            else:
+                self.sendJSON(200, lease)
+
+        elif self.path.startswith('/renew'):
+            if self.browserDaemon.renew(self.getQuery().get('lease')):
+                self.sendJSON(200, {'renewed': True})
+            else:
+                self.sendJSON(404, {'error': 'unknown lease'})
+
+        elif self.path.startswith('/release'):
+            query = self.getQuery()
+
+            if self.browserDaemon.release(query.get('lease'), query.get('healthy', '1') == '1'):
+                self.sendJSON(200, {'released': True})
+            else:
+                self.sendJSON(404, {'error': 'unknown lease'})
+
+        else:
+            self.sendJSON(404, {'error': 'not found'})
+
+    def log_message(self, format, *args):
+        pass
+
+class BrowserDaemonClient:
+    """
+    Client of the BrowserDaemon HTTP API
+    """
+
+    def __init__(self, address, waitTimeOut = 300):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        address : string
+            The "host:port" of the daemon
+
+        waitTimeOut : number
+            The seconds acquire() waits for an idle browser
+        """
+
+        self.address = address
+        self.waitTimeOut = waitTimeOut
+
+    def request(self, path):
+        """
+        Send a POST request to the daemon and parse the json response
+        """
+
+        request = urllib.request.Request('http://' + self.address + path, data = b'', method = 'POST')
+
+        with urllib.request.urlopen(request, timeout = 30) as response:
+            return json.loads(response.read().decode('utf-8'))
+
+    def acquire(self):
+        """
+        Lease a browser, waiting until one is idle
+
+        Return
+        ----------
+        dict
+        {'lease', 'debuggerAddress'}
+        """
+
+        deadline = time.monotonic() + self.waitTimeOut
+
+        while True:
+            try:
+                return self.request('/acquire')
+            except urllib.error.HTTPError as e:
+                if e.code != 503 or time.monotonic() > deadline:
+                    raise
+
+            time.sleep(0.5)
+
+    def renew(self, lease):
+        """
+        Extend a lease
+
+        Parameters
+        ----------
+        lease : string
+            The lease id
+        """
+
+        self.request('/renew?lease=' + lease)
+
+    def release(self, lease, healthy = True):
+        """
+        Return a leased browser
+
+        Parameters
+        ----------
+        lease : string
+            The lease id
+
+        healthy : bool
+            False if the browser should be replaced
+        """
+
+        self.request('/release?lease=' + lease + '&healthy=' + ('1' if healthy else '0'))
@@ -0,0 +1,123 @@
+import os
+import json
+import time
+import threading
+
+from ..Log.TestLog import TestLog
+
+class BrowserStateStore:
+    """
+    Keeps the browser states (url, cookies, localStorage, sessionStorage) captured after state producing
+    subprocedures, together with the results of those subprocedures, so later sessions can skip them.
+    States expire after their TTL and can optionally be persisted to a json file.
+    """
+
+    def __init__(self, path = None, defaultTTL = 1800):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        path : string
+            The json file to persist the states in. If None, states only live in memory.
+
+        defaultTTL : number
+            The seconds a state stays valid when the producer does not give a TTL
+        """
+
+        self.path = path
+        self.defaultTTL = defaultTTL
+        self.states = {}
+        self.lock = threading.Lock()
+        self.logUtil = TestLog()
+
+        if path is not None and os.path.isfile(path):
+            try:
+                with open(path, 'r') as stateFile:
+                    self.states = json.load(stateFile)
+            except ValueError as e:
+                self.logUtil.log("Ignoring broken state file " + path + ": " + str(e), 'warning')
+
+    def get(self, name):
+        """
+        Get a saved state which is not expired
+
+        Parameters
+        ----------
+        name : string
+            The name of the state producing subprocedure
+
+        Return
+        ----------
+        dict
+        The saved entry {'state', 'results', 'expireAt'}, or None
+        """
+
+        with self.lock:
+            entry = self.states.get(name)
+
+            if entry is not None and entry['expireAt'] <= time.time():
+                del self.states[name]
+                entry = None
+
+            return entry
+
+    def put(self, name, state, results, ttl = None):
+        """
+        Save a state
+
+        Parameters
+        ----------
+        name : string
+            The name of the state producing subprocedure
+
+        state : dict
+            The browser state returned by FunnyTestBase.getBrowserState
+
+        results : dict
+            The results of the subprocedure's procedures, keyed by their relative id
+
+        ttl : number
+            The seconds the state stays valid
+        """
+
+        with self.lock:
+            self.states[name] = {
+                'state': state,
+                'results': results,
+                'expireAt': time.time() + (ttl if ttl is not None else self.defaultTTL),
+            }
+
+            self.persist()
+
+    def invalidate(self, name):
+        """
+        Drop a saved state
+
+        Parameters
+        ----------
+        name : string
+            The name of the state producing subprocedure
+        """
+
+        with self.lock:
+            if self.states.pop(name, None) is not None:
+                self.logUtil.log("Saved state of " + name + " invalidated.", 'warning')
+                self.persist()
+
+    def persist(self):
+        """
+        Write the states to the state file. Must be called with the lock held.
+        """
+
+        if self.path is None:
+            return
+
+        try:
+            content = json.dumps(self.states)
+        except (TypeError, ValueError) as e:
+            self.logUtil.log("States not persisted: " + str(e), 'warning')
+            return
+
+        with open(self.path, 'w') as stateFile:
+            stateFile.write(content)
@@ -0,0 +1,251 @@
+import os
+import json
+import threading
+
+from ..Log.TestLog import TestLog
+
+class Checkpoint:
+    """
+    Append-only JSON Lines file recording the progress of the runs: completed top-level procedures,
+    completed iterations of top-level loops, the results stored by them, the outcomes of their cases, the browser state after them
+    and completed runs. A later invocation with resume picks each run up at its first unfinished procedure.
+
+    Only JSON serializable results are recorded. Results such as web elements or generators are skipped.
+    """
+
+    def __init__(self, path, resume = False):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        path : string
+            The checkpoint file
+
+        resume : bool
+            Load the progress recorded in the file. Otherwise the file is started anew.
+        """
+
+        self.path = path
+        self.lock = threading.Lock()
+        self.logUtil = TestLog()
+        self.runs = {}
+        self.skippedKeys = set()
+
+        if resume and os.path.isfile(path):
+            self.load()
+        else:
+            open(path, 'w').close()
+
+    def load(self):
+        """
+        Load the progress recorded in the file
+        """
+
+        with open(self.path, 'r') as checkpointFile:
+            for line in checkpointFile:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # the last line can be cut off if the process died while writing it
+                    continue
+
+                run = self.runs.setdefault(record['run'], {'done': False, 'step': -1, 'loops': {}, 'results': {}, 'state': None, 'cases': {'successful': 0, 'failed': []}})
+                cases = record.get('cases', {})
+                run['cases']['successful'] += cases.get('successful', 0)
+                run['cases']['failed'].extend(cases.get('failed', []))
+
+                if record.get('done'):
+                    run['done'] = True
+                    continue
+
+                if 'loop' in record:
+                    run['loops'].setdefault(record['loop'], set()).add(record['iteration'])
+                else:
+                    run['step'] = max(run['step'], record['step'])
+
+                run['results'].update(record['results'])
+
+                if record.get('state') is not None:
+                    run['state'] = record['state']
+
+        if len(self.runs) > 0:
+            self.logUtil.log("Checkpoint " + self.path + " loaded: " + str(len(self.runs)) + " runs started before.", 'success')
+
+    def getRun(self, runName):
+        """
+        Get the recorded progress of a run
+
+        Parameters
+        ----------
+        runName : string
+            The run name
+
+        Return
+        ----------
+        dict
+        {'done', 'step' (the last completed top-level index), 'loops' (the completed iterations of each loop id),
+        'results', 'state', 'cases' ({'successful': count, 'failed': failed cases})}, or None if nothing was recorded
+        """
+
+        return self.runs.get(runName)
+
+    def isRunDone(self, runName):
+        """
+        Check if a run was completed
+
+        Parameters
+        ----------
+        runName : string
+            The run name
+
+        Return
+        ----------
+        bool
+        Return True if the run was completed.
+        Otherwise False.
+        """
+
+        return runName in self.runs and self.runs[runName]['done']
+
+    def getSerializable(self, results):
+        """
+        Keep the results which can be written to json
+
+        Parameters
+        ----------
+        results : dict
+            The results by id
+
+        Return
+        ----------
+        dict
+        The serializable results
+        """
+
+        serializable = {}
+
+        for (key, value) in results.items():
+            try:
+                json.dumps(value)
+                serializable[key] = value
+            except (TypeError, ValueError):
+                if key not in self.skippedKeys:
+                    self.skippedKeys.add(key)
+                    self.logUtil.log("Result " + key + " can not be checkpointed and is not restored on resume.", 'warning')
+
+        return serializable
+
+    def getCases(self, cases):
+        """
+        Convert the cases validated since the previous record for the file
+
+        Parameters
+        ----------
+        cases : dict
+            {'successful': the successful cases, 'failed': the failed cases}, or None
+
+        Return
+        ----------
+        dict
+        {'successful': the number of successful cases, 'failed': the id and test result of each failed case}
+        """
+
+        if cases is None:
+            return {'successful': 0, 'failed': []}
+
+        # returns which can not be written to json are kept as their repr, they are only printed in the summary
+        failed = [json.loads(json.dumps({'id': case['id'], 'testResult': case['testResult']}, default = repr)) for case in cases['failed']]
+
+        return {'successful': len(cases['successful']), 'failed': failed}
+
+    def write(self, record):
+        """
+        Append a record to the file
+
+        Parameters
+        ----------
+        record : dict
+            The record
+        """
+
+        line = json.dumps(record) + '\n'
+
+        with self.lock:
+            with open(self.path, 'a') as checkpointFile:
+                checkpointFile.write(line)
+
+    def recordStep(self, runName, stepIdx, results, state, cases = None):
+        """
+        Record a completed top-level procedure
+
+        Parameters
+        ----------
+        runName : string
+            The run name
+
+        stepIdx : int
+            The index of the procedure in the run
+
+        results : dict
+            The results stored since the previous record
+
+        state : dict
+            The browser state after the procedure, or None
+
+        cases : dict
+            The successful and failed cases validated since the previous record
+        """
+
+        self.write({'run': runName, 'step': stepIdx, 'results': self.getSerializable(results), 'state': state, 'cases': self.getCases(cases)})
+
+    def recordIteration(self, runName, loopId, idx, results, state, cases = None):
+        """
+        Record a completed iteration of a top-level loop
+
+        Parameters
+        ----------
+        runName : string
+            The run name
+
+        loopId : string
+            The id of the loop procedure
+
+        idx : int
+            The index of the iteration
+
+        results : dict
+            The results stored since the previous record
+
+        state : dict
+            The browser state after the iteration, or None
+
+        cases : dict
+            The successful and failed cases validated since the previous record
+        """
+
+        self.write({'run': runName, 'loop': loopId, 'iteration': idx, 'results': self.getSerializable(results), 'state': state, 'cases': self.getCases(cases)})
+
+    def recordRunDone(self, runName, cases = None):
+        """
+        Record a completed run
+
+        Parameters
+        ----------
+        runName : string
+            The run name
+
+        cases : dict
+            The successful and failed cases validated since the previous record, e.g. the leak check of the run
+        """
+
+        self.write({'run': runName, 'done': True, 'cases': self.getCases(cases)})
+
+    def remove(self):
+        """
+        Remove the file once every run is completed
+        """
+
+        with self.lock:
+            if os.path.isfile(self.path):
+                os.remove(self.path)
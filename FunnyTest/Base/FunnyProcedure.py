@@ -1,11 +1,18 @@
-import os
-import sys
 import time
 import re
-import importlib
 import builtins
 import copy
-from .FunnyTestBase import FunnyTestBase
+import json
+import hashlib
+from .Watchdog import Watchdog
+from .BrowserStateStore import BrowserStateStore
+from .ResultCache import ResultCache
+from .ProcedureRegistry import ProcedureRegistry
+from .ResultLifetime import ResultLifetime
+from .ResultStore import ResultStore
+from .LoopSource import LoopSource
+from .Benchmark import Benchmark
+from .LeakCheck import LeakCheck
 from ..Log.TestLog import TestLog
 
 class FunnyProcedure:
@@ -13,149 +20,1216 @@ class FunnyProcedure:
     The class containing functions for different test procedures
     """
 
-    def __init__(self, isHeadLess = False, windowSize = "1920,1080"):
+    # the reference to another procedure's result. group 1 is the procedure id, dotted for namespaced results
+    # and with `*` for the iteration indexes of an aggregate over a loop
+    resultPattern = r'%result\[\"?\'?([\w.*]+)\'?\"?\]%'
+
+    # the reference to a field of the dataset row of the run. group 1 is the field name
+    dataPattern = r'%data\[\"?\'?(\w+)\'?\"?\]%'
+
+    def __init__(self, isHeadLess = False, windowSize = "1920,1080", stepTimeOut = None, runTimeBudget = None, summaries = None, stateStore = None, resultCache = None, funnyTestBase = None, releaseResults = True, daemonAddress = None, monitorInterval = None, recycleRSS = None, recycleCPU = None, metrics = None, thinkTime = None, stepRecorder = None, checkpoint = None, updateBaselines = False, profileTemplate = None, profiler = None, prefixTree = None, startMode = "eager", resultRecord = None, throttle = None, leakCheck = None, casePath = None):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        isHeadLess : bool
+            set the browser to headless mode
+
+        windowSize : string
+            set the window size for headless mode
+
+        stepTimeOut : number
+            The default seconds a std/custom procedure may take before the watchdog kills the browser session.
+            Can be overridden by the `timeOut` property of a procedure. None means no limit.
+
+        runTimeBudget : number
+            The seconds a whole run may take. The remaining procedures are skipped when it is used up. None means no limit.
+
+        summaries : dict
+            The dict to collect the summaries in. Allows several instances to share one summary.
+
+        stateStore : object
+            The BrowserStateStore keeping the states of `saveState` subprocedures. Allows several instances to share the states.
+
+        resultCache : object
+            The ResultCache keeping the results of `cache` subprocedures. Allows several instances to share the results.
+
+        funnyTestBase : object
+            An already running FunnyTestBase to use. It is reset but not closed at the end of the run.
+            If None, a new browser is started and closed at the end of the run.
+
+        releaseResults : bool
+            Release each stored result as soon as no later procedure of the run can reference it.
+            Set to False to keep all results in returnList until the end.
+
+        daemonAddress : string
+            The "host:port" of a BrowserDaemon to lease the browser from, instead of launching one
+
+        monitorInterval : number
+            The seconds between two samples of the RSS and CPU of the browser's process tree. None disables the monitoring.
+
+        recycleRSS : number
+            The RSS in MB above which the browser session is recycled between two procedures
+
+        recycleCPU : number
+            The CPU percent (of one core) the latest samples may average before the browser session is recycled
+
+        metrics : object
+            The Metrics collecting the live step counters and latencies. None disables them.
+
+        thinkTime : number
+            The seconds to pause after each top-level procedure, like a user reading the page. Used by load tests.
+
+        stepRecorder : object
+            An object whose recordResult(procedureDict, validationResult, runName) is called for every saved result, e.g. a LoadReport
+
+        checkpoint : object
+            The Checkpoint recording the progress of the runs, and resuming them if it was loaded from a previous invocation
+
+        updateBaselines : bool
+            Replace the baseline images of compareScreenshot with the new screenshots
+
+        profileTemplate : object
+            The ProfileTemplate (or its path) the started browser uses a clone of
+
+        profiler : object
+            The Profiler sampling the Python code of the procedures. None disables the profiling.
+
+        prefixTree : object
+            The PrefixTree of the runs sharing their leading procedures. A run forks from the browser state and results
+            of the run owning its shared procedures instead of executing them.
+
+        startMode : string
+            When the browser started by this instance is started: "eager" at once, "background" in a thread while the procedures are
+            prepared, or "lazy" before the first procedure needing it
+
+        resultRecord : object
+            The ResultRecord every validated step is written to with its resolved params and raw return. None disables the recording.
+
+        throttle : string | dict
+            The Throttling preset or profile of the runs without their own, see setRunThrottle. None does not throttle them.
+
+        leakCheck : bool | dict
+            Sample the JS heap, DOM nodes and event listeners of the page after each top-level procedure and fail the run's `leakCheck`
+            case if one of them keeps growing, see LeakCheck.getOptions. None disables it, loops can still have their own `leakCheck`.
+
+        casePath : string
+            The test case folder the file sources of loops and the baselines of compareScreenshot are relative to.
+            None resolves them against the working directory.
+        """
+
+        self.ownsBrowser = funnyTestBase is None
+
+        if funnyTestBase is None:
+            funnyTestBase = self.createBrowser(isHeadLess, windowSize, daemonAddress, profileTemplate, startMode)
+
         self.returnList = {}
-        self.funnyTestBase = FunnyTestBase(isHeadLess, windowSize)
-        self.customFuncMods = []
-        self.summaries = {}
+        self.funnyTestBase = funnyTestBase
+        self.procedureRegistries = []
+        self.summaries = summaries if summaries is not None else {}
         self.logUtil = TestLog()
         self.subprocedureList = {}
+        self.stepTimeOut = stepTimeOut
+        self.runTimeBudget = runTimeBudget
+        self.runDeadlines = {}
+        self.watchdog = None
+        self.stateStore = stateStore if stateStore is not None else BrowserStateStore()
+        self.resultCache = resultCache if resultCache is not None else ResultCache()
+        self.releaseResults = releaseResults
+        self.resultLifetimes = {}
+        self.dataRows = {}
+        self.recycleRSS = recycleRSS
+        self.recycleCPU = recycleCPU
+        self.metrics = metrics
+        self.thinkTime = thinkTime
+        self.stepRecorder = stepRecorder
+        self.checkpoint = checkpoint
+        self.checkpointResults = {}
+        self.checkpointCases = {}
+        self.profiler = profiler
+        self.prefixTree = prefixTree
+        self.forkPoints = {}
+        self.forkResults = {}
+        self.resultRecord = resultRecord
+        self.throttle = throttle
+        self.runThrottles = {}
+        self.leakCheck = leakCheck
+        self.leakChecks = {}
+        self.casePath = casePath
+
+        if self.funnyTestBase is not None:
+            self.funnyTestBase.updateBaselines = updateBaselines
+            self.funnyTestBase.casePath = casePath
+
+        if monitorInterval is not None:
+            self.funnyTestBase.startMonitor(monitorInterval)
+
+    def createBrowser(self, isHeadLess, windowSize, daemonAddress, profileTemplate, startMode):
+        """
+        Create the FunnyTestBase of an instance which was not given one
+
+        Parameters
+        ----------
+        isHeadLess, windowSize, daemonAddress, profileTemplate, startMode :
+            The same as the constructor
+
+        Return
+        ----------
+        object
+        The FunnyTestBase
+        """
+
+        # selenium is only imported once a browser is needed
+        from .FunnyTestBase import FunnyTestBase
+
+        return FunnyTestBase(isHeadLess, windowSize, daemonAddress, profileTemplate, startMode = startMode)
+
+    def parseShortCode(self, param, runName, procedureDict):
+        """
+        Parse short codes
+
+        Parameters
+        ----------
+        param : string
+            The original param string
+
+        runName : string
+            The run name
+
+        procedureDict : dict
+            The procedure definition where the param is from
+
+        Return
+        ----------
+        any
+        The result params
+        """
+
+        if isinstance(param, str) and len(param) > 2:
+
+            # Check for %loopParam%
+            # Check for %result[procedureID]%
+            match = re.search(r'(.*)%loopParam%(.*)', param)
+
+            if match != None and len(match.groups()) >= 1:
+
+                if 'loopParam' in procedureDict:
+
+                    if not isinstance(procedureDict['loopParam'], str):
+                        return procedureDict['loopParam']
+
+                    prefix = match.group(1)
+                    resVal = prefix + procedureDict['loopParam']
+
+                    if len(match.groups()) > 1:
+                        surfix = match.group(2)
+                        resVal = resVal + surfix
+
+                    return resVal
+
+            elif runName in self.dataRows and re.search(self.dataPattern, param) is not None:
+
+                # Check for %data[field]%
+                match = re.search(r'(.*)' + self.dataPattern + r'(.*)', param)
+                row = self.dataRows[runName]
+
+                if match.group(2) in row:
+                    value = row[match.group(2)]
+
+                    if not isinstance(value, str):
+                        return value
+
+                    return match.group(1) + value + match.group(3)
+
+            else:
+
+                # Check for %result[procedureID]%
+                match = re.search(r'(.*)' + self.resultPattern + r'(.*)', param)
+
+                if match != None and len(match.groups()) >= 2:
+                    resKey = match.group(2)
+                    prefix = match.group(1)
+
+                    try:
+                        savedRes = self.returnList[runName].resolve(resKey)
+                    except KeyError:
+                        return param
+
+                    if not isinstance(savedRes, str):
+                        return savedRes
+
+                    resVal = prefix + savedRes
+
+                    if len(match.groups()) > 2:
+                        surfix = match.group(3)
+
+                        if len(surfix) > 0 and type(resVal) == str:
+                            resVal = prefix + resVal + surfix
+
+                    return resVal
+
+        return param
+
+    def generateParams(self, params, runName, procedureDict):
+        """
+        Filter params and replace the elements according to the Funny Test Magic Param rules
+
+        Parameters
+        ----------
+        params : list
+            The original params
+
+        runName : string
+            The run name
+
+        procedureDict : dict
+            The procedure definition where the params are from
+
+        Return
+        ----------
+        list
+        The result params
+        """
+        
+        resParams = []
+        for param in params:
+            resParams.append(self.parseShortCode(param, runName, procedureDict))
+        
+        return resParams
+
+    def loadCustomProcedures(self, path):
+        """
+        Register a directory of custom procedure functions.
+        The modules are imported by the process-wide registry on the first lookup and only reloaded when their files change.
+
+        Parameters
+        ----------
+        path : string
+            The path to the direcotry containing the customized procedures
+        """
+
+        registry = ProcedureRegistry.getRegistry(path)
+        registry.markStale()
+
+        if registry not in self.procedureRegistries:
+            self.procedureRegistries.append(registry)
+            
+    def getFunc(self, funcName):
+        """
+        Find custom procedure functions from the registered directories
+
+        Parameters
+        ----------
+        funcName : string
+            The function name
+        """
+
+        for registry in self.procedureRegistries:
+            func = registry.get(funcName)
+
+            if func is not None:
+                return func
+
+        return None
+
+    def setDataRow(self, runName, row):
+        """
+        Set the dataset row whose fields `%data[field]%` refers to in a run
+
+        Parameters
+        ----------
+        runName : string
+            The run name
+
+        row : dict
+            The dataset row
+        """
+
+        self.dataRows[runName] = row
+
+        if self.resultRecord is not None:
+            self.resultRecord.recordData(runName, row)
+
+    def setRunThrottle(self, runName, throttle):
+        """
+        Set the network and CPU throttling of a run, instead of the one given to the constructor
+
+        Parameters
+        ----------
+        runName : string
+            The run name
+
+        throttle : string | dict
+            The Throttling preset or profile, "none" for no throttling
+        """
+
+        self.runThrottles[runName] = throttle
+
+    def getWatchdog(self):
+        """
+        Get the watchdog of this instance, created on first use
+
+        Return
+        ----------
+        object
+        The watchdog
+        """
+
+        if self.watchdog is None:
+            self.watchdog = Watchdog(lambda label: self.funnyTestBase.kill())
+
+        return self.watchdog
+
+    def isBudgetExhausted(self, runName):
+        """
+        Check if the time budget of a run is used up
+
+        Parameters
+        ----------
+        runName : string
+            The run name
+
+        Return
+        ----------
+        bool
+        Return True if the run has a budget and it is used up.
+        Otherwise False.
+        """
+
+        return runName in self.runDeadlines and time.monotonic() >= self.runDeadlines[runName]
+
+    def getStepTimeOut(self, procedureDict, runName):
+        """
+        Get the seconds a procedure may take, limited by the remaining budget of the run
+
+        Parameters
+        ----------
+        procedureDict : dict
+            The procedure definition
+
+        runName : string
+            The run name
+
+        Return
+        ----------
+        number
+        The seconds, or None if there is no limit
+        """
+
+        timeOut = procedureDict.get('timeOut', self.stepTimeOut)
+
+        if runName in self.runDeadlines:
+            remaining = max(self.runDeadlines[runName] - time.monotonic(), 0)
+
+            if timeOut is None or remaining < timeOut:
+                timeOut = remaining
+
+        return timeOut
+
+    def executeStep(self, func, params, procedureDict, runName):
+        """
+        Call the function of a std/custom procedure under the watchdog, then validate and save its result.
+        If the deadline is exceeded, the browser session is replaced and the procedure is recorded as timed out.
+        With `repeat`, the function is called repeatedly and expectTime is checked against a statistic of the measured calls.
+
+        Parameters
+        ----------
+        func : function
+            The function to call
+
+        params : list
+            The params for the function
+
+        procedureDict : dict
+            The procedure definition
+
+        runName : string
+            The run name
+        """
+
+        id = procedureDict['id']
+        expectValue = procedureDict.get('expect')
+        expectTime = procedureDict.get('expectTime')
+        timedOut = False
+        benchmark = Benchmark(procedureDict['repeat']) if 'repeat' in procedureDict else None
+        repeatState = self.getRepeatState(benchmark)
+
+        timeStampStart = time.time()
+
+        for repetition in range(benchmark.getRepetitions() if benchmark is not None else 1):
+            if repetition > 0:
+                self.resetRepetition(benchmark, repeatState)
+
+            # every repetition gets the time limit
+            timeOut = self.getStepTimeOut(procedureDict, runName)
+            repetitionStart = time.perf_counter()
+
+            if timeOut is not None:
+                self.getWatchdog().arm(timeOut, runName + ': ' + id)
+
+            returnValue = None
+
+            try:
+                returnValue = func(*params)
+            except KeyboardInterrupt:
+                if self.watchdog is None or not self.watchdog.fired:
+                    raise
+            except Exception:
+                # the blocked selenium call fails once the watchdog killed the session
+                if self.watchdog is None or not self.watchdog.fired:
+                    raise
+            finally:
+                if timeOut is not None:
+                    timedOut = self.watchdog.disarm()
+
+            if benchmark is not None:
+                benchmark.add(repetition, (time.perf_counter() - repetitionStart) * 1000)
+
+            if timedOut:
+                break
+
+        self.storeResult(runName, id, returnValue)
+
+        timeConsumption = round((time.time() - timeStampStart) * 1000)
+
+        if timedOut:
+            self.logUtil.log("Error: " + id + " exceeded its time limit of " + str(round(timeOut, 2)) + " s. Replacing the browser session.", 'warning')
+            self.funnyTestBase.restart()
+
+        repeatResult = benchmark.summarize() if benchmark is not None else None
+
+        if repeatResult is not None:
+            timeConsumption = repeatResult['value']
+            self.logUtil.log("Repetitions (ms): " + Benchmark.format(repeatResult))
+
+        validationResult = self.validateExpectValue(expectValue, returnValue, expectTime, timeConsumption)
+        validationResult['timedOut'] = timedOut
+        validationResult['timeOut'] = timeOut
+        validationResult['repeat'] = repeatResult
+        self.logUtil.log("Time consumption (ms): " + str(validationResult['actualTime']))
+
+        # the driver of a custom procedure is not a param of the json file
+        self.saveResult(validationResult, procedureDict, runName, params[1:] if procedureDict['type'] == 'customProcedure' else params)
+
+    def getRepeatState(self, benchmark):
+        """
+        Capture the browser state the repetitions of a procedure are reset to
+
+        Parameters
+        ----------
+        benchmark : object
+            The Benchmark of the procedure, or None if it is not repeated
+
+        Return
+        ----------
+        dict
+        The browser state, or None if the repetitions are not reset to it
+        """
+
+        if benchmark is None or benchmark.reset != 'state':
+            return None
+
+        return self.funnyTestBase.captureBrowserState()
+
+    def resetRepetition(self, benchmark, repeatState):
+        """
+        Bring the browser back before the next repetition of a procedure, outside of the measured time
+
+        Parameters
+        ----------
+        benchmark : object
+            The Benchmark of the procedure
+
+        repeatState : dict
+            The state captured by getRepeatState
+        """
+
+        if benchmark.reset == 'reload':
+            self.funnyTestBase.getDriver().refresh()
+        elif benchmark.reset == 'state' and repeatState is not None:
+            self.funnyTestBase.setBrowserState(repeatState)
+
+    def repeatSubprocedure(self, name, procedureDict, runName):
+        """
+        Run a subprocedure repeatedly and save the statistics of its measured runs as the result of the calling procedure.
+        Only the cases of the last repetition are listed in the summary, the failed cases of all of them.
+
+        Parameters
+        ----------
+        name : string
+            The subprocedure name
+
+        procedureDict : dict
+            The callSubprocedure procedure with `repeat`
+
+        runName : string
+            The run name
+        """
+
+        benchmark = Benchmark(procedureDict['repeat'])
+        repeatState = self.getRepeatState(benchmark)
+        runSummary = self.getRunSummary(runName)
+        repetitions = benchmark.getRepetitions()
+
+        for repetition in range(repetitions):
+            if self.isBudgetExhausted(runName):
+                break
+
+            if repetition > 0:
+                self.resetRepetition(benchmark, repeatState)
+
+                # the next repetition stores its results under the same ids
+                if runName in self.returnList:
+                    for key in self.returnList[runName].getKeysUnder(name):
+                        self.releaseResult(runName, key)
+
+            successfulBefore = len(runSummary['successfulCases'])
+            repetitionStart = time.perf_counter()
+
+            self.runSubprocedure(name, copy.deepcopy(self.subprocedureList[name]), name, runName)
+
+            benchmark.add(repetition, (time.perf_counter() - repetitionStart) * 1000)
+
+            if repetition < repetitions - 1:
+                del runSummary['successfulCases'][successfulBefore:]
+
+        repeatResult = benchmark.summarize()
+
+        if repeatResult is None:
+            return
+
+        self.logUtil.log("Repetitions of " + name + " (ms): " + Benchmark.format(repeatResult))
+
+        validationResult = self.validateExpectValue(None, None, procedureDict.get('expectTime'), repeatResult['value'])
+        validationResult['repeat'] = repeatResult
+        self.saveResult(validationResult, procedureDict, runName)
+
+    def storeResult(self, runName, key, value):
+        """
+        Store the result of a procedure so later procedures can reference it
+
+        Parameters
+        ----------
+        runName : string
+            The run name
+
+        key : string
+            The procedure id
+
+        value : any
+            The result
+        """
+
+        if runName not in self.returnList:
+            self.returnList[runName] = ResultStore()
+
+        self.returnList[runName][key] = value
+
+        if runName in self.resultLifetimes:
+            self.resultLifetimes[runName].onStore(key, value)
+
+        if self.checkpoint is not None:
+            self.checkpointResults.setdefault(runName, {})[key] = value
+
+        if runName in self.forkResults:
+            self.forkResults[runName][key] = value
+
+    def releaseDeadResults(self, runName, stepIdx):
+        """
+        Release the stored results which no procedure after a top-level procedure can reference.
+        The successful cases keep a short description of the released value instead of the value.
+
+        Parameters
+        ----------
+        runName : string
+            The run name
+
+        stepIdx : int
+            The index of the top-level procedure which just finished
+        """
+
+        if runName not in self.resultLifetimes or runName not in self.returnList:
+            return
+
+        lifetime = self.resultLifetimes[runName]
+        results = self.returnList[runName]
+        deadKeys = set(lifetime.getDeadKeys(results, stepIdx))
+
+        if len(deadKeys) == 0:
+            return
+
+        for case in self.getRunSummary(runName)['successfulCases']:
+            if case['id'] in deadKeys and 'testResult' in case:
+                released = case['testResult']['actualReturn']
+
+                if isinstance(released, (list, tuple, set, dict)):
+                    case['testResult']['actualReturn'] = '<released ' + type(released).__name__ + ' of ' + str(len(released)) + ' items>'
+
+        for key in deadKeys:
+            self.releaseResult(runName, key)
+
+    def releaseResult(self, runName, key):
+        """
+        Drop a stored result
+
+        Parameters
+        ----------
+        runName : string
+            The run name
+
+        key : string
+            The procedure id
+        """
+
+        del self.returnList[runName][key]
+
+        if runName in self.resultLifetimes:
+            self.resultLifetimes[runName].onRelease(key)
+
+    def boundLoopMemory(self, loopId, command, idx, keepIterations, successfulBefore, runName):
+        """
+        Keep the memory of a loop bounded after an iteration:
+        the successful cases of the iteration are only counted and the results of old iterations are released
+
+        Parameters
+        ----------
+        loopId : string
+            The id of the loop procedure
+
+        command : string
+            The subprocedure name
+
+        idx : int
+            The index of the finished iteration
+
+        keepIterations : int
+            The number of the latest iterations whose results are kept
+
+        successfulBefore : int
+            The number of successful cases of the run before the iteration started
+
+        runName : string
+            The run name
+        """
+
+        runSummary = self.getRunSummary(runName)
+        loopCounts = runSummary.setdefault('loopCounts', {}).setdefault(loopId, {'iterations': 0, 'successfulCases': 0})
+        loopCounts['iterations'] += 1
+        loopCounts['successfulCases'] += len(runSummary['successfulCases']) - successfulBefore
+        del runSummary['successfulCases'][successfulBefore:]
+
+        if idx >= keepIterations and runName in self.returnList:
+            namespace = loopId + '.' + str(idx - keepIterations) + '.' + command
+
+            for key in self.returnList[runName].getKeysUnder(namespace):
+                self.releaseResult(runName, key)
+
+    def recycleIfNeeded(self, runName, keepState = True):
+        """
+        Recycle the browser session if its resources crossed a threshold
+
+        Parameters
+        ----------
+        runName : string
+            The run name
+
+        keepState : bool
+            Carry the state of the current page over to the new session
+
+        Return
+        ----------
+        bool
+        Return True if the session was recycled.
+        Otherwise False.
+        """
+
+        monitor = self.funnyTestBase.resourceMonitor
+
+        if monitor is None:
+            return False
+
+        reason = monitor.exceeds(self.recycleRSS, self.recycleCPU)
+
+        if reason is None:
+            return False
+
+        self.logUtil.log("Browser resources exceeded (" + reason + "). Recycling the session.", 'warning')
+        self.funnyTestBase.recycle(keepState)
+
+        runSummary = self.getRunSummary(runName)
+        runSummary['recycles'] = runSummary.get('recycles', 0) + 1
+
+        return True
+
+    def think(self, runName):
+        """
+        Pause for the think time and record how long the pause really took
+
+        Parameters
+        ----------
+        runName : string
+            The run name
+        """
+
+        thinkStart = time.monotonic()
+        time.sleep(self.thinkTime)
+
+        thinkTime = self.getRunSummary(runName).setdefault('thinkTime', {'requested': 0, 'actual': 0})
+        thinkTime['requested'] += self.thinkTime
+        thinkTime['actual'] += time.monotonic() - thinkStart
+
+    def resumeRun(self, runName):
+        """
+        Restore the results and the browser state a run had checkpointed before
+
+        Parameters
+        ----------
+        runName : string
+            The run name
+
+        Return
+        ----------
+        dict
+        The recorded progress of the run, or None if it starts from the beginning
+        """
+
+        if self.checkpoint is None:
+            return None
+
+        progress = self.checkpoint.getRun(runName)
+
+        if progress is None:
+            return None
+
+        for (key, value) in progress['results'].items():
+            self.storeResult(runName, key, value)
+
+        self.checkpointResults.pop(runName, None)
+        self.restoreCases(runName)
+
+        if progress['state'] is not None:
+            self.funnyTestBase.setBrowserState(progress['state'])
+
+        self.logUtil.log("Resuming " + runName + " after procedure " + str(progress['step'] + 1) + " with " + str(len(progress['results'])) + " restored results.", 'success')
+
+        return progress
+
+    def restoreCases(self, runName):
+        """
+        Add the outcomes of the cases a run had checkpointed before to its summary:
+        the failed cases are listed again, the successful ones are counted
+
+        Parameters
+        ----------
+        runName : string
+            The run name
+        """
+
+        progress = self.checkpoint.getRun(runName) if self.checkpoint is not None else None
+
+        if progress is None:
+            return
+
+        runSummary = self.getRunSummary(runName)
+        runSummary['failedCases'].extend(dict(case, resumed = True) for case in progress['cases']['failed'])
+        runSummary['resumedSuccessfulCases'] = runSummary.get('resumedSuccessfulCases', 0) + progress['cases']['successful']
+
+    def forkRun(self, runName):
+        """
+        Start a run from the browser state and results of the run it shares its leading procedures with.
+        If that run could not be forked, the shared procedures are executed.
+
+        Parameters
+        ----------
+        runName : string
+            The run name
+
+        Return
+        ----------
+        dict
+        The progress to skip the shared procedures, or None if the run starts from the beginning
+        """
+
+        if self.prefixTree is None or self.prefixTree.getFork(runName) is None:
+            return None
+
+        (parentName, depth) = self.prefixTree.getFork(runName)
+        snapshot = self.prefixTree.waitSnapshot(runName)
+
+        if 'reason' in snapshot:
+            self.logUtil.log("Not forking " + runName + " from " + parentName + ": " + snapshot['reason'] + ". Running the shared procedures.", 'warning')
+            return None
+
+        if not self.funnyTestBase.setBrowserState(snapshot['state']):
+            self.logUtil.log("Not forking " + runName + " from " + parentName + ": the browser state was not restored. Running the shared procedures.", 'warning')
+            return None
+
+        # every run gets its own copy of the results
+        results = json.loads(snapshot['results'])
+
+        for (key, value) in results.items():
+            self.storeResult(runName, key, value)
+
+        self.getRunSummary(runName)['forkedFrom'] = parentName
+        self.logUtil.log("Forked " + runName + " from " + parentName + " after procedure " + str(depth) + " with " + str(len(results)) + " results.", 'success')
+
+        return {'step': depth - 1, 'loops': {}, 'forkedFrom': parentName}
+
+    def captureForks(self, runName, stepIdx):
+        """
+        Publish the browser state and results of a run for the runs forking from it before a top-level procedure
+
+        Parameters
+        ----------
+        runName : string
+            The run name
+
+        stepIdx : int
+            The index of the top-level procedure about to be executed, or the number of procedures at the end of the run
+        """
+
+        forkPoints = self.forkPoints[runName]
+
+        while len(forkPoints) > 0 and forkPoints[0] <= stepIdx:
+            depth = forkPoints.pop(0)
+            runSummary = self.getRunSummary(runName)
+            snapshot = None
+
+            if len(runSummary['failedCases']) > 0 or runSummary.get('budgetExhausted'):
+                snapshot = {'reason': "a shared procedure failed in " + runName}
+            else:
+                try:
+                    results = json.dumps(self.forkResults[runName])
+                except (TypeError, ValueError):
+                    snapshot = {'reason': "a result of the shared procedures can not be copied to another browser session"}
+
+            if snapshot is None:
+                driver = self.funnyTestBase.getDriver()
+
+                try:
+                    # only the cookies, storages and url of the current page are forked
+                    if len(driver.window_handles) > 1:
+                        snapshot = {'reason': "the shared procedures left several windows open"}
+                    elif driver.execute_script("return window.self !== window.top"):
+                        snapshot = {'reason': "the shared procedures left a frame selected"}
+                    else:
+                        snapshot = {'state': self.funnyTestBase.getBrowserState(), 'results': results}
+                except Exception as e:
+                    snapshot = {'reason': "the browser state can not be captured: " + str(e)}
+
+            self.prefixTree.putSnapshot(runName, depth, snapshot)
+
+        if len(forkPoints) == 0:
+            self.forkResults.pop(runName, None)
+
+    def samplePageMetrics(self, leakCheck):
+        """
+        Sample the page metrics of a leak check, outside of any measured time.
+        Nothing is sampled while the browser is not started.
+
+        Parameters
+        ----------
+        leakCheck : object
+            The LeakCheck
+        """
+
+        if self.funnyTestBase.driver is None:
+            return
+
+        start = time.perf_counter()
+
+        try:
+            metrics = self.funnyTestBase.getPageMetrics(leakCheck.collectGarbage)
+        except Exception as e:
+            self.logUtil.log("Page metrics not sampled: " + str(e), 'warning')
+            return
+
+        leakCheck.add(metrics, (time.perf_counter() - start) * 1000)
+
+    def checkLeaks(self, leakCheck, id, command, runName):
+        """
+        Check the samples of a leak check and save them as a case, failed if a metric leaks.
+        The samples are stored as the result of the case and in the `pageMetrics` of the run summary.
+
+        Parameters
+        ----------
+        leakCheck : object
+            The LeakCheck
+
+        id : string
+            The id of the case, `LoopId.leakCheck` or `leakCheck` for the top-level procedures of the run
+
+        command : string
+            The subprocedure name of the loop, or "run"
+
+        runName : string
+            The run name
+        """
 
-    def parseShortCode(self, param, runName, procedureDict):
+        if leakCheck.getSampleCount() == 0:
+            return
+
+        series = leakCheck.getSeries()
+        leaks = leakCheck.check()
+
+        self.getRunSummary(runName).setdefault('pageMetrics', {})[id] = series
+        self.storeResult(runName, id, series)
+
+        if leakCheck.getSampleCount() < leakCheck.minSamples:
+            self.logUtil.log("Leak check " + id + ": " + str(leakCheck.getSampleCount()) + " samples are too few for a trend.", 'warning')
+
+        for leak in leaks:
+            self.logUtil.log("Leak in " + id + ": " + LeakCheck.format(leak), 'warning')
+
+        # the time consumption of the case is the time spent sampling
+        validationResult = self.validateExpectValue(None, series, None, round(leakCheck.samplingTime))
+        validationResult['expectedValueTestResult'] = len(leaks) == 0
+        validationResult['leaks'] = leaks
+        self.saveResult(validationResult, {'type': 'leakCheck', 'id': id, 'command': command}, runName)
+
+    def recordCheckpoint(self, runName, stepIdx, loopId = None):
         """
-        Parse short codes
+        Record a completed top-level procedure or loop iteration with the results stored since the previous record
 
         Parameters
         ----------
-        param : string
-            The original param string
+        runName : string
+            The run name
+
+        stepIdx : int
+            The index of the top-level procedure, or of the iteration if loopId is given
+
+        loopId : string
+            The id of the loop
+        """
+
+        results = self.checkpointResults.pop(runName, {})
+        cases = self.checkpointCases.pop(runName, None)
+        state = self.funnyTestBase.captureBrowserState()
 
+        if loopId is None:
+            self.checkpoint.recordStep(runName, stepIdx, results, state, cases)
+        else:
+            self.checkpoint.recordIteration(runName, loopId, stepIdx, results, state, cases)
+
+    def recordResources(self, runName):
+        """
+        Add the resource usage of the browser during the run to its summary
+
+        Parameters
+        ----------
         runName : string
             The run name
+        """
 
-        procedureDict : dict
-            The procedure definition where the param is from
+        if self.funnyTestBase.resourceMonitor is not None:
+            self.getRunSummary(runName)['resources'] = self.funnyTestBase.resourceMonitor.getPeriodStats()
+
+    def getRunSummary(self, runName):
+        """
+        Get the summary of a run, created on first use
+
+        Parameters
+        ----------
+        runName : string
+            The run name
 
         Return
         ----------
-        any
-        The result params
+        dict
+        The summary of the run
         """
 
-        if isinstance(param, str) and len(param) > 2:
+        if runName not in self.summaries:
+            self.summaries[runName] = {
+                'successfulCases': [],
+                'failedCases': [],
+            }
 
-            # Check for %loopParam%
-            # Check for %result[procedureID]%
-            match = re.search(r'(.*)%loopParam%(.*)', param)
+        return self.summaries[runName]
 
-            if match != None and len(match.groups()) >= 1:
+    def restoreState(self, name, runName):
+        """
+        Inject the saved browser state and results of a state producing subprocedure instead of running it
 
-                if 'loopParam' in procedureDict:
+        Parameters
+        ----------
+        name : string
+            The subprocedure name
 
-                    if not isinstance(procedureDict['loopParam'], str):
-                        return procedureDict['loopParam']
+        runName : string
+            The run name
 
-                    prefix = match.group(1)
-                    resVal = prefix + procedureDict['loopParam']
+        Return
+        ----------
+        bool
+        Return True if a valid state was restored.
+        Otherwise False.
+        """
 
-                    if len(match.groups()) > 1:
-                        surfix = match.group(2)
-                        resVal = resVal + surfix
+        entry = self.stateStore.get(name)
 
-                    return resVal
+        if entry is None:
+            return False
 
-            else:
+        if not self.funnyTestBase.setBrowserState(entry['state']):
+            self.stateStore.invalidate(name)
+            return False
 
-                # Check for %result[procedureID]%
-                match = re.search(r'(.*)%result\[\"?\'?(\w+)\'?\"?\]%(.*)', param)
+        self.checkReturnIdExist(name, runName)
 
-                if match != None and len(match.groups()) >= 2:
-                    resKey = match.group(2)
-                    prefix = match.group(1)
+        for (key, value) in entry['results'].items():
+            self.storeResult(runName, name + '.' + key, value)
 
-                    if (runName in self.returnList) and (resKey in self.returnList[runName]):
+        self.getRunSummary(runName).setdefault('restoredStates', []).append(name)
+        self.logUtil.log("Saved state of " + name + " restored. Subprocedure skipped.", 'success')
 
-                        savedRes = self.returnList[runName][resKey]
+        return True
 
-                        if not isinstance(savedRes, str):
-                            return savedRes
+    def getResultsUnder(self, namespace, runName):
+        """
+        Collect the results saved under a namespace, such as the results of one subprocedure call
 
-                        resVal = prefix + savedRes
+        Parameters
+        ----------
+        namespace : string
+            The namespace, for example `LoopName.LoopNumber.SubprocedureName`
 
-                        if len(match.groups()) > 2:
-                            surfix = match.group(3)
+        runName : string
+            The run name
 
-                            if len(surfix) > 0 and type(resVal) == str:
-                                resVal = prefix + resVal + surfix
+        Return
+        ----------
+        dict
+        The results keyed by their id relative to the namespace
+        """
 
-                        return resVal
+        if runName not in self.returnList:
+            return {}
 
-        return param
+        results = self.returnList[runName]
 
-    def generateParams(self, params, runName, procedureDict):
+        return dict((key[len(namespace) + 1:], results[key]) for key in results.getKeysUnder(namespace))
+
+    def getCacheKey(self, name, subList, runName):
         """
-        Filter params and replace the elements according to the Funny Test Magic Param rules
+        Build the result cache key of a subprocedure call from its name and resolved inputs
 
         Parameters
         ----------
-        params : list
-            The original params
+        name : string
+            The subprocedure name
+
+        subList : list
+            The procedures of the subprocedure, with the loop param already added
 
         runName : string
             The run name
 
-        procedureDict : dict
-            The procedure definition where the params are from
-
         Return
         ----------
-        list
-        The result params
+        string
+        The cache key
         """
-        
-        resParams = []
-        for param in params:
-            resParams.append(self.parseShortCode(param, runName, procedureDict))
-        
-        return resParams
 
-    def loadCustomProcedures(self, path):
+        inputs = []
+
+        for subpro in subList:
+            inputs.append([
+                subpro['id'],
+                subpro['command'],
+                self.generateParams(subpro.get('params', []), runName, subpro),
+                self.parseShortCode(subpro.get('condition'), runName, subpro),
+                subpro.get('loopParam'),
+            ])
+
+        digest = hashlib.sha1(json.dumps(inputs, sort_keys = True, default = repr).encode('utf-8')).hexdigest()
+
+        return name + ':' + digest
+
+    def runSubprocedure(self, name, subList, parentName, runName, cacheOptions = None):
         """
-        Import custom procedure functions from a directory
+        Run a subprocedure, or restore its results from the result cache if it is cacheable and was run with the same inputs
 
         Parameters
         ----------
-        path : string
-            The path to the direcotry containing the customized procedures
+        name : string
+            The subprocedure name
+
+        subList : list
+            The procedures of the subprocedure (a copy which can be modified)
+
+        parentName : string
+            The namespace of the results
+
+        runName : string
+            The run name
+
+        cacheOptions : bool | dict
+            The `cache` property of the calling procedure. A dict can set the `ttl` in seconds.
         """
 
-        sys.path.append(path)
-        
-        for module in os.listdir(path):
-            
-            if module == '__init__.py' or module[-3:] != '.py':
-                continue
-            
-            mod = importlib.import_module(module[:-3])
-            self.customFuncMods.append(mod)
-            
-    def getFunc(self, funcName):
+        cacheKey = None
+
+        if cacheOptions:
+            cacheKey = self.getCacheKey(name, subList, runName)
+            cachedResults = self.resultCache.get(cacheKey)
+
+            if cachedResults is not None:
+                self.checkReturnIdExist(parentName, runName)
+
+                for (key, value) in cachedResults.items():
+                    self.storeResult(runName, parentName + '.' + key, value)
+
+                self.getRunSummary(runName).setdefault('cacheHits', []).append(parentName)
+                self.logUtil.log("Cached results of " + parentName + " restored. Subprocedure skipped.", 'success')
+
+                return
+
+        failedBefore = len(self.getRunSummary(runName)['failedCases'])
+
+        self.procedure(subList, runName, {'type': 'subprocedure', 'parentName': parentName})
+
+        if cacheKey is not None and len(self.getRunSummary(runName)['failedCases']) == failedBefore:
+            ttl = cacheOptions.get('ttl') if isinstance(cacheOptions, dict) else None
+            self.resultCache.put(cacheKey, self.getResultsUnder(parentName, runName), ttl)
+
+    def storeState(self, name, options, runName, failedBefore):
         """
-        Find custom procedure functions from the module list
+        Capture the browser state and results after a state producing subprocedure ran
 
         Parameters
         ----------
-        funcName : string
-            The function name
+        name : string
+            The subprocedure name
+
+        options : bool | dict
+            The `saveState` property. A dict can set the `ttl` in seconds.
+
+        runName : string
+            The run name
+
+        failedBefore : int
+            The number of failed cases of the run before the subprocedure started
         """
 
-        for mod in self.customFuncMods:
-            if hasattr(mod, funcName):
-                return getattr(mod, funcName)
+        if len(self.getRunSummary(runName)['failedCases']) > failedBefore:
+            self.logUtil.log("Subprocedure " + name + " failed. State not saved.", 'warning')
+            return
 
-        return None
+        try:
+            state = self.funnyTestBase.getBrowserState()
+        except Exception as e:
+            self.logUtil.log("State of " + name + " not captured: " + str(e), 'warning')
+            return
+
+        results = self.getResultsUnder(name, runName)
+        ttl = options.get('ttl') if isinstance(options, dict) else None
+        self.stateStore.put(name, state, results, ttl)
+        self.logUtil.log("State of " + name + " saved.")
 
-    def saveResult(self, validationResult, procedureDict, runName):
+    def saveResult(self, validationResult, procedureDict, runName, params = None):
         """
         Save result to the sucessful/failed cases list
 
@@ -169,23 +1243,64 @@ class FunnyProcedure:
         
         timeConsumption: number
             The time consumption of this case
+
+        params : list
+            The resolved params the procedure was called with
         """
         
+        # the times measured under different throttling profiles are never compared
+        throttling = self.funnyTestBase.throttling
+        validationResult['throttle'] = throttling['name'] if throttling is not None else None
+
         procedureDict['testResult'] = validationResult
+        runSummary = self.getRunSummary(runName)
+        self.funnyTestBase.renewLease()
 
-        if runName not in self.summaries:
-            self.summaries[runName] = {
-                'successfulCases': [],
-                'failedCases': [],
-            }
+        outcome = 'successful'
 
-        if not (validationResult['expectedValueTestResult'] and validationResult['expectedTimeTestResult']):
+        if validationResult.get('timedOut') or not (validationResult['expectedValueTestResult'] and validationResult['expectedTimeTestResult']):
             
-            self.summaries[runName]['failedCases'].append(procedureDict)
+            outcome = 'failed'
+            runSummary['failedCases'].append(procedureDict)
+
+            if 'validatesState' in procedureDict:
+                self.stateStore.invalidate(procedureDict['validatesState'])
             #break
         else:
 
-            self.summaries[runName]['successfulCases'].append(procedureDict)
+            runSummary['successfulCases'].append(procedureDict)
+
+        # the outcomes are checkpointed with the next record, so a resumed invocation still reports them
+        if self.checkpoint is not None:
+            self.checkpointCases.setdefault(runName, {'successful': [], 'failed': []})[outcome].append(procedureDict)
+
+        if self.metrics is not None:
+            failureTypes = []
+
+            if validationResult.get('timedOut'):
+                failureTypes.append('timeout')
+
+            if not validationResult['expectedValueTestResult']:
+                failureTypes.append('value')
+
+            if not validationResult['expectedTimeTestResult']:
+                failureTypes.append('time')
+
+            # the other cases are labelled with their type, e.g. leakCheck and a repeated callSubprocedure
+            if procedureDict.get('type') == 'stdProcedure':
+                command = procedureDict['command']
+            elif procedureDict.get('type') == 'customProcedure':
+                command = 'custom'
+            else:
+                command = procedureDict.get('type')
+
+            self.metrics.recordStep(command, validationResult['actualTime'], failureTypes, validationResult['throttle'])
+
+        if self.stepRecorder is not None:
+            self.stepRecorder.recordResult(procedureDict, validationResult, runName)
+
+        if self.resultRecord is not None:
+            self.resultRecord.recordStep(procedureDict, validationResult, runName, params)
 
     def procedure(self, procedureList, runName, specialProcedure = None):
         """
@@ -231,8 +1346,36 @@ class FunnyProcedure:
         Otherwise False
         """
 
+        if specialProcedure is None and self.runTimeBudget is not None:
+            self.runDeadlines[runName] = time.monotonic() + self.runTimeBudget
+
+        if specialProcedure is None and self.releaseResults:
+            self.resultLifetimes[runName] = ResultLifetime(procedureList, self.resultPattern)
+            self.getRunSummary(runName)['resultMemory'] = self.resultLifetimes[runName]
+
+        if specialProcedure is None and self.funnyTestBase.resourceMonitor is not None:
+            self.funnyTestBase.resourceMonitor.startPeriod()
+
+        if specialProcedure is None:
+            self.funnyTestBase.setThrottling(self.runThrottles.get(runName, self.throttle))
+
+        if specialProcedure is None and self.leakCheck:
+            self.leakChecks[runName] = LeakCheck(self.leakCheck)
+
+        if specialProcedure is None and self.prefixTree is not None and len(self.prefixTree.getForkPoints(runName)) > 0:
+            self.forkPoints[runName] = self.prefixTree.getForkPoints(runName)
+            self.forkResults[runName] = {}
+
+        progress = self.resumeRun(runName) if specialProcedure is None else None
+
+        if progress is not None:
+            # the state at the fork points was not captured before the interruption
+            self.forkResults.pop(runName, None)
+        elif specialProcedure is None:
+            progress = self.forkRun(runName)
+
         try:
-            for procedureDict in procedureList:
+            for (stepIdx, procedureDict) in enumerate(procedureList):
                 procedureType = procedureDict['type']
                 command = procedureDict['command']
                 id = procedureDict['id']
@@ -272,6 +1415,23 @@ class FunnyProcedure:
 
                     continue
 
+                if progress is not None and stepIdx <= progress['step']:
+                    runSummary = self.getRunSummary(runName)
+                    counter = 'forkedSteps' if 'forkedFrom' in progress else 'resumedSteps'
+                    runSummary[counter] = runSummary.get(counter, 0) + 1
+                    continue
+
+                if specialProcedure is None and runName in self.forkResults:
+                    self.captureForks(runName, stepIdx)
+
+                if self.isBudgetExhausted(runName):
+                    self.logUtil.log("Run budget exhausted. Skipping the remaining procedures.", 'warning')
+                    self.getRunSummary(runName)['budgetExhausted'] = True
+                    break
+
+                if self.profiler is not None:
+                    self.profiler.mark(procedureType + ':' + command)
+
                 if params != None:
                     params = self.generateParams(params, runName, procedureDict)
                 
@@ -297,100 +1457,202 @@ class FunnyProcedure:
                 if condition != None and not self.parseShortCode(condition, runName, procedureDict):
                     self.logUtil.log("Condition value is: " + str(condition))
                     continue
-                
-                timeStampStart = time.time()
 
-                # Call standard procedures
-                if procedureType == 'stdProcedure':
+                # the throttling of a procedure applies to the procedures of its subprocedure too
+                if 'throttle' in procedureDict:
+                    outerThrottling = self.funnyTestBase.throttling
+                    self.funnyTestBase.setThrottling(procedureDict['throttle'])
+
+                try:
+                    # Call standard procedures
+                    if procedureType == 'stdProcedure':
                     
-                    if not self.checkReturnIdExist(id, runName):
-                        self.returnList[runName][id] = getattr(self.funnyTestBase, command)(*params)
-                        
-                        timeConsumption = round((time.time() - timeStampStart) * 1000)
-                        validationResult = self.validateExpectValue(expectValue, self.returnList[runName][id], expectTime, timeConsumption)
-                        self.logUtil.log("Time consumption (ms): " + str(validationResult['actualTime']))
+                        if command not in self.funnyTestBase.standardCommands:
+                            raise ValueError("Unknown standard command " + str(command) + " in " + id)
 
-                        self.saveResult(validationResult, procedureDict, runName)
+                        if not self.checkReturnIdExist(id, runName):
+                            if command not in self.funnyTestBase.browserlessCommands:
+                                # a lazily started browser is started outside of the measured time
+                                self.funnyTestBase.getDriver()
+
+                            self.executeStep(getattr(self.funnyTestBase, command), params, procedureDict, runName)
                         
-                    else:
-                        self.logUtil.log("Duplicated procedure id.", 'warning')
-                        break
+                        else:
+                            self.logUtil.log("Duplicated procedure id.", 'warning')
+                            break
 
-                # Call custom procedures from injected outside definition file
-                elif procedureType == 'customProcedure':
-                    driver = self.funnyTestBase.getDriver()
-                    params.insert(0, driver)
+                    # Call custom procedures from injected outside definition file
+                    elif procedureType == 'customProcedure':
+                        driver = self.funnyTestBase.getLazyDriver()
+                        params.insert(0, driver)
 
-                    if not self.checkReturnIdExist(id, runName):
+                        if not self.checkReturnIdExist(id, runName):
                         
-                        customProcedure = self.getFunc(command)
+                            customProcedure = self.getFunc(command)
+
+                            if customProcedure is not None:
+                                self.executeStep(customProcedure, params, procedureDict, runName)
+                            
+                            else:
+                                self.logUtil.log('Error: ' + command + 'does not exist.', 'warning')
+                    
+                        else:
+                            self.logUtil.log("Error: Duplicated procedure id.", 'warning')
+                            break
 
-                        if customProcedure is not None:
-                            self.returnList[runName][id] = customProcedure(*params)
+                    # Start loop
+                    # command => Subprocedure name
+                    # params => The list to loop through
+                    elif procedureType == 'loop':
 
-                            timeConsumption = round((time.time() - timeStampStart) * 1000)
-                            validationResult = self.validateExpectValue(expectValue, self.returnList[runName][id], expectTime, timeConsumption)
-                            self.logUtil.log("Time consumption (ms): " + str(validationResult['actualTime']))
+                        self.logUtil.log("\nLoop procedure start\n")
+
+                        if params is None or len(params) <= 0:
+                            self.logUtil.log("Error: illegal loop params.", 'warning')
+                            break
+
+                        loopSource = LoopSource(self.funnyTestBase, self.casePath)
+                        loopItems = loopSource.open(params[0])
+
+                        # streaming sources only keep the results of the last iterations by default
+                        keepIterations = procedureDict.get('keepIterations', 100 if loopSource.isStreaming(params[0]) else None)
+                        leakCheck = LeakCheck(procedureDict['leakCheck']) if 'leakCheck' in procedureDict else None
+
+                        if command in self.subprocedureList and loopItems is not None:
+                            for (idx, param) in enumerate(loopItems):
+
+                                if self.isBudgetExhausted(runName):
+                                    break
+
+                                if progress is not None and idx in progress['loops'].get(id, ()):
+                                    runSummary = self.getRunSummary(runName)
+                                    runSummary['resumedIterations'] = runSummary.get('resumedIterations', 0) + 1
+                                    continue
+
+                                paramText = str(param)
+                                self.logUtil.log("Loop param: " + (paramText if len(paramText) < 200 else paramText[0:200] + '...') + " subprocedure: " + command)
+
+                                currentSubprocedures = copy.deepcopy(self.subprocedureList[command])
+
+                                # add the loop parameter to subprocedureDict
+                                for subpro in currentSubprocedures:
+                                    subpro['loopParam'] = param
+
+                                successfulBefore = len(self.getRunSummary(runName)['successfulCases'])
+
+                                self.runSubprocedure(command, currentSubprocedures, id + '.' + str(idx) + '.' + command, runName, procedureDict.get('cache'))
+
+                                if keepIterations is not None:
+                                    self.boundLoopMemory(id, command, idx, keepIterations, successfulBefore, runName)
+
+                                if leakCheck is not None:
+                                    self.samplePageMetrics(leakCheck)
+
+                                self.recycleIfNeeded(runName)
+
+                                if self.checkpoint is not None and specialProcedure is None:
+                                    self.recordCheckpoint(runName, idx, id)
+
+                            if leakCheck is not None:
+                                self.checkLeaks(leakCheck, id + '.leakCheck', command, runName)
 
-                            self.saveResult(validationResult, procedureDict, runName)
-                            
                         else:
-                            self.logUtil.log('Error: ' + command + 'does not exist.', 'warning')
-                    
-                    else:
-                        self.logUtil.log("Error: Duplicated procedure id.", 'warning')
-                        break
+                            self.logUtil.log("Target subprodure for loop does not exist.", 'warning')
+                            break
 
-                # Start loop
-                # command => Subprocedure name
-                # params => The list to loop through
-                elif procedureType == 'loop':
+                    # Call subprocedures
+                    # command => Subprocedure name
+                    elif procedureType == 'callSubprocedure':
 
-                    self.logUtil.log("\nLoop procedure start\n")
+                        self.logUtil.log("\nCalling subprocedure - " + command + "\n")
 
-                    if params is None or len(params) <= 0:
-                        self.logUtil.log("Error: illegal loop params.", 'warning')
-                        break
+                        if command in self.subprocedureList and 'repeat' in procedureDict:
+                            self.repeatSubprocedure(command, procedureDict, runName)
 
-                    loopParams = params[0]
-                    if command in self.subprocedureList and isinstance(loopParams, list):
-                        for (idx, param) in enumerate(loopParams):
+                        elif command in self.subprocedureList:
+                            saveState = procedureDict.get('saveState')
 
-                            self.logUtil.log("Loop param: " + param + " subprocedure: " + command)
+                            if not (saveState and self.restoreState(command, runName)):
+                                failedBefore = len(self.getRunSummary(runName)['failedCases'])
 
-                            currentSubprocedures = copy.deepcopy(self.subprocedureList[command])
+                                subList = copy.deepcopy(self.subprocedureList[command])
+                                self.runSubprocedure(command, subList, command, runName, procedureDict.get('cache'))
 
-                            # add the loop parameter to subprocedureDict
-                            for subpro in currentSubprocedures:
-                                subpro['loopParam'] = param
+                                if saveState:
+                                    self.storeState(command, saveState, runName, failedBefore)
+                        else:
+                            self.logUtil.log("Target subprodure does not exist.", 'warning')
+                            break
+                finally:
+                    # also when the step ends the procedure list early, e.g. on a duplicated id
+                    if 'throttle' in procedureDict:
+                        self.funnyTestBase.setThrottling(outerThrottling)
 
-                            self.procedure(currentSubprocedures, runName, {'type': 'subprocedure', 'parentName': id + '.' + str(idx) + '.' + command})
+                if specialProcedure is None:
+                    self.releaseDeadResults(runName, stepIdx)
 
-                    else:
-                        self.logUtil.log("Target subprodure for loop does not exist.", 'warning')
-                        break
+                    if runName in self.leakChecks:
+                        self.samplePageMetrics(self.leakChecks[runName])
 
-                # Call subprocedures
-                # command => Subprocedure name
-                elif procedureType == 'callSubprocedure':
+                    self.recycleIfNeeded(runName)
 
-                    self.logUtil.log("\nCalling subprocedure - " + command + "\n")
+                    if self.thinkTime:
+                        self.think(runName)
 
-                    if command in self.subprocedureList:
-                        subList = copy.deepcopy(self.subprocedureList[command])
-                        self.procedure(subList, runName, {'type': 'subprocedure', 'parentName': command})
-                    else:
-                        self.logUtil.log("Target subprodure does not exist.", 'warning')
-                        break
+                    if self.checkpoint is not None:
+                        self.recordCheckpoint(runName, stepIdx)
 
                 self.logUtil.log("====================================\n\n")
 
+            else:
+                # the runs sharing all the procedures fork from the end of the run
+                if specialProcedure is None and runName in self.forkResults:
+                    self.captureForks(runName, len(procedureList))
+
+            if self.profiler is not None:
+                self.profiler.mark(None)
+
             if specialProcedure is None:
-                self.funnyTestBase.close()
+                if runName in self.leakChecks:
+                    self.checkLeaks(self.leakChecks.pop(runName), 'leakCheck', 'run', runName)
+
+                self.recordResources(runName)
+
+                if self.checkpoint is not None:
+                    self.checkpoint.recordRunDone(runName, self.checkpointCases.pop(runName, None))
+
+                if self.ownsBrowser:
+                    self.funnyTestBase.stopMonitor()
+                    self.funnyTestBase.close()
+                elif not self.recycleIfNeeded(runName, False):
+                    self.funnyTestBase.resetSession()
+
+                if self.watchdog is not None:
+                    self.watchdog.stop()
+                    self.watchdog = None
 
         except Exception as e:
+            if self.profiler is not None:
+                self.profiler.mark(None)
+
             self.logUtil.log(e)
-            self.funnyTestBase.close()
+            self.recordResources(runName)
+            self.leakChecks.pop(runName, None)
+            self.checkpointCases.pop(runName, None)
+
+            if self.metrics is not None:
+                self.metrics.recordError()
+
+            # a shared browser (watch, the session pool, a daemon lease) is only brought back to a clean state
+            if self.ownsBrowser:
+                self.funnyTestBase.stopMonitor()
+                self.funnyTestBase.close()
+            elif not self.recycleIfNeeded(runName, False):
+                self.funnyTestBase.resetSession()
+
+            if self.watchdog is not None:
+                self.watchdog.stop()
+                self.watchdog = None
 
             return False
 
@@ -413,7 +1675,7 @@ class FunnyProcedure:
         """
         
         if runName not in self.returnList:
-            self.returnList[runName] = {}
+            self.returnList[runName] = ResultStore()
             return False
         
         if returnId in self.returnList[runName]:
@@ -524,6 +1786,28 @@ class FunnyProcedure:
             'expectedReturn': expectValue, 
         }
 
+    def formatTime(self, testResult):
+        """
+        Format the time consumption of a case for the summary
+
+        Parameters
+        ----------
+        testResult : dict
+            The validation result of the case
+
+        Return
+        ----------
+        string
+        The time, with the throttling profile it was measured under
+        """
+
+        text = str(testResult['actualTime']) + ' ms'
+
+        if testResult.get('throttle') is not None:
+            text += ', throttled ' + testResult['throttle']
+
+        return text
+
     def summary(self):
         """
         Print the summary info of the whole test.
@@ -547,6 +1831,11 @@ class FunnyProcedure:
             successfulNumber += len(successfulCases)
             failedNumber += len(failedCases)
 
+            for loopCounts in self.summaries[runName].get('loopCounts', {}).values():
+                successfulNumber += loopCounts['successfulCases']
+
+            successfulNumber += self.summaries[runName].get('resumedSuccessfulCases', 0)
+
             self.logUtil.log("++++++++++++++++++++++++++++++")
             self.logUtil.log("Test Run:" + runName)
             self.logUtil.log("++++++++++++++++++++++++++++++")
@@ -554,14 +1843,20 @@ class FunnyProcedure:
             self.logUtil.log("Successful cases (" + str(len(successfulCases)) + '):', 'success')
 
             for case in successfulCases:
-                self.logUtil.log('+ ' + case['id'] + ' (' + str(case['testResult']['actualTime']) + ' ms)')
+                self.logUtil.log('+ ' + case['id'] + ' (' + self.formatTime(case['testResult']) + ')')
+
+                if case['testResult'].get('repeat') is not None:
+                    self.logUtil.log('  ' + case['testResult']['repeat']['statistic'] + ' of ' + Benchmark.format(case['testResult']['repeat']))
 
             self.logUtil.log("")
             self.logUtil.log("Failed cases (" + str(len(failedCases)) + '):', "warning")
 
             for case in failedCases:
                 testResult = case['testResult']
-                self.logUtil.log('+ ' + case['id'] + ' (' + str(testResult['actualTime']) + ' ms)')
+                self.logUtil.log('+ ' + case['id'] + ' (' + self.formatTime(testResult) + (', previous invocation' if case.get('resumed') else '') + ')')
+
+                if testResult.get('repeat') is not None:
+                    self.logUtil.log('  ' + testResult['repeat']['statistic'] + ' of ' + Benchmark.format(testResult['repeat']))
 
                 self.logUtil.log("-----------------------------")
                 self.logUtil.log("Reason: ")
@@ -572,9 +1867,82 @@ class FunnyProcedure:
                 if not testResult['expectedTimeTestResult'] and not (testResult['expectedTime'] is None or testResult['expectedTime'] == 'any'):
                     self.logUtil.log("Unexpected time consumption (ms): (expect - " + str(testResult['expectedTime']) + " | actual - " + str(testResult['actualTime']) + ')', 'warning')
 
+                if testResult.get('timedOut'):
+                    self.logUtil.log("Timed out: (limit - " + str(round(testResult['timeOut'], 2)) + " s)", 'warning')
+
+                for leak in testResult.get('leaks', []):
+                    self.logUtil.log("Leak: " + LeakCheck.format(leak), 'warning')
+
                 self.logUtil.log("-----------------------------")
 
+            for (loopId, loopCounts) in self.summaries[runName].get('loopCounts', {}).items():
+                self.logUtil.log("Loop " + loopId + ": " + str(loopCounts['iterations']) + " iterations, " + str(loopCounts['successfulCases']) + " successful cases not listed")
+
+            if 'resultMemory' in self.summaries[runName]:
+                resultMemory = self.summaries[runName]['resultMemory']
+                self.logUtil.log("Peak memory of stored results (KB): " + str(round(resultMemory.peakBytes / 1024, 1)) + " (" + str(resultMemory.releasedNumber) + " results released early)")
+
+            if 'cacheHits' in self.summaries[runName]:
+                self.logUtil.log("Cache hits (" + str(len(self.summaries[runName]['cacheHits'])) + "), skipped subprocedure calls:")
+
+                for parentName in self.summaries[runName]['cacheHits']:
+                    self.logUtil.log('+ ' + parentName)
+
+            if self.summaries[runName].get('resumedRun'):
+                self.logUtil.log("Completed in a previous invocation. Skipped.", 'success')
+
+            if 'resumedSteps' in self.summaries[runName] or 'resumedIterations' in self.summaries[runName]:
+                self.logUtil.log("Resumed from checkpoint: " + str(self.summaries[runName].get('resumedSteps', 0)) + " procedures and "
+                    + str(self.summaries[runName].get('resumedIterations', 0)) + " loop iterations skipped")
+
+            if self.summaries[runName].get('resumedSuccessfulCases'):
+                self.logUtil.log("Successful cases of a previous invocation not listed: " + str(self.summaries[runName]['resumedSuccessfulCases']))
+
+            if 'forkedFrom' in self.summaries[runName]:
+                self.logUtil.log("Forked from " + self.summaries[runName]['forkedFrom'] + ": " + str(self.summaries[runName].get('forkedSteps', 0)) + " shared procedures skipped", 'success')
+
+            if 'restoredStates' in self.summaries[runName]:
+                self.logUtil.log("Restored browser states: " + ', '.join(self.summaries[runName]['restoredStates']))
+
+            if 'resources' in self.summaries[runName]:
+                resources = self.summaries[runName]['resources']
+                self.logUtil.log("Browser resources: peak RSS " + str(resources['peakRSS']) + " MB (mean " + str(resources['meanRSS']) + " MB), peak CPU "
+                    + str(resources['peakCPU']) + "% (mean " + str(resources['meanCPU']) + "%), " + str(resources['samples']) + " samples, recycled "
+                    + str(self.summaries[runName].get('recycles', 0)) + " times")
+
+            if self.summaries[runName].get('budgetExhausted'):
+                self.logUtil.log("Run budget exhausted. The remaining procedures were skipped.", 'warning')
+
+        datasets = {}
+
+        for runName in self.summaries:
+            if 'dataset' not in self.summaries[runName]:
+                continue
+
+            dataset = datasets.setdefault(self.summaries[runName]['dataset'], {'rows': 0, 'passedRows': 0, 'failedRows': []})
+            dataset['rows'] += 1
+
+            if len(self.summaries[runName]['failedCases']) > 0 or self.summaries[runName].get('budgetExhausted'):
+                dataset['failedRows'].append(runName)
+            else:
+                dataset['passedRows'] += 1
+
+        for datasetName in datasets:
+            dataset = datasets[datasetName]
+
+            self.logUtil.log("++++++++++++++++++++++++++++++")
+            self.logUtil.log("Dataset Run:" + datasetName)
+            self.logUtil.log("++++++++++++++++++++++++++++++")
+            self.logUtil.log("Passed rows: " + str(dataset['passedRows']) + "/" + str(dataset['rows']), 'success' if len(dataset['failedRows']) == 0 else 'warning')
+
+            for rowRunName in dataset['failedRows']:
+                self.logUtil.log('+ ' + rowRunName + ' failed', 'warning')
+
+        if self.profiler is not None:
+            self.profiler.print()
+
         return {
             'successNumber': successfulNumber,
             'failedNumber': failedNumber,
+            'datasets': datasets,
         }
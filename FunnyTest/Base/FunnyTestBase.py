@@ -1,3 +1,7 @@
+import os
+import time
+import threading
+import urllib.parse
 from selenium import webdriver
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.common.by import By
@@ -6,7 +10,25 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.proxy import Proxy, ProxyType
 from selenium.webdriver import ActionChains
 
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
 from ..Log.TestLog import TestLog
+from .Throttling import Throttling
+
+class LazyDriver:
+    """
+    Stands in for the driver passed to a custom procedure while the browser is not started yet.
+    The browser is started, or waited for if it is starting in the background, on the first attribute access.
+    """
+
+    def __init__(self, funnyTestBase):
+        self.funnyTestBase = funnyTestBase
+
+    def __getattr__(self, name):
+        return getattr(self.funnyTestBase.getDriver(), name)
 
 class FunnyTestBase:
     """
@@ -15,7 +37,19 @@ class FunnyTestBase:
     Author: Richard Wong
     """
 
-    def __init__(self, isHeadless = False, windowSize = "1920,1080"):
+    # the methods json files can call as standard commands, the other public methods are used by the framework itself
+    standardCommands = [
+        'getDriver', 'visit', 'close', 'closeCurrentWindow', 'waitFor', 'click', 'selectOption', 'input', 'getAttribute', 'getAttributes',
+        'iterateAttributes', 'countElements', 'switchToFrame', 'getWindowHandler', 'switchToWindow', 'scrollTo', 'compareScreenshot', 'output',
+    ]
+
+    # the standard commands which do not need the browser
+    browserlessCommands = ['output']
+
+    # the seconds between two renewals of a browser lease, well below the lease time out of the daemon
+    leaseRenewInterval = 60
+
+    def __init__(self, isHeadless = False, windowSize = "1920,1080", daemonAddress = None, profileTemplate = None, profileDir = None, startMode = "eager"):
         """
         Constructor 
 
@@ -25,6 +59,16 @@ class FunnyTestBase:
             set the browser to headless mode
         windowSize : string
             set the window size for headless mode
+        daemonAddress : string
+            The "host:port" of a BrowserDaemon. If set, a pre-launched browser is leased from it
+            and attached to instead of launching a new one.
+        profileTemplate : object
+            A ProfileTemplate (or the path of one). Every browser started by this instance uses a fresh clone of it.
+        profileDir : string
+            The user data directory to use as it is, e.g. to build a template
+        startMode : string
+            When the browser is started: "eager" in the constructor, "background" in a thread started by the constructor,
+            or "lazy" on the first use. The standard commands expect a started browser, see getDriver.
         """
 
         self.chrome_options = webdriver.ChromeOptions()
@@ -34,8 +78,37 @@ class FunnyTestBase:
             self.chrome_options.add_argument("--headless")
             self.chrome_options.add_argument("--no-sandbox")
 
-        self.driver = webdriver.Chrome(options = self.chrome_options)
         self.logUtil = TestLog()
+        self.driver = None
+        self.daemonClient = None
+        self.lease = None
+        self.resourceMonitor = None
+        self.updateBaselines = False
+        self.casePath = None
+        self.profileDir = profileDir
+        self.profileClone = None
+        self.profileTemplate = profileTemplate
+        self.startMode = startMode
+        self.starter = None
+        self.starterError = None
+        self.throttling = None
+        self.throttlingLock = threading.Lock()
+
+        if isinstance(profileTemplate, str):
+            from .ProfileTemplate import ProfileTemplate
+
+            self.profileTemplate = ProfileTemplate(profileTemplate)
+
+        if self.profileTemplate is not None and not self.profileTemplate.exists():
+            self.logUtil.log("Profile template " + self.profileTemplate.path + " does not exist. Starting with empty profiles.", 'warning')
+            self.profileTemplate = None
+
+        if daemonAddress is not None:
+            from .BrowserDaemon import BrowserDaemonClient
+
+            self.daemonClient = BrowserDaemonClient(daemonAddress)
+
+        self.autoStart()
 
     def __del__(self):
         """
@@ -45,9 +118,493 @@ class FunnyTestBase:
         if self.driver is not None:
             self.close()
 
+    def startDriver(self):
+        """
+        Launch a new browser session with the options given to the constructor,
+        or attach to a browser leased from the daemon
+        """
+
+        if self.daemonClient is None:
+            self.driver = webdriver.Chrome(options = self.getChromeOptions())
+        else:
+            self.lease = self.daemonClient.acquire()
+            self.lease['renewedAt'] = time.monotonic()
+
+            attachOptions = webdriver.ChromeOptions()
+            attachOptions.add_experimental_option("debuggerAddress", self.lease['debuggerAddress'])
+
+            try:
+                self.driver = webdriver.Chrome(options = attachOptions)
+            except Exception:
+                self.releaseLease(False)
+                raise
+
+        # the emulation belongs to the DevTools session of the driver, a new session is throttled again
+        with self.throttlingLock:
+            if self.throttling is not None:
+                self.applyThrottling()
+
+    def autoStart(self):
+        """
+        Start the browser according to the start mode, unless it is running or starting
+        """
+
+        if self.driver is not None or self.starter is not None:
+            return
+
+        if self.startMode == 'eager':
+            self.startDriver()
+        elif self.startMode == 'background':
+            self.starter = threading.Thread(target = self.startInBackground, daemon = True)
+            self.starter.start()
+
+    def startInBackground(self):
+        """
+        Start the browser in the starter thread, keeping the error for the thread waiting for it
+        """
+
+        try:
+            self.startDriver()
+        except Exception as e:
+            self.starterError = e
+
+    def waitForStart(self):
+        """
+        Wait until the browser starting in the background is started
+        """
+
+        if self.starter is None:
+            return
+
+        self.starter.join()
+        self.starter = None
+
+        if self.starterError is not None:
+            self.logUtil.log("Browser start in the background failed: " + str(self.starterError), 'warning')
+            self.starterError = None
+
+    def getChromeOptions(self):
+        """
+        Get the options for the next browser: the constructor options and the user data directory,
+        a new clone of the profile template if there is one
+
+        Return
+        ----------
+        object
+        The ChromeOptions
+        """
+
+        userDataDir = self.profileDir
+
+        if self.profileTemplate is not None:
+            self.removeProfileClone()
+            self.profileClone = self.profileTemplate.clone()
+            userDataDir = self.profileClone
+
+        if userDataDir is None:
+            return self.chrome_options
+
+        options = webdriver.ChromeOptions()
+
+        for argument in self.chrome_options.arguments:
+            options.add_argument(argument)
+
+        options.add_argument("--user-data-dir=%s" % userDataDir)
+
+        return options
+
+    def removeProfileClone(self):
+        """
+        Remove the profile clone of the closed browser
+        """
+
+        if self.profileClone is not None:
+            self.profileTemplate.removeClone(self.profileClone)
+            self.profileClone = None
+
+    def releaseLease(self, healthy = True):
+        """
+        Return the browser leased from the daemon
+
+        Parameters
+        ----------
+        healthy : bool
+            False if the browser should be replaced by the daemon
+        """
+
+        if self.lease is None:
+            return
+
+        try:
+            self.daemonClient.release(self.lease['lease'], healthy)
+        except Exception as e:
+            self.logUtil.log("Browser lease not returned: " + str(e), 'warning')
+
+        self.lease = None
+
+    def renewLease(self):
+        """
+        Tell the daemon the leased browser is still in use, so a long test run keeps it.
+        Sent at most every leaseRenewInterval seconds.
+        """
+
+        if self.lease is None or time.monotonic() - self.lease['renewedAt'] < self.leaseRenewInterval:
+            return
+
+        self.lease['renewedAt'] = time.monotonic()
+
+        try:
+            self.daemonClient.renew(self.lease['lease'])
+        except Exception as e:
+            self.logUtil.log("Browser lease not renewed: " + str(e), 'warning')
+
+    def kill(self):
+        """
+        Forcefully terminate the browser session without talking to it.
+        Safe to call from another thread: a selenium call blocked on the session will fail instead of hanging.
+        """
+
+        driver = self.driver
+
+        if driver is None:
+            return
+
+        service = getattr(driver, 'service', None)
+        process = getattr(service, 'process', None)
+
+        if process is None:
+            return
+
+        if self.lease is not None:
+            # the browser belongs to the daemon, it is replaced when the lease is returned unhealthy
+            self.lease['healthy'] = False
+        elif psutil is not None:
+            try:
+                for child in psutil.Process(process.pid).children(recursive = True):
+                    child.kill()
+            except psutil.Error as e:
+                self.logUtil.log(e)
+
+        process.kill()
+
+    def restart(self):
+        """
+        Replace the current browser session with a new one, started according to the start mode
+        """
+
+        self.waitForStart()
+
+        if self.driver is not None:
+            try:
+                self.driver.quit()
+            except Exception as e:
+                self.logUtil.log(e)
+
+            self.driver = None
+            self.removeProfileClone()
+
+        if self.lease is not None:
+            self.releaseLease(self.lease.get('healthy', True))
+
+        self.autoStart()
+
+    def resetSession(self):
+        """
+        Bring a reused browser session back to a clean state: one window on a blank page without the cookies and storages of any origin.
+        A closed session is started again according to the start mode.
+        """
+
+        self.waitForStart()
+
+        if self.driver is None:
+            self.autoStart()
+            return
+
+        self.renewLease()
+
+        try:
+            self.scrubSession()
+        except Exception as e:
+            self.logUtil.log(e)
+            self.restart()
+
+    def scrubSession(self):
+        """
+        Clear the running session: the cookies and the HTTP cache of the browser, the storages of the origins it visited
+        and the session storages, by replacing all windows with a new blank tab. Raises if the session does not respond.
+        """
+
+        origins = set()
+        handles = self.driver.window_handles
+
+        # the storages are cleared per origin, those in the history of the windows and those having cookies
+        for handle in handles:
+            self.driver.switch_to.window(handle)
+            history = self.driver.execute_cdp_cmd('Page.getNavigationHistory', {})
+            origins.update(self.getOrigin(entry['url']) for entry in history['entries'])
+
+        for cookie in self.driver.execute_cdp_cmd('Network.getAllCookies', {})['cookies']:
+            domain = cookie['domain'].lstrip('.')
+            origins.update(['https://' + domain, 'http://' + domain])
+
+        self.driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
+        self.driver.execute_cdp_cmd('Network.clearBrowserCache', {})
+
+        for origin in sorted(origin for origin in origins if origin is not None):
+            self.driver.execute_cdp_cmd('Storage.clearDataForOrigin', {'origin': origin, 'storageTypes': 'all'})
+
+        # the session storage belongs to the tab, a new tab starts without it
+        self.driver.switch_to.new_window('tab')
+        blankTab = self.driver.current_window_handle
+
+        for handle in handles:
+            self.driver.switch_to.window(handle)
+            self.driver.close()
+
+        self.driver.switch_to.window(blankTab)
+        self.setThrottling(None)
+
+    @staticmethod
+    def getOrigin(url):
+        """
+        Get the origin of a url
+
+        Parameters
+        ----------
+        url : string
+            The url
+
+        Return
+        ----------
+        string
+        The scheme, host and port, or None for urls without an origin such as about:blank and data: urls
+        """
+
+        parts = urllib.parse.urlsplit(url)
+
+        if parts.scheme not in ['http', 'https'] or parts.netloc == '':
+            return None
+
+        return parts.scheme + '://' + parts.netloc
+
+    def getProcessId(self):
+        """
+        Get the pid of the chromedriver process of the current session.
+        The browser and its renderers are its children, unless the browser is leased from the daemon.
+
+        Return
+        ----------
+        int
+        The pid, or None if there is no session
+        """
+
+        process = getattr(getattr(self.driver, 'service', None), 'process', None)
+
+        return process.pid if process is not None else None
+
+    def startMonitor(self, interval = 1):
+        """
+        Start sampling the RSS and CPU of the session's process tree in the background
+
+        Parameters
+        ----------
+        interval : number
+            The seconds between two samples
+
+        Return
+        ----------
+        object
+        The ResourceMonitor, or None if psutil is not installed
+        """
+
+        if self.resourceMonitor is not None:
+            return self.resourceMonitor
+
+        if psutil is None:
+            self.logUtil.log("psutil is not installed. Browser resources are not monitored.", 'warning')
+            return None
+
+        from .ResourceMonitor import ResourceMonitor
+
+        self.resourceMonitor = ResourceMonitor(self.getProcessId, interval)
+        self.resourceMonitor.start()
+
+        return self.resourceMonitor
+
+    def stopMonitor(self):
+        """
+        Stop sampling the session's resources
+        """
+
+        if self.resourceMonitor is not None:
+            self.resourceMonitor.stop()
+            self.resourceMonitor = None
+
+    def recycle(self, keepState = True):
+        """
+        Replace the browser session with a new one carrying over the state of the current page
+        (url, cookies, localStorage and sessionStorage). Window handles of the old session become invalid.
+
+        Parameters
+        ----------
+        keepState : bool
+            If False, the new session starts blank
+        """
+
+        state = self.captureBrowserState() if keepState else None
+
+        self.restart()
+
+        if state is not None:
+            self.setBrowserState(state)
+
+        if self.resourceMonitor is not None:
+            self.resourceMonitor.resetThresholds()
+
+    def captureBrowserState(self):
+        """
+        Capture the state of the current page if it is a web page, without failing
+
+        Return
+        ----------
+        dict
+        The browser state, or None
+        """
+
+        try:
+            if self.driver is not None and self.driver.current_url.startswith('http'):
+                return self.getBrowserState()
+        except Exception as e:
+            self.logUtil.log("Browser state not captured: " + str(e), 'warning')
+
+        return None
+
+    def getBrowserState(self):
+        """
+        Capture the state of the current page: url, cookies, localStorage and sessionStorage
+
+        Return
+        ----------
+        dict
+        The browser state
+        """
+
+        storageScript = "var s = {}; for (var i = 0; i < window[arguments[0]].length; i++) { var k = window[arguments[0]].key(i); s[k] = window[arguments[0]].getItem(k); } return s;"
+        driver = self.getDriver()
+
+        return {
+            'url': driver.current_url,
+            'cookies': driver.get_cookies(),
+            'localStorage': driver.execute_script(storageScript, 'localStorage'),
+            'sessionStorage': driver.execute_script(storageScript, 'sessionStorage'),
+        }
+
+    def setBrowserState(self, state):
+        """
+        Inject a state captured by getBrowserState into the current session and reload its page
+
+        Parameters
+        ----------
+        state : dict
+            The browser state
+
+        Return
+        ----------
+        bool
+        Return True if the state is restored.
+        Otherwise return False.
+        """
+
+        try:
+            driver = self.getDriver()
+
+            # cookies and storages can only be set for the origin of the current page
+            driver.get(state['url'])
+            driver.delete_all_cookies()
+
+            for cookie in state['cookies']:
+                try:
+                    driver.add_cookie(cookie)
+                except Exception as e:
+                    self.logUtil.log("Cookie " + str(cookie.get('name')) + " not restored: " + str(e), 'warning')
+
+            for storage in ['localStorage', 'sessionStorage']:
+                driver.execute_script(
+                    "var s = arguments[1]; for (var k in s) { window[arguments[0]].setItem(k, s[k]); }",
+                    storage, state[storage]
+                )
+
+            driver.get(state['url'])
+
+        except Exception as e:
+            self.logUtil.log(e)
+            return False
+
+        return True
+
+    def setThrottling(self, throttle = None):
+        """
+        Throttle the network and CPU of the browser with Chrome's DevTools emulation.
+        A browser which is not started yet is throttled when it is started.
+
+        Parameters
+        ----------
+        throttle : string | dict
+            The name of a Throttling preset or a profile {"latency": ms, "download": kbit/s, "upload": kbit/s, "cpu": slowdown factor}.
+            None removes the throttling.
+        """
+
+        profile = Throttling.getProfile(throttle)
+
+        with self.throttlingLock:
+            if profile == self.throttling:
+                return
+
+            self.throttling = profile
+
+            if self.driver is not None:
+                self.applyThrottling()
+
+        if profile is not None:
+            self.logUtil.log("Throttling: " + profile['name'])
+
+    def applyThrottling(self):
+        """
+        Send the DevTools commands of the current throttling profile to the browser
+        """
+
+        for (command, params) in Throttling.getCommands(self.throttling):
+            self.driver.execute_cdp_cmd(command, params)
+
+    def getPageMetrics(self, collectGarbage = True):
+        """
+        Get the DevTools performance metrics of the current page, e.g. JSHeapUsedSize, Nodes and JSEventListeners
+
+        Parameters
+        ----------
+        collectGarbage : bool
+            Collect the garbage of the page first, so the heap size only counts reachable objects
+
+        Return
+        ----------
+        dict
+        The metric values by name
+        """
+
+        driver = self.getDriver()
+
+        if collectGarbage:
+            driver.execute_cdp_cmd('HeapProfiler.collectGarbage', {})
+
+        driver.execute_cdp_cmd('Performance.enable', {})
+        result = driver.execute_cdp_cmd('Performance.getMetrics', {})
+
+        return dict((metric['name'], metric['value']) for metric in result['metrics'])
+
     def getDriver(self):
         """
-        Get current driver
+        Get current driver.
+        A browser which is not started yet is started first, or waited for if it is starting in the background.
 
         Return
         ----------
@@ -55,8 +612,28 @@ class FunnyTestBase:
         Current driver
         """
 
+        self.waitForStart()
+
+        if self.driver is None:
+            self.startDriver()
+
         return self.driver
 
+    def getLazyDriver(self):
+        """
+        Get the driver for a custom procedure without starting the browser
+
+        Return
+        ----------
+        object
+        The driver if the browser is started, otherwise a LazyDriver starting it on first use
+        """
+
+        if self.driver is not None and self.starter is None:
+            return self.driver
+
+        return LazyDriver(self)
+
     def visit(self, url, waitCSS = None, timeOut = 40, waitFunc = "visibility_of_element_located", appendCredential = None):
         """
         Visit a specific url and wait for a specific element 
@@ -103,13 +680,71 @@ class FunnyTestBase:
 
     def close(self):
         """
-        Close driver
+        Close driver.
+        A browser leased from the daemon is scrubbed and returned instead of being closed.
+        The resource monitor keeps running for the next session, it is stopped by quit() or stopMonitor().
         """
 
+        self.waitForStart()
+
+        if self.driver is not None and self.lease is not None:
+            healthy = self.lease.get('healthy', True)
+
+            try:
+                # best effort: a browser which can not be scrubbed is replaced by the daemon, a new lease is never taken here
+                if healthy:
+                    try:
+                        self.scrubSession()
+                    except Exception as e:
+                        self.logUtil.log(e)
+                        healthy = False
+
+                # quitting an attached session only ends chromedriver, the browser keeps running
+                self.driver.quit()
+            except Exception as e:
+                self.logUtil.log(e)
+                healthy = False
+
+            self.driver = None
+            self.releaseLease(healthy)
+
+        elif self.driver is not None:
+            try:
+                if self.profileClone is not None:
+                    # the clone can only be removed once the browser has ended
+                    self.driver.quit()
+                else:
+                    self.driver.close()
+            except Exception as e:
+                self.logUtil.log(e)
+
+            self.driver = None
+            self.removeProfileClone()
+
+    def quit(self):
+        """
+        End the browser and chromedriver, so the profile is written completely.
+        A browser leased from the daemon is returned instead.
+        """
+
+        self.waitForStart()
+
+        if self.lease is not None:
+            self.close()
+            return
+
+        self.stopMonitor()
+
         if self.driver is not None:
-            self.driver.close()
+            try:
+                self.driver.quit()
+            except Exception as e:
+                self.logUtil.log(e)
+
             self.driver = None
 
+        self.removeProfileClone()
+
     def closeCurrentWindow(self):
         """
         Close current window
@@ -329,6 +964,73 @@ class FunnyTestBase:
 
         return None
 
+    def iterateAttributes(self, css, attr, nextCSS, waitCSS = None, timeOut = 40, maxPages = None):
+        """
+        Lazily iterate over the attributes of elements across paginated pages.
+        The attributes of one page are read, then the "next" element is clicked until it is gone.
+        If the consumer navigates away between two pages, the last listing url is visited again before clicking "next".
+
+        Parameters
+        ----------
+        css : string
+            The css for locating the targets on every page.
+
+        attr : string
+            The attribute name.
+
+        nextCSS : string
+            The css for locating the element leading to the next page.
+
+        waitCSS : string
+            The css of the element to wait for after a page change. Default to css.
+
+        timeOut : int
+            The seconds to wait for a page
+
+        maxPages : int
+            The maximum number of pages to read. None means no limit.
+
+        Return
+        ----------
+        generator
+        The attributes
+        """
+
+        waitCSS = waitCSS if waitCSS is not None else css
+        pageNumber = 0
+
+        while maxPages is None or pageNumber < maxPages:
+            pageNumber += 1
+            listingUrl = self.driver.current_url
+            attributes = self.getAttributes(css, attr)
+
+            for attribute in (attributes if attributes is not None else []):
+                yield attribute
+
+            if self.driver is None:
+                return
+
+            try:
+                if self.driver.current_url != listingUrl:
+                    self.driver.get(listingUrl)
+
+                if len(self.driver.find_elements(By.CSS_SELECTOR, nextCSS)) <= 0:
+                    return
+
+                # wait for the old page to go away before reading the next one
+                oldTargets = self.driver.find_elements(By.CSS_SELECTOR, css)
+                self.driver.find_element(By.CSS_SELECTOR, nextCSS).click()
+
+                if len(oldTargets) > 0:
+                    WebDriverWait(self.driver, timeOut).until(EC.staleness_of(oldTargets[0]))
+
+            except Exception as e:
+                self.logUtil.log(e)
+                return
+
+            if not self.waitFor(waitCSS, timeOut):
+                return
+
     def countElements(self, css):
         """
         Count the target elements.
@@ -472,6 +1174,90 @@ class FunnyTestBase:
 
         return True
 
+    def compareScreenshot(self, name, css = None, tolerance = 0, ignoreRegions = None, method = "pixel", baselinePath = "baselines"):
+        """
+        Compare a screenshot of the page or an element with its baseline image.
+        A missing baseline is created from the screenshot. Existing baselines are only replaced
+        when the session runs with updateBaselines. Needs numpy and Pillow.
+
+        Parameters
+        ----------
+        name : string
+            The name of the baseline, the file is <baselinePath>/<name>.png
+
+        css : string
+            The css of the element to take the screenshot of. The whole window if None.
+
+        tolerance : int
+            The difference of a color channel (0 - 255) still counted as equal
+
+        ignoreRegions : list
+            The [x, y, width, height] rectangles (in pixels of the screenshot) to ignore, e.g. dates and ads
+
+        method : string
+            "pixel": the ratio of differing pixels. A <name>.diff.png marking them is saved next to the baseline.
+            "phash": the share of differing bits of the perceptual hashes, tolerant to small shifts and anti-aliasing.
+
+        baselinePath : string
+            The directory of the baseline images. A relative path is resolved against the test case folder of the session, if it has one.
+
+        Return
+        ----------
+        float
+        The diff ratio between 0 (identical) and 1. 1 if the sizes differ or the screenshot failed.
+        """
+
+        from .ImageDiff import ImageDiff
+
+        if not ImageDiff.isAvailable():
+            self.logUtil.log("numpy and Pillow are needed to compare screenshots.", 'warning')
+            return 1.0
+
+        try:
+            if css is None:
+                png = self.driver.get_screenshot_as_png()
+            else:
+                png = self.driver.find_element(By.CSS_SELECTOR, css).screenshot_as_png
+
+        except Exception as e:
+            self.logUtil.log(e)
+            self.close()
+            return 1.0
+
+        # the same case finds the same baselines whatever directory the tests are started from
+        if self.casePath is not None and not os.path.isabs(baselinePath):
+            baselinePath = os.path.join(self.casePath, baselinePath)
+
+        path = os.path.join(baselinePath, name + '.png')
+        baseline = None if self.updateBaselines else ImageDiff.loadBaseline(path)
+
+        if baseline is None:
+            ImageDiff.saveBaseline(path, png)
+            self.logUtil.log("Baseline " + path + " saved.", 'success')
+            return 0.0
+
+        # identical png data needs no decoding
+        if png == baseline[0]:
+            return 0.0
+
+        (actual, baseline) = (ImageDiff.decode(png), baseline[1])
+
+        if actual.shape != baseline.shape:
+            self.logUtil.log("Screenshot size " + str(actual.shape[1::-1]) + " differs from baseline size " + str(baseline.shape[1::-1]) + ".", 'warning')
+            return 1.0
+
+        compared = ImageDiff.getIgnoreMask(actual.shape, ignoreRegions)
+
+        if method == "phash":
+            return ImageDiff.perceptualDiff(actual, baseline, compared)
+
+        (ratio, differing) = ImageDiff.pixelDiff(actual, baseline, tolerance, compared)
+
+        if ratio > 0:
+            ImageDiff.saveDiff(os.path.join(baselinePath, name + '.diff.png'), actual, differing)
+
+        return ratio
+
     def output(self, content):
         """
         Output content to screen
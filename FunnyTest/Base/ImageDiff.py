@@ -0,0 +1,239 @@
+import io
+import os
+import threading
+
+try:
+    import numpy
+    from PIL import Image
+except ImportError:
+    numpy = None
+    Image = None
+
+class ImageDiff:
+    """
+    Vectorized screenshot comparison with NumPy: the ratio of differing pixels and a perceptual hash distance.
+    Needs numpy and Pillow.
+    """
+
+    # the png data and decoded array of the baselines by path, with the mtime they were read at
+    baselines = {}
+    lock = threading.Lock()
+
+    @staticmethod
+    def isAvailable():
+        """
+        Check if numpy and Pillow are installed
+
+        Return
+        ----------
+        bool
+        Return True if the images can be compared.
+        Otherwise False.
+        """
+
+        return numpy is not None
+
+    @staticmethod
+    def decode(png):
+        """
+        Decode a png into an RGBX array, whose pixels can also be viewed as single uint32 values
+
+        Parameters
+        ----------
+        png : bytes
+            The png data
+
+        Return
+        ----------
+        array
+        The (height, width, 4) uint8 array
+        """
+
+        return numpy.asarray(Image.open(io.BytesIO(png)).convert('RGBX'))
+
+    @classmethod
+    def loadBaseline(cls, path):
+        """
+        Load a baseline image, read and decoded only once as long as the file does not change
+
+        Parameters
+        ----------
+        path : string
+            The png file
+
+        Return
+        ----------
+        tuple
+        (the png data, the RGBX array), or None if the file does not exist
+        """
+
+        if not os.path.isfile(path):
+            return None
+
+        mtime = os.stat(path).st_mtime
+
+        with cls.lock:
+            if path in cls.baselines and cls.baselines[path][0] == mtime:
+                return cls.baselines[path][1]
+
+        with open(path, 'rb') as pngFile:
+            png = pngFile.read()
+
+        baseline = (png, cls.decode(png))
+
+        with cls.lock:
+            cls.baselines[path] = (mtime, baseline)
+
+        return baseline
+
+    @classmethod
+    def saveBaseline(cls, path, png):
+        """
+        Save a png as the baseline
+
+        Parameters
+        ----------
+        path : string
+            The png file
+
+        png : bytes
+            The png data
+        """
+
+        directory = os.path.dirname(path)
+
+        if directory != '' and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        with open(path, 'wb') as pngFile:
+            pngFile.write(png)
+
+    @staticmethod
+    def getIgnoreMask(shape, ignoreRegions):
+        """
+        Build the mask of the compared pixels
+
+        Parameters
+        ----------
+        shape : tuple
+            The shape of the images
+
+        ignoreRegions : list
+            The [x, y, width, height] rectangles to ignore, in pixels
+
+        Return
+        ----------
+        array
+        The (height, width) bool array, True for the compared pixels
+        """
+
+        compared = numpy.ones(shape[:2], dtype = bool)
+
+        for (x, y, width, height) in ignoreRegions or []:
+            compared[max(y, 0):y + height, max(x, 0):x + width] = False
+
+        return compared
+
+    @staticmethod
+    def pixelDiff(actual, baseline, tolerance, compared):
+        """
+        Get the pixels whose channels differ by more than the tolerance
+
+        Parameters
+        ----------
+        actual, baseline : array
+            The RGBX arrays of the same shape
+
+        tolerance : int
+            The channel difference (0 - 255) still counted as equal
+
+        compared : array
+            The mask of the compared pixels
+
+        Return
+        ----------
+        tuple
+        (the ratio of differing compared pixels, the (height, width) bool array of differing pixels)
+        """
+
+        # one uint32 comparison per pixel finds the candidates, the tolerance is only applied to them
+        differing = (actual.view(numpy.uint32)[:, :, 0] != baseline.view(numpy.uint32)[:, :, 0]) & compared
+
+        if tolerance > 0:
+            candidates = numpy.nonzero(differing)
+            actualPixels = actual[candidates][:, :3].astype(numpy.int16)
+            baselinePixels = baseline[candidates][:, :3].astype(numpy.int16)
+            differing[candidates] = numpy.abs(actualPixels - baselinePixels).max(axis = 1) > tolerance
+
+        comparedNumber = int(numpy.count_nonzero(compared))
+
+        return (int(numpy.count_nonzero(differing)) / comparedNumber if comparedNumber > 0 else 0.0, differing)
+
+    @staticmethod
+    def perceptualHash(image, compared):
+        """
+        Compute the 64 bit difference hash of an image, robust against small shifts, scaling and anti-aliasing
+
+        Parameters
+        ----------
+        image : array
+            The RGBX array
+
+        compared : array
+            The mask of the compared pixels. Ignored pixels are blanked.
+
+        Return
+        ----------
+        array
+        The 64 hash bits as a bool array
+        """
+
+        if not compared.all():
+            image = image.copy()
+            image[~compared] = 0
+
+        small = numpy.asarray(Image.fromarray(image, 'RGBX').convert('L').resize((9, 8), Image.BOX), dtype = numpy.int16)
+
+        return (small[:, 1:] > small[:, :-1]).flatten()
+
+    @classmethod
+    def perceptualDiff(cls, actual, baseline, compared):
+        """
+        Get the share of differing perceptual hash bits
+
+        Parameters
+        ----------
+        actual, baseline : array
+            The RGBX arrays of the same shape
+
+        compared : array
+            The mask of the compared pixels
+
+        Return
+        ----------
+        float
+        The hamming distance of the hashes divided by 64
+        """
+
+        return float((cls.perceptualHash(actual, compared) != cls.perceptualHash(baseline, compared)).mean())
+
+    @staticmethod
+    def saveDiff(path, actual, differing):
+        """
+        Save the screenshot with the differing pixels marked red
+
+        Parameters
+        ----------
+        path : string
+            The png file
+
+        actual : array
+            The RGBX array of the screenshot
+
+        differing : array
+            The (height, width) bool array of differing pixels
+        """
+
+        marked = actual[:, :, :3].copy()
+        marked[differing] = [255, 0, 0]
+        Image.fromarray(marked).save(path, compress_level = 1)
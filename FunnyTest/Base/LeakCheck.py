@@ -0,0 +1,193 @@
+class LeakCheck:
+    """
+    The page metrics (JS heap, DOM nodes, event listeners) sampled through DevTools after each iteration of a loop
+    with `"leakCheck"`, or after each top-level procedure of a run, and the trend check over them.
+    A metric leaks when it grows by more than its threshold over the samples without ever falling back
+    by more than a tenth of the threshold, e.g. DOM nodes piling up on every navigation of a single-page app.
+    """
+
+    # the Performance.getMetrics values sampled, and the growth over the samples above which they leak
+    defaultThresholds = {
+        'JSHeapUsedSize': 10 * 1024 * 1024,
+        'Nodes': 1000,
+        'JSEventListeners': 100,
+    }
+
+    def __init__(self, leakCheck = True):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        leakCheck : bool | dict
+            The `leakCheck` property of a loop, see getOptions
+        """
+
+        options = self.getOptions(leakCheck)
+
+        self.thresholds = options['thresholds']
+        self.warmup = options['warmup']
+        self.minSamples = options['minSamples']
+        self.collectGarbage = options['collectGarbage']
+        self.series = dict((name, []) for name in self.thresholds)
+        self.skipped = 0
+        self.samplingTime = 0
+
+    @classmethod
+    def getOptions(cls, leakCheck):
+        """
+        Normalize a `leakCheck` property
+
+        Parameters
+        ----------
+        leakCheck : bool | dict
+            True for the defaults, or {'thresholds': {metric: growth} (merged with the defaults, null disables a metric),
+            'warmup': samples not checked (default 1), 'minSamples': checked samples needed for a trend (default 5),
+            'collectGarbage': collect the garbage before each sample (default true)}
+
+        Return
+        ----------
+        dict
+        The options
+
+        Raises
+        ----------
+        ValueError
+        If an option is invalid
+        """
+
+        if leakCheck is True:
+            leakCheck = {}
+
+        if not isinstance(leakCheck, dict):
+            raise ValueError("leakCheck must be true or an object")
+
+        thresholds = dict(cls.defaultThresholds)
+
+        for (name, threshold) in leakCheck.get('thresholds', {}).items():
+            if name not in cls.defaultThresholds:
+                raise ValueError("leakCheck metric must be one of " + ', '.join(cls.defaultThresholds))
+
+            if threshold is None:
+                del thresholds[name]
+            elif not isinstance(threshold, (int, float)) or isinstance(threshold, bool) or threshold <= 0:
+                raise ValueError("leakCheck threshold of " + name + " must be a positive number")
+            else:
+                thresholds[name] = threshold
+
+        options = {
+            'thresholds': thresholds,
+            'warmup': leakCheck.get('warmup', 1),
+            'minSamples': leakCheck.get('minSamples', 5),
+            'collectGarbage': leakCheck.get('collectGarbage', True),
+        }
+
+        for key in ['warmup', 'minSamples']:
+            if not isinstance(options[key], int) or isinstance(options[key], bool) or options[key] < 0:
+                raise ValueError("leakCheck " + key + " must be a non-negative integer")
+
+        if options['minSamples'] < 2:
+            raise ValueError("leakCheck minSamples must be at least 2")
+
+        return options
+
+    def add(self, metrics, samplingTime = 0):
+        """
+        Record a sample. The first `warmup` samples are not recorded.
+
+        Parameters
+        ----------
+        metrics : dict
+            The Performance.getMetrics values by name
+
+        samplingTime : number
+            The ms the sample took
+        """
+
+        self.samplingTime += samplingTime
+
+        if self.skipped < self.warmup:
+            self.skipped += 1
+            return
+
+        for name in self.series:
+            self.series[name].append(metrics.get(name))
+
+    def getSeries(self):
+        """
+        Get the recorded samples
+
+        Return
+        ----------
+        dict
+        The samples of each metric, in sampling order
+        """
+
+        return self.series
+
+    def getSampleCount(self):
+        """
+        Get the number of recorded samples
+
+        Return
+        ----------
+        int
+        The number of samples
+        """
+
+        return min(len(samples) for samples in self.series.values()) if len(self.series) > 0 else 0
+
+    def check(self):
+        """
+        Check the recorded samples for leaking metrics
+
+        Return
+        ----------
+        list
+        The leaks as {'metric', 'first', 'last', 'growth', 'threshold', 'samples'}. Empty if there are too few samples.
+        """
+
+        leaks = []
+
+        if self.getSampleCount() < self.minSamples:
+            return leaks
+
+        for (name, samples) in self.series.items():
+            if any(sample is None for sample in samples):
+                continue
+
+            threshold = self.thresholds[name]
+            growth = samples[-1] - samples[0]
+            peak = samples[0]
+            monotonic = True
+
+            for sample in samples[1:]:
+                if sample < peak - threshold / 10:
+                    monotonic = False
+                    break
+
+                peak = max(peak, sample)
+
+            if monotonic and growth > threshold:
+                leaks.append({'metric': name, 'first': samples[0], 'last': samples[-1], 'growth': growth, 'threshold': threshold, 'samples': len(samples)})
+
+        return leaks
+
+    @staticmethod
+    def format(leak):
+        """
+        Format a leak for the log
+
+        Parameters
+        ----------
+        leak : dict
+            A leak returned by check()
+
+        Return
+        ----------
+        string
+        The description
+        """
+
+        return (leak['metric'] + " grew from " + str(leak['first']) + " to " + str(leak['last']) + " over " + str(leak['samples'])
+            + " samples (+" + str(leak['growth']) + ", threshold " + str(leak['threshold']) + ")")
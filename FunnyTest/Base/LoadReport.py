@@ -0,0 +1,297 @@
+import os
+import re
+import math
+import time
+import threading
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+from ..Log.TestLog import TestLog
+
+class LoadReport:
+    """
+    Collects the step latencies of the iterations of a load test and reports the throughput and
+    p50/p95/p99 latency of each step across all virtual users.
+    It also measures the harness itself (time spent around the steps, oversleeping of the think time,
+    the CPU of the test process and, with psutil, the CPU of the whole host including the browsers and chromedrivers),
+    so a saturated load generator is not mistaken for a slow server.
+    """
+
+    # the CPU usage (percent of all cores) above which the generator counts as saturated
+    saturationCPU = 80
+
+    # the seconds between two samples of the host CPU
+    cpuInterval = 1
+
+    def __init__(self):
+        """
+        Constructor
+        """
+
+        self.lock = threading.Lock()
+        self.logUtil = TestLog()
+        self.steps = {}
+        self.openIterations = {}
+        self.iterations = 0
+        self.failedIterations = 0
+        self.overheads = []
+        self.thinkLags = []
+        self.startTime = None
+        self.startCPU = None
+        self.endTime = None
+        self.endCPU = None
+        self.hostCPU = []
+        self.cpuSampler = None
+        self.stopEvent = threading.Event()
+
+    @staticmethod
+    def percentile(values, percent):
+        """
+        Get a percentile with the nearest-rank method
+
+        Parameters
+        ----------
+        values : list
+            The sorted values
+
+        percent : number
+            The percentile, between 0 and 100
+
+        Return
+        ----------
+        number
+        The percentile, or None if there are no values
+        """
+
+        if len(values) == 0:
+            return None
+
+        return values[max(math.ceil(percent / 100 * len(values)) - 1, 0)]
+
+    def getStepKey(self, id, throttle = None):
+        """
+        Get the name a step is aggregated under: its id without the loop iteration indexes,
+        and the throttling profile it was measured under
+
+        Parameters
+        ----------
+        id : string
+            The procedure id
+
+        throttle : string
+            The name of the throttling profile, None if it was not throttled
+
+        Return
+        ----------
+        string
+        The step name
+        """
+
+        stepKey = re.sub(r'\.\d+(?=\.)', '', id)
+
+        if throttle is not None:
+            stepKey += ' [' + throttle + ']'
+
+        return stepKey
+
+    def start(self):
+        """
+        Start measuring
+        """
+
+        self.startTime = time.monotonic()
+        self.startCPU = time.process_time()
+
+        if psutil is not None:
+            # the first call only sets the reference point of the next one
+            psutil.cpu_percent(None)
+            self.cpuSampler = threading.Thread(target = self.sampleHostCPU, daemon = True)
+            self.cpuSampler.start()
+
+    def sampleHostCPU(self):
+        """
+        Sample the CPU usage of the whole host until finish() is called.
+        The browsers and chromedrivers of the virtual users are the main cost of the generator and are not part of the test process.
+        """
+
+        while not self.stopEvent.wait(self.cpuInterval):
+            self.hostCPU.append(psutil.cpu_percent(None))
+
+    def finish(self):
+        """
+        Stop measuring
+        """
+
+        self.endTime = time.monotonic()
+        self.endCPU = time.process_time()
+        self.stopEvent.set()
+
+        if self.cpuSampler is not None:
+            self.cpuSampler.join()
+            self.cpuSampler = None
+
+    def recordResult(self, procedureDict, validationResult, runName):
+        """
+        Record a finished step. Called by FunnyProcedure.saveResult, so the steps of streaming loops are recorded too.
+
+        Parameters
+        ----------
+        procedureDict : dict
+            The procedure definition
+
+        validationResult : dict
+            The validation result of the step
+
+        runName : string
+            The run name of the iteration
+        """
+
+        # the synthetic cases, e.g. of the leak checks, are not steps of the iteration
+        if procedureDict.get('type') not in ['stdProcedure', 'customProcedure']:
+            return
+
+        # the latency is reported instead of being checked against expectTime
+        failed = validationResult.get('timedOut') or not validationResult['expectedValueTestResult']
+
+        with self.lock:
+            step = self.steps.setdefault(self.getStepKey(procedureDict['id'], validationResult.get('throttle')), {'times': [], 'errors': 0})
+            step['times'].append(validationResult['actualTime'])
+
+            if failed:
+                step['errors'] += 1
+
+            iteration = self.openIterations.setdefault(runName, {'steps': 0, 'stepTime': 0, 'failed': False})
+            iteration['steps'] += 1
+            iteration['stepTime'] += validationResult['actualTime']
+            iteration['failed'] = iteration['failed'] or failed
+
+    def addIteration(self, runName, wallTime, success, thinkTime = None):
+        """
+        Close a finished iteration of a virtual user
+
+        Parameters
+        ----------
+        runName : string
+            The run name of the iteration
+
+        wallTime : number
+            The seconds the iteration took
+
+        success : bool
+            False if the run was aborted by an error
+
+        thinkTime : dict
+            The requested and actual seconds the iteration paused for
+        """
+
+        if thinkTime is None:
+            thinkTime = {'requested': 0, 'actual': 0}
+
+        with self.lock:
+            iteration = self.openIterations.pop(runName, {'steps': 0, 'stepTime': 0, 'failed': False})
+
+            if iteration['steps'] > 0:
+                self.overheads.append((wallTime * 1000 - iteration['stepTime'] - thinkTime['actual'] * 1000) / iteration['steps'])
+
+            if thinkTime['requested'] > 0:
+                self.thinkLags.append((thinkTime['actual'] - thinkTime['requested']) * 1000)
+
+            self.iterations += 1
+
+            if iteration['failed'] or not success:
+                self.failedIterations += 1
+
+    def summarize(self):
+        """
+        Aggregate the collected iterations
+
+        Return
+        ----------
+        dict
+        The duration, iterations, per-step stats and harness stats
+        """
+
+        duration = max((self.endTime if self.endTime is not None else time.monotonic()) - self.startTime, 0.001)
+        cpuTime = (self.endCPU if self.endCPU is not None else time.process_time()) - self.startCPU
+        steps = {}
+
+        with self.lock:
+            for (stepKey, step) in self.steps.items():
+                times = sorted(step['times'])
+
+                steps[stepKey] = {
+                    'count': len(times),
+                    'errors': step['errors'],
+                    'throughput': round(len(times) / duration, 3),
+                    'p50': self.percentile(times, 50),
+                    'p95': self.percentile(times, 95),
+                    'p99': self.percentile(times, 99),
+                    'max': times[-1],
+                }
+
+            overheads = sorted(self.overheads)
+            thinkLags = sorted(self.thinkLags)
+            hostCPU = sorted(self.hostCPU)
+
+            harness = {
+                'overheadMean': round(sum(overheads) / len(overheads), 1) if len(overheads) > 0 else None,
+                'overheadP95': round(self.percentile(overheads, 95), 1) if len(overheads) > 0 else None,
+                'thinkLagP95': round(self.percentile(thinkLags, 95), 1) if len(thinkLags) > 0 else None,
+                'cpu': round(cpuTime / duration / (os.cpu_count() or 1) * 100, 1),
+                'hostCPUMean': round(sum(hostCPU) / len(hostCPU), 1) if len(hostCPU) > 0 else None,
+                'hostCPUP95': round(self.percentile(hostCPU, 95), 1) if len(hostCPU) > 0 else None,
+            }
+
+            return {
+                'duration': round(duration, 1),
+                'iterations': self.iterations,
+                'failedIterations': self.failedIterations,
+                'steps': steps,
+                'harness': harness,
+            }
+
+    def print(self, report = None):
+        """
+        Print the report
+
+        Parameters
+        ----------
+        report : dict
+            The result of summarize(). Computed if None.
+        """
+
+        if report is None:
+            report = self.summarize()
+
+        self.logUtil.log("Load Test Summary")
+        self.logUtil.log("++++++++++++++++++++++++++++++")
+        self.logUtil.log("Duration: " + str(report['duration']) + " s, iterations: " + str(report['iterations']) + ", failed iterations: " + str(report['failedIterations']),
+            'success' if report['failedIterations'] == 0 else 'warning')
+        self.logUtil.log("")
+        self.logUtil.log("Step | count | errors | per second | p50 | p95 | p99 | max (ms)")
+
+        for (stepKey, step) in report['steps'].items():
+            self.logUtil.log('+ ' + stepKey + ' | ' + ' | '.join(str(step[key]) for key in ['count', 'errors', 'throughput', 'p50', 'p95', 'p99', 'max']),
+                'warning' if step['errors'] > 0 else 'info')
+
+        harness = report['harness']
+
+        self.logUtil.log("")
+        self.logUtil.log("Harness overhead per step (ms): mean " + str(harness['overheadMean']) + ", p95 " + str(harness['overheadP95']))
+
+        if harness['thinkLagP95'] is not None:
+            self.logUtil.log("Think time oversleep per iteration (ms): p95 " + str(harness['thinkLagP95']))
+
+        self.logUtil.log("Test process CPU: " + str(harness['cpu']) + "% of all cores")
+
+        if harness['hostCPUP95'] is not None:
+            self.logUtil.log("Host CPU (browsers included): mean " + str(harness['hostCPUMean']) + "%, p95 " + str(harness['hostCPUP95']) + "% of all cores")
+
+        # without psutil, only the test process can be measured
+        saturation = harness['hostCPUP95'] if harness['hostCPUP95'] is not None else harness['cpu']
+
+        if saturation > self.saturationCPU:
+            self.logUtil.log("The load generator is saturated. The latencies include client-side queuing, reduce the users or add hosts.", 'warning')
@@ -0,0 +1,164 @@
+import os
+import csv
+import json
+
+from ..Log.TestLog import TestLog
+
+class LoopSource:
+    """
+    Lazy item sources for loops, so large inputs never have to be held in memory as a whole.
+
+    The first param of a loop can be:
+        a list: the items are looped through as before
+        {"lines": "path/to/file"}: every non-empty line of a text file
+        {"csv": "path/to/file.csv", "column": "url"}: a column of a csv file (the whole row as a dict if no column is given)
+        {"jsonl": "path/to/file.jsonl"}: every line of a JSON Lines file, parsed
+        {"paginate": {"css": "a.item", "attr": "href", "nextCSS": "a.next", "waitCSS": "a.item", "timeOut": 40, "maxPages": 10}}:
+            the attributes of the elements on the current page, then on every page reached by clicking "next" until it is gone
+        any other iterable, for example a generator returned by a custom procedure
+
+    Relative file paths are resolved against the base path, normally the test case folder.
+    """
+
+    def __init__(self, funnyTestBase, basePath = None):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        funnyTestBase : object
+            The FunnyTestBase used by paginated sources
+
+        basePath : string
+            The folder relative file paths are resolved against. If None, the working directory.
+        """
+
+        self.funnyTestBase = funnyTestBase
+        self.basePath = basePath
+        self.logUtil = TestLog()
+
+    def getPath(self, path):
+        """
+        Resolve the path of a file source
+
+        Parameters
+        ----------
+        path : string
+            The path given in the source
+
+        Return
+        ----------
+        string
+        The path relative to the base path, or the path itself if it is absolute
+        """
+
+        if self.basePath is None or os.path.isabs(path):
+            return path
+
+        return os.path.join(self.basePath, path)
+
+    def open(self, source):
+        """
+        Get an iterator over the items of a loop source
+
+        Parameters
+        ----------
+        source : any
+            The first param of the loop
+
+        Return
+        ----------
+        iterator
+        The items, or None if the source is not supported
+        """
+
+        if isinstance(source, list):
+            return iter(source)
+
+        if isinstance(source, dict):
+            if 'lines' in source:
+                return self.iterateLines(self.getPath(source['lines']))
+
+            if 'csv' in source:
+                return self.iterateCSV(self.getPath(source['csv']), source.get('column'))
+
+            if 'jsonl' in source:
+                return self.iterateJSONLines(self.getPath(source['jsonl']))
+
+            if 'paginate' in source:
+                self.funnyTestBase.getDriver()
+                return self.funnyTestBase.iterateAttributes(**source['paginate'])
+
+            return None
+
+        if isinstance(source, (str, bytes)):
+            return None
+
+        try:
+            return iter(source)
+        except TypeError:
+            return None
+
+    def isStreaming(self, source):
+        """
+        Check if a loop source produces its items lazily
+
+        Parameters
+        ----------
+        source : any
+            The first param of the loop
+
+        Return
+        ----------
+        bool
+        Return True for every source but a list
+        """
+
+        return not isinstance(source, list)
+
+    def iterateLines(self, path):
+        """
+        Iterate over the non-empty lines of a text file
+
+        Parameters
+        ----------
+        path : string
+            The file path
+        """
+
+        with open(path, 'r') as lineFile:
+            for line in lineFile:
+                line = line.strip()
+
+                if len(line) > 0:
+                    yield line
+
+    def iterateCSV(self, path, column = None):
+        """
+        Iterate over the rows of a csv file with a header line
+
+        Parameters
+        ----------
+        path : string
+            The file path
+
+        column : string
+            The column to return. If None, the whole row is returned as a dict.
+        """
+
+        with open(path, 'r', newline = '') as csvFile:
+            for row in csv.DictReader(csvFile):
+                yield row if column is None else row[column]
+
+    def iterateJSONLines(self, path):
+        """
+        Iterate over the values of a JSON Lines file
+
+        Parameters
+        ----------
+        path : string
+            The file path
+        """
+
+        for line in self.iterateLines(path):
+            yield json.loads(line)
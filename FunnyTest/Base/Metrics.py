@@ -0,0 +1,296 @@
+import os
+import time
+import bisect
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from ..Log.TestLog import TestLog
+
+class Metrics:
+    """
+    Live counters of the running tests in the Prometheus text format.
+    Updated from FunnyProcedure.saveResult and the starter, read through an optional local HTTP endpoint (/metrics)
+    and/or a snapshot file rewritten periodically. Recording is a few integer operations under one lock,
+    so it can stay enabled for every run.
+
+    Exposed metrics:
+        funnytest_steps_total{result}                        counter
+        funnytest_steps_per_second                           gauge, over the last minute
+        funnytest_step_duration_ms{command,throttle}         histogram (visit, click, waitFor, ..., custom) per throttling profile
+        funnytest_failures_total{type}                       counter (value, time, timeout, error)
+        funnytest_active_sessions                            gauge, runs being executed
+        funnytest_queue_depth                                gauge, runs waiting for a session
+    """
+
+    # the upper bounds of the latency histogram buckets in ms
+    buckets = [10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000]
+
+    # the seconds steps_per_second is averaged over
+    rateWindow = 60
+
+    def __init__(self):
+        """
+        Constructor
+        """
+
+        self.lock = threading.Lock()
+        self.stopEvent = threading.Event()
+        self.logUtil = TestLog()
+        self.server = None
+        self.snapshotFile = None
+        self.steps = {'success': 0, 'failure': 0}
+        self.failures = {'value': 0, 'time': 0, 'timeout': 0, 'error': 0}
+        self.histograms = {}
+        self.activeSessions = 0
+        self.queueDepth = 0
+
+        # steps finished in each second of the rate window, as a ring indexed by the second
+        self.secondCounts = [0] * self.rateWindow
+        self.secondStamps = [0] * self.rateWindow
+        self.startTime = time.monotonic()
+
+    def recordStep(self, command, actualTime, failureTypes, throttle = None):
+        """
+        Record a finished std/custom procedure
+
+        Parameters
+        ----------
+        command : string
+            The histogram label: the standard command or "custom"
+
+        actualTime : number
+            The time consumption in ms
+
+        failureTypes : list
+            The failure types of the step, empty if it passed
+
+        throttle : string
+            The name of the throttling profile the step was measured under, None if it was not throttled
+        """
+
+        second = int(time.monotonic())
+        slot = second % self.rateWindow
+
+        with self.lock:
+            self.steps['failure' if len(failureTypes) > 0 else 'success'] += 1
+
+            for failureType in failureTypes:
+                self.failures[failureType] += 1
+
+            key = (command, throttle if throttle is not None else 'none')
+
+            if key not in self.histograms:
+                self.histograms[key] = {'counts': [0] * (len(self.buckets) + 1), 'sum': 0}
+
+            histogram = self.histograms[key]
+            histogram['counts'][bisect.bisect_left(self.buckets, actualTime)] += 1
+            histogram['sum'] += actualTime
+
+            if self.secondStamps[slot] != second:
+                self.secondStamps[slot] = second
+                self.secondCounts[slot] = 0
+
+            self.secondCounts[slot] += 1
+
+    def recordError(self):
+        """
+        Record a run aborted by an exception
+        """
+
+        with self.lock:
+            self.failures['error'] += 1
+
+    def setQueueDepth(self, queueDepth):
+        """
+        Set the number of runs waiting for a session
+
+        Parameters
+        ----------
+        queueDepth : int
+            The number of waiting runs
+        """
+
+        with self.lock:
+            self.queueDepth = queueDepth
+
+    def runStarted(self):
+        """
+        Record a run taken from the queue by a session
+        """
+
+        with self.lock:
+            self.activeSessions += 1
+            self.queueDepth = max(self.queueDepth - 1, 0)
+
+    def runFinished(self):
+        """
+        Record a run given back its session
+        """
+
+        with self.lock:
+            self.activeSessions -= 1
+
+    def getStepsPerSecond(self):
+        """
+        Get the steps finished per second over the rate window (or since the start, if shorter)
+
+        Return
+        ----------
+        float
+        The throughput
+        """
+
+        now = int(time.monotonic())
+        window = min(self.rateWindow, max(time.monotonic() - self.startTime, 1))
+
+        with self.lock:
+            steps = sum(count for (count, stamp) in zip(self.secondCounts, self.secondStamps) if now - stamp < self.rateWindow)
+
+        return steps / window
+
+    def render(self):
+        """
+        Render the metrics in the Prometheus text exposition format
+
+        Return
+        ----------
+        string
+        The metrics
+        """
+
+        stepsPerSecond = self.getStepsPerSecond()
+        lines = []
+
+        with self.lock:
+            lines.append('# HELP funnytest_steps_total Finished std and custom procedures.')
+            lines.append('# TYPE funnytest_steps_total counter')
+
+            for (result, count) in self.steps.items():
+                lines.append('funnytest_steps_total{result="' + result + '"} ' + str(count))
+
+            lines.append('# HELP funnytest_steps_per_second Finished procedures per second over the last minute.')
+            lines.append('# TYPE funnytest_steps_per_second gauge')
+            lines.append('funnytest_steps_per_second ' + str(round(stepsPerSecond, 3)))
+
+            lines.append('# HELP funnytest_step_duration_ms Procedure latency by command and throttling profile.')
+            lines.append('# TYPE funnytest_step_duration_ms histogram')
+
+            for ((command, throttle), histogram) in sorted(self.histograms.items()):
+                labels = 'command="' + command + '",throttle="' + throttle.replace('"', "'") + '"'
+                cumulative = 0
+
+                for (bound, count) in zip(self.buckets + ['+Inf'], histogram['counts']):
+                    cumulative += count
+                    lines.append('funnytest_step_duration_ms_bucket{' + labels + ',le="' + str(bound) + '"} ' + str(cumulative))
+
+                lines.append('funnytest_step_duration_ms_sum{' + labels + '} ' + str(histogram['sum']))
+                lines.append('funnytest_step_duration_ms_count{' + labels + '} ' + str(cumulative))
+
+            lines.append('# HELP funnytest_failures_total Failed procedures by type and runs aborted by an error.')
+            lines.append('# TYPE funnytest_failures_total counter')
+
+            for (failureType, count) in self.failures.items():
+                lines.append('funnytest_failures_total{type="' + failureType + '"} ' + str(count))
+
+            lines.append('# HELP funnytest_active_sessions Runs being executed.')
+            lines.append('# TYPE funnytest_active_sessions gauge')
+            lines.append('funnytest_active_sessions ' + str(self.activeSessions))
+
+            lines.append('# HELP funnytest_queue_depth Runs waiting for a browser session.')
+            lines.append('# TYPE funnytest_queue_depth gauge')
+            lines.append('funnytest_queue_depth ' + str(self.queueDepth))
+
+        return '\n'.join(lines) + '\n'
+
+    def writeSnapshot(self, path):
+        """
+        Write the metrics to a file, replacing it atomically
+
+        Parameters
+        ----------
+        path : string
+            The file path
+        """
+
+        tmpPath = path + '.tmp'
+
+        with open(tmpPath, 'w') as snapshotFile:
+            snapshotFile.write(self.render())
+
+        os.replace(tmpPath, path)
+
+    def start(self, port = None, snapshotFile = None, snapshotInterval = 5):
+        """
+        Start serving the metrics on 127.0.0.1:port/metrics and/or writing them to a file
+
+        Parameters
+        ----------
+        port : int
+            The port of the HTTP endpoint. None disables it.
+
+        snapshotFile : string
+            The file to write the metrics to. None disables it.
+
+        snapshotInterval : number
+            The seconds between two snapshots
+        """
+
+        if port is not None:
+            metrics = self
+
+            class Handler(MetricsHandler):
+                source = metrics
+
+            self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+            threading.Thread(target = self.server.serve_forever, daemon = True).start()
+            self.logUtil.log("Metrics available on http://127.0.0.1:" + str(port) + "/metrics")
+
+        if snapshotFile is not None:
+            def writeSnapshots():
+                while not self.stopEvent.wait(snapshotInterval):
+                    try:
+                        self.writeSnapshot(snapshotFile)
+                    except OSError as e:
+                        self.logUtil.log("Metrics snapshot not written: " + str(e), 'warning')
+
+            self.snapshotFile = snapshotFile
+            threading.Thread(target = writeSnapshots, daemon = True).start()
+
+    def stop(self):
+        """
+        Stop the endpoint and write the last snapshot
+        """
+
+        self.stopEvent.set()
+
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+        if self.snapshotFile is not None:
+            self.writeSnapshot(self.snapshotFile)
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """
+    The HTTP handler serving the Prometheus metrics
+    """
+
+    source = None
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ['/', '/metrics']:
+            self.send_response(404)
+            self.end_headers()
+            return
+
+        body = self.source.render().encode('utf-8')
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
@@ -0,0 +1,194 @@
+import json
+import threading
+
+class PrefixTree:
+    """
+    Prefix tree of the top-level procedures of the runs, to execute a leading sequence shared by several runs once.
+    The first run through a node owns it. A later run forks from the owner of the deepest node it shares:
+    the owner captures its browser state and results when it reaches that depth (a fork point),
+    and the later run starts from them instead of executing the shared procedures.
+
+    Procedures with `"fork": false` or referencing a dataset field end the shareable prefix of a run.
+    """
+
+    def __init__(self):
+        self.root = {'children': {}, 'owner': None}
+        self.lock = threading.Lock()
+        # run name => (run name it forks from, number of shared procedures)
+        self.forks = {}
+        # run name => the depths other runs fork at
+        self.forkPoints = {}
+        self.snapshots = {}
+        self.events = {}
+
+    @staticmethod
+    def getStepKey(procedureDict):
+        """
+        Get the key two equal procedures share
+
+        Parameters
+        ----------
+        procedureDict : dict
+            The procedure definition
+
+        Return
+        ----------
+        string
+        The key, or None if the procedure can not be shared
+        """
+
+        if procedureDict.get('fork') is False:
+            return None
+
+        key = json.dumps(procedureDict, sort_keys = True, default = repr)
+
+        # each dataset row has its own values
+        if '%data[' in key:
+            return None
+
+        return key
+
+    def add(self, runName, procedureList, context = None):
+        """
+        Add a run, in execution order
+
+        Parameters
+        ----------
+        runName : string
+            The run name
+
+        procedureList : list
+            The top-level procedures of the run, before they are executed
+
+        context : any
+            The run settings the procedures depend on, e.g. the throttling profile. Runs with different contexts share nothing.
+        """
+
+        contextKey = json.dumps(context, sort_keys = True, default = repr)
+
+        if contextKey not in self.root['children']:
+            self.root['children'][contextKey] = {'children': {}, 'owner': None}
+
+        node = self.root['children'][contextKey]
+        path = []
+
+        for procedureDict in procedureList:
+            key = self.getStepKey(procedureDict)
+
+            if key is None:
+                break
+
+            if key not in node['children']:
+                node['children'][key] = {'children': {}, 'owner': runName}
+
+            node = node['children'][key]
+            path.append(node)
+
+        depth = 0
+
+        for (idx, node) in enumerate(path):
+            if node['owner'] != runName:
+                depth = idx + 1
+
+        # a prefix ending with subprocedure definitions is shared up to its last executed procedure
+        while depth > 0 and 'subprocedure' in procedureList[depth - 1]:
+            depth -= 1
+
+        if depth == 0:
+            return
+
+        parentName = path[depth - 1]['owner']
+        self.forks[runName] = (parentName, depth)
+        self.forkPoints.setdefault(parentName, set()).add(depth)
+        self.events.setdefault((parentName, depth), threading.Event())
+
+    def getFork(self, runName):
+        """
+        Get the run a run forks from
+
+        Parameters
+        ----------
+        runName : string
+            The run name
+
+        Return
+        ----------
+        tuple
+        (the run name it forks from, the number of shared top-level procedures), or None
+        """
+
+        return self.forks.get(runName)
+
+    def getForkPoints(self, runName):
+        """
+        Get the depths at which a run captures its state for the runs forking from it
+
+        Parameters
+        ----------
+        runName : string
+            The run name
+
+        Return
+        ----------
+        list
+        The sorted depths
+        """
+
+        return sorted(self.forkPoints.get(runName, ()))
+
+    def putSnapshot(self, runName, depth, snapshot):
+        """
+        Publish the state of a run at a fork point
+
+        Parameters
+        ----------
+        runName : string
+            The run name
+
+        depth : int
+            The number of top-level procedures before the fork point
+
+        snapshot : dict
+            {'state': browser state, 'results': the results as json}, or {'reason': why the run can not be forked}
+        """
+
+        with self.lock:
+            if (runName, depth) in self.snapshots:
+                return
+
+            self.snapshots[(runName, depth)] = snapshot
+
+        self.events[(runName, depth)].set()
+
+    def finishRun(self, runName):
+        """
+        Release the runs waiting for fork points a finished run never reached
+
+        Parameters
+        ----------
+        runName : string
+            The run name
+        """
+
+        for depth in self.getForkPoints(runName):
+            self.putSnapshot(runName, depth, {'reason': runName + " did not complete the shared procedures"})
+
+    def waitSnapshot(self, runName):
+        """
+        Wait until the run a run forks from reached the fork point
+
+        Parameters
+        ----------
+        runName : string
+            The run name
+
+        Return
+        ----------
+        dict
+        The snapshot, see putSnapshot
+        """
+
+        fork = self.forks[runName]
+        self.events[fork].wait()
+
+        return self.snapshots[fork]
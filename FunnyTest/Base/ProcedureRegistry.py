@@ -0,0 +1,191 @@
+import os
+import sys
+import importlib
+import threading
+
+from ..Log.TestLog import TestLog
+
+class ProcedureRegistry:
+    """
+    Process-wide index of the custom procedure functions in a directory.
+    The modules are imported on the first lookup, only once per process, and reloaded only when the mtime of their file changes.
+    """
+
+    registries = {}
+    registriesLock = threading.Lock()
+
+    @classmethod
+    def getRegistry(cls, path):
+        """
+        Get the registry of a directory, created on first use
+
+        Parameters
+        ----------
+        path : string
+            The path to the directory containing the customized procedures
+
+        Return
+        ----------
+        object
+        The registry shared by the whole process
+        """
+
+        path = os.path.abspath(path)
+
+        with cls.registriesLock:
+            if path not in cls.registries:
+                cls.registries[path] = ProcedureRegistry(path)
+
+            return cls.registries[path]
+
+    def __init__(self, path):
+        """
+        Constructor. Use getRegistry to share the registry of a directory.
+
+        Parameters
+        ----------
+        path : string
+            The absolute path to the directory containing the customized procedures
+        """
+
+        self.path = path
+        self.modules = {}
+        self.mtimes = {}
+        self.index = {}
+        self.sources = {}
+        self.stale = True
+        self.lock = threading.RLock()
+        self.logUtil = TestLog()
+
+    def markStale(self):
+        """
+        Make the next lookup check the module files for changes
+        """
+
+        self.stale = True
+
+    def refresh(self):
+        """
+        Import new modules, reload modules whose file changed, drop removed modules and rebuild the index if needed
+
+        Return
+        ----------
+        list
+        The names of the modules imported, reloaded or removed
+        """
+
+        with self.lock:
+            self.stale = False
+
+            if self.path not in sys.path:
+                sys.path.append(self.path)
+
+            mtimes = {}
+
+            for module in sorted(os.listdir(self.path)):
+
+                if module == '__init__.py' or module[-3:] != '.py':
+                    continue
+
+                mtimes[module[:-3]] = os.stat(os.path.join(self.path, module)).st_mtime
+
+            changed = []
+
+            for name in list(self.modules):
+                if name not in mtimes:
+                    del self.modules[name]
+                    del self.mtimes[name]
+                    changed.append(name)
+
+            for (name, mtime) in mtimes.items():
+                if self.mtimes.get(name) == mtime:
+                    continue
+
+                if name in self.modules:
+                    self.modules[name] = importlib.reload(self.modules[name])
+                else:
+                    self.modules[name] = importlib.import_module(name)
+
+                self.mtimes[name] = mtime
+                changed.append(name)
+
+            if len(changed) > 0:
+                self.buildIndex()
+
+            return changed
+
+    def buildIndex(self):
+        """
+        Build the name -> function index of the functions defined in the modules and report name collisions
+        """
+
+        index = {}
+        sources = {}
+
+        for name in sorted(self.modules):
+            mod = self.modules[name]
+
+            for (funcName, func) in vars(mod).items():
+
+                if funcName.startswith('_') or not callable(func) or getattr(func, '__module__', None) != mod.__name__:
+                    continue
+
+                if funcName in index:
+                    self.logUtil.log("Custom procedure " + funcName + " is defined in both " + sources[funcName] + " and " + name + ". Using the one in " + sources[funcName] + ".", 'warning')
+                    continue
+
+                index[funcName] = func
+                sources[funcName] = name
+
+        self.index = index
+        self.sources = sources
+
+    def get(self, funcName):
+        """
+        Find a custom procedure function
+
+        Parameters
+        ----------
+        funcName : string
+            The function name
+
+        Return
+        ----------
+        function
+        The function, or None if no module has it
+        """
+
+        with self.lock:
+            if self.stale:
+                self.refresh()
+
+            if funcName in self.index:
+                return self.index[funcName]
+
+            # names imported into the modules are not indexed but stay reachable
+            for name in sorted(self.modules):
+                if hasattr(self.modules[name], funcName):
+                    return getattr(self.modules[name], funcName)
+
+            return None
+
+    def getSource(self, funcName):
+        """
+        Get the module defining a custom procedure function
+
+        Parameters
+        ----------
+        funcName : string
+            The function name
+
+        Return
+        ----------
+        string
+        The module name, or None
+        """
+
+        with self.lock:
+            if self.stale:
+                self.refresh()
+
+            return self.sources.get(funcName)
@@ -0,0 +1,191 @@
+import os
+import time
+import shutil
+import tempfile
+import subprocess
+
+from ..Log.TestLog import TestLog
+
+class ProfileTemplate:
+    """
+    A Chrome user data directory warmed up once (HTTP cache, service workers, compiled code cache)
+    and cloned for every browser session, so the sessions stay isolated but skip the cold first load.
+    The clones are made in tmpfs (/dev/shm) when available, with a copy-on-write clone where the file system supports it.
+    The template itself is never written by the sessions.
+    """
+
+    # files Chrome leaves to lock a profile to one process
+    lockFiles = ['SingletonLock', 'SingletonCookie', 'SingletonSocket', 'lockfile']
+
+    # written into the template by build(), so a rebuild only ever replaces a directory it made itself
+    markerFile = '.funnytest-template'
+
+    def __init__(self, path, cloneRoot = None):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        path : string
+            The template directory
+
+        cloneRoot : string
+            The directory the clones are made in. Default to /dev/shm if it exists, else the temp directory.
+        """
+
+        self.path = os.path.abspath(path)
+        self.logUtil = TestLog()
+
+        if cloneRoot is None and os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK):
+            cloneRoot = '/dev/shm'
+
+        self.cloneRoot = cloneRoot
+
+    def exists(self):
+        """
+        Check if the template was built
+
+        Return
+        ----------
+        bool
+        Return True if the template directory exists.
+        Otherwise False.
+        """
+
+        return os.path.isdir(self.path)
+
+    def clone(self):
+        """
+        Make a private copy of the template for one browser session
+
+        Return
+        ----------
+        string
+        The directory of the copy
+        """
+
+        target = tempfile.mkdtemp(prefix = 'funnytest-profile-', dir = self.cloneRoot)
+
+        try:
+            # --reflink=auto makes a copy-on-write clone on btrfs/xfs and a plain copy elsewhere
+            subprocess.run(['cp', '-a', '--reflink=auto', self.path + '/.', target], check = True, stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL)
+        except (OSError, subprocess.CalledProcessError):
+            shutil.rmtree(target, ignore_errors = True)
+            shutil.copytree(self.path, target, symlinks = True)
+
+        for lockFile in self.lockFiles:
+            lockPath = os.path.join(target, lockFile)
+
+            if os.path.lexists(lockPath):
+                os.remove(lockPath)
+
+        return target
+
+    def removeClone(self, clonePath):
+        """
+        Remove the copy of a closed session
+
+        Parameters
+        ----------
+        clonePath : string
+            The directory of the copy
+        """
+
+        shutil.rmtree(clonePath, ignore_errors = True)
+
+    def visitAll(self, driver, urls, settle):
+        """
+        Visit the urls one by one and measure the time until each page is loaded
+
+        Parameters
+        ----------
+        driver : object
+            The selenium driver
+
+        urls : list
+            The urls
+
+        settle : number
+            The seconds to stay on each page, so service workers install and caches are written
+
+        Return
+        ----------
+        dict
+        The load time of each url in ms
+        """
+
+        timings = {}
+
+        for url in urls:
+            start = time.time()
+            driver.get(url)
+            timings[url] = round((time.time() - start) * 1000)
+            time.sleep(settle)
+
+        return timings
+
+    def build(self, urls, isHeadless = True, windowSize = "1920,1080", settle = 2):
+        """
+        Build the template by visiting the urls with a new profile, then measure the same visits on a clone
+
+        Parameters
+        ----------
+        urls : list
+            The pages whose resources should be cached, e.g. the entry pages of the app
+
+        isHeadless : bool
+            set the browser to headless mode
+
+        windowSize : string
+            set the window size
+
+        settle : number
+            The seconds to stay on each page
+
+        Return
+        ----------
+        dict
+        {'cold': load time of each url in ms with the empty profile, 'warm': with a clone of the template}
+
+        Raises
+        ----------
+        ValueError
+        If the directory exists, is not empty and was not built as a template before
+        """
+
+        from .FunnyTestBase import FunnyTestBase
+
+        if self.exists() and len(os.listdir(self.path)) > 0:
+            if not os.path.isfile(os.path.join(self.path, self.markerFile)):
+                raise ValueError(self.path + " is not empty and is not a profile template. Refusing to replace it.")
+
+            shutil.rmtree(self.path)
+
+        os.makedirs(self.path, exist_ok = True)
+
+        with open(os.path.join(self.path, self.markerFile), 'w') as markerFile:
+            markerFile.write(time.strftime('%Y-%m-%d %H:%M:%S') + '\n')
+
+        # the template is built in place: a session with a clone of the (still empty) template would write elsewhere
+        session = FunnyTestBase(isHeadless, windowSize, profileDir = self.path)
+
+        try:
+            cold = self.visitAll(session.getDriver(), urls, settle)
+        finally:
+            # quitting cleanly flushes the cache index to the profile
+            session.quit()
+
+        session = FunnyTestBase(isHeadless, windowSize, profileTemplate = self)
+
+        try:
+            warm = self.visitAll(session.getDriver(), urls, 0)
+        finally:
+            session.quit()
+
+        self.logUtil.log("Profile template " + self.path + " built.", 'success')
+        self.logUtil.log("Load time (ms) | cold | warm")
+
+        for url in urls:
+            self.logUtil.log('+ ' + url + ' | ' + str(cold[url]) + ' | ' + str(warm[url]))
+
+        return {'cold': cold, 'warm': warm}
@@ -0,0 +1,245 @@
+import os
+import sys
+import time
+import threading
+
+from ..Log.TestLog import TestLog
+
+class Profiler(threading.Thread):
+    """
+    Sampling profiler of the Python code executed by the procedures.
+    A background thread takes the stacks of the threads currently running a procedure at a fixed interval.
+    Each stack is rooted at the procedure it belongs to (e.g. `customProcedure:extractTitle`, nested under
+    the loop or subprocedure calling it), so the samples of all runs and iterations add up in one profile:
+    a collapsed-stack file for flame graph tools and a table of the hottest functions.
+
+    The samples are wall-clock: the time waiting for the browser shows up in selenium's remote_connection frames.
+    """
+
+    # the number of functions listed by print()
+    top = 20
+
+    def __init__(self, interval = 0.01):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        interval : number
+            The seconds between two samples
+        """
+
+        threading.Thread.__init__(self, daemon = True)
+
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.stopEvent = threading.Event()
+        self.logUtil = TestLog()
+        # thread id => [(frame of the procedure() call, label of its current procedure)], outermost first
+        self.active = {}
+        self.labels = set()
+        self.frameNames = {}
+        self.stacks = {}
+        self.rounds = 0
+        self.elapsed = 0
+        self.overhead = 0
+
+    def mark(self, label):
+        """
+        Set the procedure the calling procedure() frame is executing. Procedures of nested procedure() calls
+        are stacked under it until the calling frame marks its next procedure.
+
+        Parameters
+        ----------
+        label : string
+            The label of the procedure, or None when the frame stopped executing procedures
+        """
+
+        frame = sys._getframe(1)
+        threadId = threading.get_ident()
+
+        with self.lock:
+            entries = self.active.get(threadId, [])
+
+            for (idx, entry) in enumerate(entries):
+                if entry[0] is frame:
+                    # the procedures marked by the frame itself or by the nested calls it made are done
+                    del entries[idx:]
+                    break
+
+            if label is not None:
+                entries.append((frame, label))
+                self.labels.add(label)
+
+            if len(entries) > 0:
+                self.active[threadId] = entries
+            else:
+                self.active.pop(threadId, None)
+
+    def getFrameName(self, code):
+        """
+        Get the name of a function in the collapsed stacks
+
+        Parameters
+        ----------
+        code : object
+            The code object of the function
+
+        Return
+        ----------
+        string
+        The name, e.g. `FunnyProcedure.parseShortCode (FunnyProcedure.py)`
+        """
+
+        name = self.frameNames.get(code)
+
+        if name is None:
+            name = getattr(code, 'co_qualname', code.co_name) + ' (' + os.path.basename(code.co_filename) + ')'
+            # ; separates the frames of a collapsed stack
+            name = name.replace(';', ':')
+            self.frameNames[code] = name
+
+        return name
+
+    def sample(self):
+        """
+        Take the stacks of the threads executing a procedure once
+        """
+
+        frames = sys._current_frames()
+
+        with self.lock:
+            for (threadId, entries) in self.active.items():
+                frame = frames.get(threadId)
+                labels = {id(entryFrame): label for (entryFrame, label) in entries}
+                names = []
+                root = 0
+
+                # walk from the leaf to the outermost marked procedure() frame, the frames above it are not profiled
+                while frame is not None:
+                    if id(frame) in labels:
+                        names.append(labels[id(frame)])
+                        root = len(names)
+
+                    names.append(self.getFrameName(frame.f_code))
+                    frame = frame.f_back
+
+                if root == 0:
+                    continue
+
+                stack = tuple(reversed(names[:root]))
+                self.stacks[stack] = self.stacks.get(stack, 0) + 1
+
+    def stop(self):
+        """
+        Stop the sampler thread
+        """
+
+        self.stopEvent.set()
+
+        if self.is_alive():
+            self.join()
+
+    def run(self):
+        startTime = time.monotonic()
+        startCPU = time.thread_time()
+
+        while not self.stopEvent.wait(self.interval):
+            try:
+                self.sample()
+            except Exception as e:
+                self.logUtil.log(e)
+                continue
+
+            self.rounds += 1
+
+        self.elapsed = time.monotonic() - startTime
+        self.overhead = time.thread_time() - startCPU
+
+    def write(self, path):
+        """
+        Write the profile in the collapsed-stack format (`frame;frame;frame samples` per line),
+        readable by flamegraph.pl, speedscope and inferno
+
+        Parameters
+        ----------
+        path : string
+            The file
+        """
+
+        with self.lock:
+            lines = [';'.join(stack) + ' ' + str(count) for (stack, count) in self.stacks.items()]
+
+        lines.sort()
+
+        with open(path, 'w') as profileFile:
+            profileFile.write('\n'.join(lines) + '\n')
+
+        self.logUtil.log("Profile written to " + path + ".", 'success')
+
+    def summarize(self):
+        """
+        Aggregate the samples by function and by procedure
+
+        Return
+        ----------
+        dict
+        The sample count, the ms per sample, the sampler CPU, the self/total samples of the functions and the total samples of the procedures
+        """
+
+        functions = {}
+        procedures = {}
+        samples = 0
+
+        with self.lock:
+            stacks = list(self.stacks.items())
+
+        for (stack, count) in stacks:
+            samples += count
+            # the leaf is always a function, the labels are followed by the procedure() frame
+            functions.setdefault(stack[-1], {'self': 0, 'total': 0})['self'] += count
+
+            # recursive functions are only counted once per stack
+            for name in set(stack):
+                if name in self.labels:
+                    procedures[name] = procedures.get(name, 0) + count
+                else:
+                    functions.setdefault(name, {'self': 0, 'total': 0})['total'] += count
+
+        return {
+            'samples': samples,
+            'msPerSample': self.elapsed * 1000 / self.rounds if self.rounds > 0 else self.interval * 1000,
+            'overhead': round(self.overhead / self.elapsed * 100, 2) if self.elapsed > 0 else 0,
+            'functions': functions,
+            'procedures': procedures,
+        }
+
+    def print(self, report = None):
+        """
+        Print the procedures and the top functions by self time
+
+        Parameters
+        ----------
+        report : dict
+            The result of summarize(). Computed if None.
+        """
+
+        if report is None:
+            report = self.summarize()
+
+        msPerSample = report['msPerSample']
+
+        self.logUtil.log("++++++++++++++++++++++++++++++")
+        self.logUtil.log("Profile: " + str(report['samples']) + " samples, every " + str(round(msPerSample, 1)) + " ms, sampler CPU " + str(report['overhead']) + "% of one core")
+        self.logUtil.log("++++++++++++++++++++++++++++++")
+        self.logUtil.log("Procedure | total ms")
+
+        for (label, count) in sorted(report['procedures'].items(), key = lambda item: -item[1]):
+            self.logUtil.log('+ ' + label + ' | ' + str(round(count * msPerSample)))
+
+        self.logUtil.log("")
+        self.logUtil.log("Function | self ms | total ms | self %")
+
+        for (name, counts) in sorted(report['functions'].items(), key = lambda item: -item[1]['self'])[:self.top]:
+            self.logUtil.log('+ ' + name + ' | ' + str(round(counts['self'] * msPerSample)) + ' | ' + str(round(counts['total'] * msPerSample))
+                + ' | ' + str(round(counts['self'] / max(report['samples'], 1) * 100, 1)))
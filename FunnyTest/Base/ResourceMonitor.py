@@ -0,0 +1,188 @@
+import threading
+import collections
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+from ..Log.TestLog import TestLog
+
+class ResourceMonitor(threading.Thread):
+    """
+    Background thread sampling the RSS and CPU usage of a browser session's process tree
+    (chromedriver, Chrome and all its helper and renderer processes).
+    The samples of the current period (normally a run) are aggregated into peak and mean values,
+    and the latest samples are compared against the recycle thresholds.
+    Needs psutil.
+    """
+
+    def __init__(self, getRootPid, interval = 1, window = 5):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        getRootPid : function
+            Returns the pid of the root process to sample, or None while there is no session
+
+        interval : number
+            The seconds between two samples
+
+        window : int
+            The number of latest samples the CPU threshold is compared against
+        """
+
+        threading.Thread.__init__(self, daemon = True)
+
+        self.getRootPid = getRootPid
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.stopEvent = threading.Event()
+        self.processes = {}
+        self.recentCPU = collections.deque(maxlen = window)
+        self.lastRSS = 0
+        self.logUtil = TestLog()
+        self.startPeriod()
+
+    def sample(self):
+        """
+        Measure the process tree once
+
+        Return
+        ----------
+        tuple
+        (rss in bytes, cpu percent), or None if there is no process to measure
+        """
+
+        rootPid = self.getRootPid()
+
+        if rootPid is None:
+            return None
+
+        try:
+            root = psutil.Process(rootPid)
+            tree = [root] + root.children(recursive = True)
+        except psutil.Error:
+            return None
+
+        rss = 0
+        cpu = 0.0
+        processes = {}
+
+        for process in tree:
+            # cpu_percent() compares against the previous call on the same Process object
+            process = self.processes.get(process.pid, process)
+
+            try:
+                rss += process.memory_info().rss
+                cpu += process.cpu_percent(None)
+                processes[process.pid] = process
+            except psutil.Error:
+                continue
+
+        self.processes = processes
+
+        return (rss, cpu)
+
+    def startPeriod(self):
+        """
+        Start aggregating a new period, e.g. at the beginning of a run
+        """
+
+        with self.lock:
+            self.samples = 0
+            self.peakRSS = 0
+            self.totalRSS = 0
+            self.peakCPU = 0.0
+            self.totalCPU = 0.0
+
+    def resetThresholds(self):
+        """
+        Forget the latest samples, e.g. after the session was recycled
+        """
+
+        with self.lock:
+            self.recentCPU.clear()
+            self.lastRSS = 0
+            self.processes = {}
+
+    def getPeriodStats(self):
+        """
+        Get the aggregated usage of the current period
+
+        Return
+        ----------
+        dict
+        samples, peakRSS, meanRSS (MB), peakCPU, meanCPU (percent of one core)
+        """
+
+        with self.lock:
+            samples = self.samples
+
+            return {
+                'samples': samples,
+                'peakRSS': round(self.peakRSS / 1048576, 1),
+                'meanRSS': round(self.totalRSS / samples / 1048576, 1) if samples > 0 else 0,
+                'peakCPU': round(self.peakCPU, 1),
+                'meanCPU': round(self.totalCPU / samples, 1) if samples > 0 else 0,
+            }
+
+    def exceeds(self, maxRSS = None, maxCPU = None):
+        """
+        Check the latest samples against the thresholds
+
+        Parameters
+        ----------
+        maxRSS : number
+            The RSS in MB the latest sample may not exceed. None means no limit.
+
+        maxCPU : number
+            The CPU percent the mean of the latest samples may not exceed. None means no limit.
+
+        Return
+        ----------
+        string
+        The description of the crossed threshold, or None
+        """
+
+        with self.lock:
+            if maxRSS is not None and self.lastRSS > maxRSS * 1048576:
+                return "RSS " + str(round(self.lastRSS / 1048576, 1)) + " MB > " + str(maxRSS) + " MB"
+
+            if maxCPU is not None and len(self.recentCPU) == self.recentCPU.maxlen:
+                meanCPU = sum(self.recentCPU) / len(self.recentCPU)
+
+                if meanCPU > maxCPU:
+                    return "CPU " + str(round(meanCPU, 1)) + "% > " + str(maxCPU) + "%"
+
+        return None
+
+    def stop(self):
+        """
+        Stop the monitor thread
+        """
+
+        self.stopEvent.set()
+
+    def run(self):
+        while not self.stopEvent.wait(self.interval):
+            try:
+                measured = self.sample()
+            except Exception as e:
+                self.logUtil.log(e)
+                continue
+
+            if measured is None:
+                continue
+
+            (rss, cpu) = measured
+
+            with self.lock:
+                self.samples += 1
+                self.peakRSS = max(self.peakRSS, rss)
+                self.totalRSS += rss
+                self.peakCPU = max(self.peakCPU, cpu)
+                self.totalCPU += cpu
+                self.lastRSS = rss
+                self.recentCPU.append(cpu)
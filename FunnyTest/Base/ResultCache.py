@@ -0,0 +1,116 @@
+import os
+import time
+import pickle
+import threading
+from collections import OrderedDict
+
+from ..Log.TestLog import TestLog
+
+class ResultCache:
+    """
+    LRU cache with TTL for the results of cacheable subprocedures.
+    It can optionally be pickled to a file to be reused by the next invocation.
+    """
+
+    def __init__(self, maxSize = 1024, defaultTTL = 3600, path = None):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        maxSize : int
+            The maximum number of entries. The least recently used entry is dropped when it is exceeded.
+
+        defaultTTL : number
+            The seconds an entry stays valid when the caller does not give a TTL
+
+        path : string
+            The file to persist the cache in. If None, the cache only lives in memory.
+        """
+
+        self.maxSize = maxSize
+        self.defaultTTL = defaultTTL
+        self.path = path
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.logUtil = TestLog()
+
+        if path is not None and os.path.isfile(path):
+            try:
+                with open(path, 'rb') as cacheFile:
+                    self.entries = pickle.load(cacheFile)
+            except Exception as e:
+                self.logUtil.log("Ignoring broken result cache " + path + ": " + str(e), 'warning')
+
+    def get(self, key):
+        """
+        Get an entry which is not expired and mark it as recently used
+
+        Parameters
+        ----------
+        key : string
+            The cache key
+
+        Return
+        ----------
+        any
+        The cached value, or None
+        """
+
+        with self.lock:
+            entry = self.entries.get(key)
+
+            if entry is None:
+                return None
+
+            if entry[0] <= time.time():
+                del self.entries[key]
+                return None
+
+            self.entries.move_to_end(key)
+
+            return entry[1]
+
+    def put(self, key, value, ttl = None):
+        """
+        Add an entry
+
+        Parameters
+        ----------
+        key : string
+            The cache key
+
+        value : any
+            The value to cache
+
+        ttl : number
+            The seconds the entry stays valid
+        """
+
+        with self.lock:
+            self.entries[key] = (time.time() + (ttl if ttl is not None else self.defaultTTL), value)
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.maxSize:
+                self.entries.popitem(last = False)
+
+    def save(self):
+        """
+        Write the entries which are not expired to the cache file
+        """
+
+        if self.path is None:
+            return
+
+        with self.lock:
+            now = time.time()
+            entries = OrderedDict((key, entry) for (key, entry) in self.entries.items() if entry[0] > now)
+
+            try:
+                content = pickle.dumps(entries)
+            except Exception as e:
+                self.logUtil.log("Result cache not persisted: " + str(e), 'warning')
+                return
+
+        with open(self.path, 'wb') as cacheFile:
+            cacheFile.write(content)
@@ -0,0 +1,166 @@
+import re
+import sys
+
+from .ResultStore import ResultStore
+
+class ResultLifetime:
+    """
+    Works out, from the procedures of a run, the last top-level procedure which can still reference each result
+    through `%result[...]%` in its params or condition (including the subprocedures it calls),
+    so stored results can be released as soon as nothing later uses them.
+    It also keeps an estimate of the memory held by the stored results.
+    """
+
+    def __init__(self, procedureList, resultPattern):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        procedureList : list
+            The top-level procedures of the run, including the subprocedure definitions
+
+        resultPattern : string
+            The regex matching a result reference. Its first group is the referenced id or aggregate.
+        """
+
+        self.resultPattern = re.compile(resultPattern)
+        self.lastUse = {}
+        self.sizes = {}
+        self.currentBytes = 0
+        self.peakBytes = 0
+        self.releasedNumber = 0
+
+        subprocedures = {}
+
+        for procedureDict in procedureList:
+            if 'subprocedure' in procedureDict:
+                subprocedures.setdefault(procedureDict['subprocedure'], []).append(procedureDict)
+
+        for (idx, procedureDict) in enumerate(procedureList):
+            if 'subprocedure' in procedureDict:
+                continue
+
+            for key in self.getReferences(procedureDict, subprocedures, []):
+                # aggregates are kept under their template, also when some of their indexes are fixed
+                self.lastUse[ResultStore.getTemplate(key) if '*' in key else key] = idx
+
+    def getReferences(self, procedureDict, subprocedures, callStack):
+        """
+        Collect the ids a procedure can reference
+
+        Parameters
+        ----------
+        procedureDict : dict
+            The procedure definition
+
+        subprocedures : dict
+            The procedures of each subprocedure
+
+        callStack : list
+            The names of the subprocedures being expanded, to stop recursion
+
+        Return
+        ----------
+        set
+        The referenced ids
+        """
+
+        references = set()
+        values = [procedureDict.get('condition')] + list(procedureDict.get('params', []))
+
+        while len(values) > 0:
+            value = values.pop()
+
+            if isinstance(value, str):
+                references.update(self.resultPattern.findall(value))
+            elif isinstance(value, (list, tuple)):
+                values.extend(value)
+            elif isinstance(value, dict):
+                values.extend(value.values())
+
+        command = procedureDict.get('command')
+
+        if procedureDict.get('type') in ['loop', 'callSubprocedure'] and command in subprocedures and command not in callStack:
+            for subpro in subprocedures[command]:
+                references.update(self.getReferences(subpro, subprocedures, callStack + [command]))
+
+        return references
+
+    def estimateSize(self, value):
+        """
+        Estimate the bytes held by a result: the object itself and, for containers, their direct items
+
+        Parameters
+        ----------
+        value : any
+            The result
+
+        Return
+        ----------
+        int
+        The estimated bytes
+        """
+
+        size = sys.getsizeof(value)
+
+        if isinstance(value, dict):
+            for (key, item) in value.items():
+                size += sys.getsizeof(key) + sys.getsizeof(item)
+        elif isinstance(value, (list, tuple, set)):
+            for item in value:
+                size += sys.getsizeof(item)
+
+        return size
+
+    def onStore(self, key, value):
+        """
+        Account a stored result
+
+        Parameters
+        ----------
+        key : string
+            The result id
+
+        value : any
+            The result
+        """
+
+        size = self.estimateSize(value)
+        self.currentBytes += size - self.sizes.get(key, 0)
+        self.sizes[key] = size
+        self.peakBytes = max(self.peakBytes, self.currentBytes)
+
+    def getDeadKeys(self, results, stepIdx):
+        """
+        Get the stored results nothing after a top-level procedure can reference
+
+        Parameters
+        ----------
+        results : dict
+            The stored results of the run
+
+        stepIdx : int
+            The index of the top-level procedure which just finished
+
+        Return
+        ----------
+        list
+        The ids which can be released
+        """
+
+        # a result can also be referenced through an aggregate over the iterations of its loop
+        return [key for key in results if max(self.lastUse.get(key, -1), self.lastUse.get(ResultStore.getTemplate(key), -1)) <= stepIdx]
+
+    def onRelease(self, key):
+        """
+        Account a released result
+
+        Parameters
+        ----------
+        key : string
+            The result id
+        """
+
+        self.currentBytes -= self.sizes.pop(key, 0)
+        self.releasedNumber += 1
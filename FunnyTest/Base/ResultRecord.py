@@ -0,0 +1,192 @@
+import gzip
+import json
+import threading
+
+from ..Log.TestLog import TestLog
+
+class ResultRecord:
+    """
+    Compact JSON Lines file of what the procedures of the runs did: for every validated step its resolved params,
+    raw return, time and outcome, and the dataset row of each run. The expectations and conditions of the json files
+    can later be evaluated against it again without a browser (python3 -m FunnyTest revalidate).
+    A file name ending with .gz is gzip compressed.
+
+    Returns which can not be written to json (web elements, generators) are recorded as their repr.
+    """
+
+    def __init__(self, path, append = False):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        path : string
+            The results file
+
+        append : bool
+            Add to the records of a previous invocation, e.g. when resuming it. Otherwise the file is started anew.
+        """
+
+        self.path = path
+        self.lock = threading.Lock()
+        self.logUtil = TestLog()
+        self.file = self.open(path, 'a' if append else 'w')
+
+    @staticmethod
+    def open(path, mode):
+        """
+        Open a results file as text
+
+        Parameters
+        ----------
+        path : string
+            The results file
+
+        mode : string
+            'r', 'w' or 'a'
+
+        Return
+        ----------
+        object
+        The file object
+        """
+
+        if path.endswith('.gz'):
+            return gzip.open(path, mode + 't')
+
+        return open(path, mode)
+
+    def write(self, record):
+        """
+        Append a record to the file
+
+        Parameters
+        ----------
+        record : dict
+            The record
+        """
+
+        line = json.dumps(record, separators = (',', ':'), default = repr) + '\n'
+
+        with self.lock:
+            if self.file is not None:
+                self.file.write(line)
+
+    def recordData(self, runName, row):
+        """
+        Record the dataset row of a run
+
+        Parameters
+        ----------
+        runName : string
+            The run name
+
+        row : dict
+            The dataset row
+        """
+
+        self.write({'run': runName, 'data': row})
+
+    def recordStep(self, procedureDict, validationResult, runName, params = None):
+        """
+        Record a validated step. Called by FunnyProcedure.saveResult.
+
+        Parameters
+        ----------
+        procedureDict : dict
+            The procedure definition, with its full dotted id
+
+        validationResult : dict
+            The validation result of the step
+
+        runName : string
+            The run name
+
+        params : list
+            The resolved params the function was called with, without the driver of a custom procedure
+        """
+
+        record = {
+            'run': runName,
+            'id': procedureDict['id'],
+            'command': procedureDict['command'],
+            'time': validationResult['actualTime'],
+            'passed': not validationResult.get('timedOut') and validationResult['expectedValueTestResult'] and validationResult['expectedTimeTestResult'],
+        }
+
+        if params is not None:
+            record['params'] = params
+
+        try:
+            json.dumps(validationResult['actualReturn'])
+            record['return'] = validationResult['actualReturn']
+        except (TypeError, ValueError):
+            record['returnRepr'] = repr(validationResult['actualReturn'])
+
+        if 'loopParam' in procedureDict:
+            record['loopParam'] = procedureDict['loopParam']
+
+        if validationResult.get('timedOut'):
+            record['timedOut'] = True
+
+        if validationResult.get('throttle') is not None:
+            record['throttle'] = validationResult['throttle']
+
+        if 'leaks' in validationResult:
+            record['leaks'] = validationResult['leaks']
+
+        if validationResult.get('repeat') is not None:
+            record['samples'] = [round(sample, 2) for sample in validationResult['repeat']['samples']]
+
+        self.write(record)
+
+    def close(self):
+        """
+        Close the file
+        """
+
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+        self.logUtil.log("Results recorded in " + self.path + ".", 'success')
+
+    @classmethod
+    def load(cls, path):
+        """
+        Read a results file
+
+        Parameters
+        ----------
+        path : string
+            The results file
+
+        Return
+        ----------
+        dict
+        {run name: {'data': the dataset row or None, 'steps': the step records in execution order}}
+        """
+
+        runs = {}
+
+        with cls.open(path, 'r') as resultFile:
+            try:
+                for line in resultFile:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # the last line can be cut off if the process died while writing it
+                        continue
+
+                    run = runs.setdefault(record['run'], {'data': None, 'steps': []})
+
+                    if 'data' in record:
+                        run['data'] = record['data']
+                    else:
+                        run['steps'].append(record)
+            except EOFError:
+                # a gzip file not closed properly ends early
+                pass
+
+        return runs
@@ -0,0 +1,138 @@
+import re
+
+class ResultStore(dict):
+    """
+    The results of a run, keyed by their full dotted id such as `LoopId.3.SubprocedureName.ProcedureId`.
+    Besides the flat keys, it keeps two indexes updated on every store and release:
+        the namespaces: every dotted prefix (loop, iteration, subprocedure call) to the keys under it
+        the aggregates: every key with its iteration indexes replaced by `*` to the keys matching it, in store order
+    so a namespace or "step S of all iterations of loop L" is found without scanning the keys.
+    """
+
+    numberSegment = re.compile(r'(?<=\.)\d+(?=\.)')
+
+    def __init__(self):
+        dict.__init__(self)
+
+        self.namespaces = {}
+        self.aggregates = {}
+
+    @classmethod
+    def getTemplate(cls, key):
+        """
+        Replace the iteration indexes of a key by `*`
+
+        Parameters
+        ----------
+        key : string
+            The result id, e.g. `collect.3.item.title`
+
+        Return
+        ----------
+        string
+        The template, e.g. `collect.*.item.title`
+        """
+
+        return cls.numberSegment.sub('*', key)
+
+    def __setitem__(self, key, value):
+        if key not in self:
+            segments = key.split('.')
+
+            for end in range(1, len(segments)):
+                self.namespaces.setdefault('.'.join(segments[:end]), {})[key] = None
+
+            template = self.getTemplate(key)
+
+            if template != key:
+                self.aggregates.setdefault(template, {})[key] = None
+
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+
+        segments = key.split('.')
+
+        for end in range(1, len(segments)):
+            namespace = '.'.join(segments[:end])
+            del self.namespaces[namespace][key]
+
+            if len(self.namespaces[namespace]) == 0:
+                del self.namespaces[namespace]
+
+        template = self.getTemplate(key)
+
+        if template != key:
+            del self.aggregates[template][key]
+
+            if len(self.aggregates[template]) == 0:
+                del self.aggregates[template]
+
+    def pop(self, key, *default):
+        if key not in self:
+            return dict.pop(self, key, *default)
+
+        value = dict.__getitem__(self, key)
+        del self[key]
+
+        return value
+
+    def update(self, *args, **kwargs):
+        for (key, value) in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def getKeysUnder(self, namespace):
+        """
+        Get the keys stored under a namespace
+
+        Parameters
+        ----------
+        namespace : string
+            The dotted prefix, e.g. `collect.3.item`
+
+        Return
+        ----------
+        list
+        The keys
+        """
+
+        return list(self.namespaces.get(namespace, ()))
+
+    def resolve(self, reference):
+        """
+        Resolve a result reference
+
+        Parameters
+        ----------
+        reference : string
+            A full dotted id, or an aggregate with `*` for iteration indexes, e.g. `collect.*.item.title`.
+            Indexes can also be fixed in an aggregate, e.g. `outer.2.row.inner.*.cell.text`.
+
+        Return
+        ----------
+        any
+        The result, or the list of the matching results in the order they were stored
+
+        Raises
+        ----------
+        KeyError
+        If nothing matches
+        """
+
+        if '*' not in reference:
+            return self[reference]
+
+        template = self.getTemplate(reference)
+
+        if template not in self.aggregates:
+            raise KeyError(reference)
+
+        keys = self.aggregates[template]
+
+        if template != reference:
+            # some indexes are fixed: keep the keys agreeing with them
+            segments = reference.split('.')
+            keys = [key for key in keys if all(segment == '*' or segment == keySegment for (segment, keySegment) in zip(segments, key.split('.')))]
+
+        return [dict.__getitem__(self, key) for key in keys]
@@ -0,0 +1,217 @@
+from .FunnyProcedure import FunnyProcedure
+from .ResultStore import ResultStore
+from .Benchmark import Benchmark
+from .Throttling import Throttling
+
+class Revalidator(FunnyProcedure):
+    """
+    Evaluates the current expectations and conditions of a test run against the steps recorded by a ResultRecord,
+    with the validation and short code rules of FunnyProcedure but without a browser.
+
+    A step is matched to its definition by its id: `ProcedureId` for a top-level procedure and
+    `...SubprocedureName.ProcedureId` for a procedure of a subprocedure. The recorded returns are replayed in the recorded order,
+    so `%result[...]%` only resolves against the steps before the one being checked. Steps whose condition is now false
+    are reported as skipped. Procedures the record has no step for (e.g. a condition was false when recorded) can not be checked,
+    nor the expectTime of a step recorded under another throttling than the current `throttle` of the procedure or of the test run.
+    """
+
+    def __init__(self, throttle = None):
+        """
+        Parameters
+        ----------
+        throttle : string | dict
+            The Throttling preset or profile of the test runs without their own `throttle`, as given by run --throttle
+        """
+
+        FunnyProcedure.__init__(self, releaseResults = False, throttle = throttle)
+
+    def createBrowser(self, isHeadLess, windowSize, daemonAddress, profileTemplate, startMode):
+        # the recorded steps are evaluated without a browser
+        return None
+
+    def getDefinitions(self, funcs):
+        """
+        Index the procedures of a test run by the last two segments of the ids they are recorded with
+
+        Parameters
+        ----------
+        funcs : list
+            The procedures of the json file
+
+        Return
+        ----------
+        dict
+        (subprocedure name or None, procedure id) => procedure definition
+        """
+
+        return dict(((func.get('subprocedure'), func['id']), func) for func in funcs if isinstance(func, dict) and 'id' in func)
+
+    def getDefinition(self, definitions, id):
+        """
+        Get the definition of a recorded step
+
+        Parameters
+        ----------
+        definitions : dict
+            The result of getDefinitions()
+
+        id : string
+            The full dotted id of the step
+
+        Return
+        ----------
+        dict
+        The procedure definition, or None if it was removed
+        """
+
+        segments = id.split('.')
+
+        if len(segments) == 1:
+            return definitions.get((None, id))
+
+        return definitions.get((segments[-2], segments[-1]))
+
+    def getTime(self, definition, step):
+        """
+        Get the time of a recorded step to check expectTime against
+
+        Parameters
+        ----------
+        definition : dict
+            The procedure definition
+
+        step : dict
+            The step record
+
+        Return
+        ----------
+        number
+        The time in ms. With `repeat`, the statistic currently chosen over the recorded samples.
+        """
+
+        if 'repeat' not in definition or 'samples' not in step:
+            return step['time']
+
+        benchmark = Benchmark(definition['repeat'])
+        # the samples are recorded without the warmup repetitions
+        benchmark.samples.extend(step['samples'])
+
+        return benchmark.summarize()['value']
+
+    def getThrottleName(self, throttle):
+        """
+        Get the name a `throttle` property is recorded with
+
+        Parameters
+        ----------
+        throttle : string | dict
+            The Throttling preset or profile
+
+        Return
+        ----------
+        string
+        The name, or None if it does not throttle
+        """
+
+        profile = Throttling.getProfile(throttle)
+
+        return profile['name'] if profile is not None else None
+
+    def revalidate(self, runName, funcs, record):
+        """
+        Evaluate the procedures of a test run against the record of a run
+
+        Parameters
+        ----------
+        runName : string
+            The name the run was recorded with, e.g. `checkout[alice]` for a dataset row
+
+        funcs : list
+            The current procedures of the test run
+
+        record : dict
+            {'data', 'steps'} as returned by ResultRecord.load()
+
+        Return
+        ----------
+        dict
+        The step ids by outcome: passing, failing, newlyPassing, newlyFailing (also listed in failing), skipped, removed, unverifiable
+        """
+
+        definitions = self.getDefinitions(funcs)
+        outcome = dict((name, []) for name in ['passing', 'failing', 'newlyPassing', 'newlyFailing', 'skipped', 'removed', 'unverifiable'])
+
+        self.returnList[runName] = ResultStore()
+
+        if record['data'] is not None:
+            self.setDataRow(runName, record['data'])
+
+        for step in record['steps']:
+            self.revalidateStep(runName, definitions, step, outcome)
+
+            if 'return' in step:
+                self.storeResult(runName, step['id'], step['return'])
+
+        return outcome
+
+    def revalidateStep(self, runName, definitions, step, outcome):
+        """
+        Evaluate the current definition of a recorded step against the returns recorded before it
+
+        Parameters
+        ----------
+        runName : string
+            The name the run was recorded with
+
+        definitions : dict
+            The result of getDefinitions()
+
+        step : dict
+            The step record
+
+        outcome : dict
+            The step ids by outcome the id of the step is added to
+        """
+
+        id = step['id']
+
+        # the leak checks are not expectations of the json files
+        if 'leaks' in step:
+            return
+
+        definition = self.getDefinition(definitions, id)
+
+        if definition is None:
+            outcome['removed'].append(id)
+            return
+
+        condition = definition.get('condition')
+        context = {'loopParam': step['loopParam']} if 'loopParam' in step else {}
+
+        if condition is not None and not self.parseShortCode(condition, runName, context):
+            outcome['skipped'].append(id)
+            return
+
+        expectValue = definition.get('expect')
+
+        if 'returnRepr' in step and expectValue is not None and expectValue != 'any':
+            outcome['unverifiable'].append(id)
+            return
+
+        # a time measured under another throttling profile says nothing about the current one
+        throttle = definition['throttle'] if 'throttle' in definition else self.runThrottles.get(runName, self.throttle)
+
+        if definition.get('expectTime') is not None and self.getThrottleName(throttle) != step.get('throttle'):
+            outcome['unverifiable'].append(id)
+            return
+
+        self.logUtil.log("Revalidating: " + runName + " " + id)
+        validationResult = self.validateExpectValue(expectValue, step.get('return'), definition.get('expectTime'), self.getTime(definition, step))
+        passed = not step.get('timedOut') and validationResult['expectedValueTestResult'] and validationResult['expectedTimeTestResult']
+
+        outcome['passing' if passed else 'failing'].append(id)
+
+        if passed and not step['passed']:
+            outcome['newlyPassing'].append(id)
+        elif not passed and step['passed']:
+            outcome['newlyFailing'].append(id)
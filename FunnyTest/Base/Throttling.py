@@ -0,0 +1,136 @@
+class Throttling:
+    """
+    The network and CPU conditions a browser session is throttled to with Chrome's DevTools emulation,
+    set for a whole run (`"throttle"` of a json file object, or the `throttle` option) or for one procedure.
+
+    A profile is the name of a preset or {"latency": ms, "download": kbit/s, "upload": kbit/s, "cpu": slowdown factor, "name": optional}.
+    Missing values are not throttled. The name of the active profile is saved with every time consumption.
+    """
+
+    # the presets of the DevTools network panel and the Lighthouse mobile profile
+    presets = {
+        'none': None,
+        'slow-3g': {'latency': 2000, 'download': 400, 'upload': 400, 'cpu': 1},
+        'fast-3g': {'latency': 563, 'download': 1440, 'upload': 675, 'cpu': 1},
+        'slow-4g': {'latency': 150, 'download': 1600, 'upload': 750, 'cpu': 1},
+        'mobile': {'latency': 150, 'download': 1600, 'upload': 750, 'cpu': 4},
+    }
+
+    @classmethod
+    def getProfile(cls, throttle):
+        """
+        Normalize a `throttle` property
+
+        Parameters
+        ----------
+        throttle : string | dict
+            The name of a preset or the profile
+
+        Return
+        ----------
+        dict
+        {'name', 'latency', 'download', 'upload', 'cpu'}, or None if nothing is throttled
+
+        Raises
+        ----------
+        ValueError
+        If the preset does not exist or a value is invalid
+        """
+
+        if throttle is None:
+            return None
+
+        if isinstance(throttle, str):
+            if throttle not in cls.presets:
+                raise ValueError("throttle must be one of " + ', '.join(cls.presets) + " or an object")
+
+            if cls.presets[throttle] is None:
+                return None
+
+            return dict(cls.presets[throttle], name = throttle)
+
+        if not isinstance(throttle, dict):
+            raise ValueError("throttle must be one of " + ', '.join(cls.presets) + " or an object")
+
+        profile = {
+            'latency': throttle.get('latency', 0),
+            'download': throttle.get('download'),
+            'upload': throttle.get('upload'),
+            'cpu': throttle.get('cpu', 1),
+        }
+
+        for key in ['latency', 'download', 'upload', 'cpu']:
+            value = profile[key]
+
+            if value is not None and (not isinstance(value, (int, float)) or isinstance(value, bool) or value < 0):
+                raise ValueError("throttle " + key + " must be a non-negative number")
+
+        if profile['cpu'] < 1:
+            raise ValueError("throttle cpu must be a slowdown factor of at least 1")
+
+        profile['name'] = throttle.get('name', cls.getName(profile))
+
+        return profile
+
+    @staticmethod
+    def getName(profile):
+        """
+        Get the name of a profile without one
+
+        Parameters
+        ----------
+        profile : dict
+            The normalized profile
+
+        Return
+        ----------
+        string
+        The name, e.g. `latency 150ms, down 1600kbps, up 750kbps, cpu 4x`
+        """
+
+        parts = []
+
+        if profile['latency'] > 0:
+            parts.append('latency ' + str(profile['latency']) + 'ms')
+
+        if profile['download'] is not None:
+            parts.append('down ' + str(profile['download']) + 'kbps')
+
+        if profile['upload'] is not None:
+            parts.append('up ' + str(profile['upload']) + 'kbps')
+
+        if profile['cpu'] != 1:
+            parts.append('cpu ' + str(profile['cpu']) + 'x')
+
+        return ', '.join(parts) if len(parts) > 0 else 'unthrottled'
+
+    @staticmethod
+    def getCommands(profile):
+        """
+        Get the DevTools commands applying a profile
+
+        Parameters
+        ----------
+        profile : dict
+            The normalized profile, or None to remove the throttling
+
+        Return
+        ----------
+        list
+        (command, params) pairs
+        """
+
+        if profile is None:
+            profile = {'latency': 0, 'download': None, 'upload': None, 'cpu': 1}
+
+        # -1 disables the throughput limit, the throughputs are in bytes per second
+        return [
+            ('Network.enable', {}),
+            ('Network.emulateNetworkConditions', {
+                'offline': False,
+                'latency': profile['latency'],
+                'downloadThroughput': profile['download'] * 125 if profile['download'] is not None else -1,
+                'uploadThroughput': profile['upload'] * 125 if profile['upload'] is not None else -1,
+            }),
+            ('Emulation.setCPUThrottlingRate', {'rate': profile['cpu']}),
+        ]
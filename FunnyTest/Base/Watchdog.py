@@ -0,0 +1,115 @@
+import time
+import threading
+import _thread
+
+from ..Log.TestLog import TestLog
+
+class Watchdog(threading.Thread):
+    """
+    Background thread enforcing the deadline of the step currently running.
+    When the deadline passes, the expire callback is called (normally killing the browser session
+    so the blocked selenium call returns). If the step is still stuck after the grace period and
+    it runs on the main thread, a KeyboardInterrupt is raised in it as the last resort.
+    """
+
+    def __init__(self, onExpire, interval = 0.2, grace = 5):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        onExpire : function
+            Called with the label of the expired step from the watchdog thread
+
+        interval : number
+            The seconds between two deadline checks
+
+        grace : number
+            The seconds to wait after onExpire before interrupting the main thread
+        """
+
+        threading.Thread.__init__(self, daemon = True)
+
+        self.onExpire = onExpire
+        self.interval = interval
+        self.grace = grace
+        self.lock = threading.Lock()
+        self.stopEvent = threading.Event()
+        self.deadline = None
+        self.label = None
+        self.targetThread = None
+        self.fired = False
+        self.interrupted = False
+        self.logUtil = TestLog()
+
+    def arm(self, seconds, label):
+        """
+        Start watching a step
+
+        Parameters
+        ----------
+        seconds : number
+            The time budget of the step
+
+        label : string
+            The name of the step, used in the log
+        """
+
+        with self.lock:
+            self.deadline = time.monotonic() + seconds
+            self.label = label
+            self.targetThread = threading.get_ident()
+            self.fired = False
+            self.interrupted = False
+
+        if not self.is_alive():
+            self.start()
+
+    def disarm(self):
+        """
+        Stop watching the current step
+
+        Return
+        ----------
+        bool
+        Return True if the step exceeded its deadline.
+        Otherwise False.
+        """
+
+        with self.lock:
+            self.deadline = None
+            return self.fired
+
+    def stop(self):
+        """
+        Stop the watchdog thread
+        """
+
+        self.disarm()
+        self.stopEvent.set()
+
+    def run(self):
+        while not self.stopEvent.wait(self.interval):
+            with self.lock:
+                if self.deadline is None:
+                    continue
+
+                now = time.monotonic()
+                label = self.label
+                expired = not self.fired and now > self.deadline
+                stuck = self.fired and not self.interrupted and now > self.deadline + self.grace
+
+                if expired:
+                    self.fired = True
+
+                if stuck and self.targetThread == threading.main_thread().ident:
+                    self.interrupted = True
+                    _thread.interrupt_main()
+
+            if expired:
+                self.logUtil.log("Watchdog: " + label + " exceeded its deadline. Killing the browser session.", 'warning')
+
+                try:
+                    self.onExpire(label)
+                except Exception as e:
+                    self.logUtil.log(e)
@@ -0,0 +1,343 @@
+import json
+import argparse
+
+from .JSONStarter import JSONStarter
+from ..Base.BrowserDaemon import BrowserDaemon
+from ..Base.ProfileTemplate import ProfileTemplate
+from ..Base.Throttling import Throttling
+from ..Log.TestLog import TestLog
+
+class CommandLine:
+    """
+    The `funnytest` command line entry point: python3 -m FunnyTest <command> <cases path> [options]
+    Only the run and watch commands import selenium and start a browser.
+    """
+
+    def __init__(self):
+        self.logUtil = TestLog()
+        self.parser = self.buildParser()
+
+    def buildParser(self):
+        """
+        Build the argument parser
+
+        Return
+        ----------
+        object
+        The parser
+        """
+
+        parser = argparse.ArgumentParser(prog = 'funnytest', description = 'Run the Funny Test Framework json test runs.')
+        commands = parser.add_subparsers(dest = 'command')
+        commands.required = True
+
+        for (name, helpText) in [
+            ('run', 'run the test runs in a browser'),
+            ('watch', 'run the test runs, then re-run the changed ones on the same browser'),
+            ('validate', 'check the json files without starting a browser'),
+            ('list', 'list the test runs'),
+            ('dry-run', 'print the procedures each test run would execute without starting a browser'),
+            ('load', 'replay a test run as concurrent virtual users and report its latency percentiles'),
+            ('revalidate', 'check the current expectations against the results recorded by run --results-file without starting a browser'),
+        ]:
+            command = commands.add_parser(name, help = helpText)
+            command.add_argument('cases', help = 'the directory of the test run json files')
+            command.add_argument('--custom', default = None, help = 'the directory of the custom procedures')
+
+            if name in ['run', 'watch']:
+                self.addRunArguments(command)
+
+            if name == 'run':
+                command.add_argument('--checkpoint-file', default = None, help = 'the file to record the progress of the test runs in')
+                command.add_argument('--resume', action = 'store_true', help = 'continue from the checkpoint file of an interrupted invocation')
+                command.add_argument('--update-baselines', action = 'store_true', help = 'replace the baseline images of compareScreenshot')
+                command.add_argument('--profile-file', default = None, help = 'profile the procedures and write the collapsed stacks to this file')
+                command.add_argument('--profile-interval', type = float, default = 0.01, help = 'the seconds between two profile samples, default 0.01')
+                command.add_argument('--share-prefixes', action = 'store_true', help = 'execute the leading procedures shared by several test runs once')
+                command.add_argument('--results-file', default = None, help = 'record the params, returns and times of the procedures in this file for revalidate')
+
+            if name == 'watch':
+                command.add_argument('--interval', type = float, default = 1, help = 'the seconds between two checks for changes')
+
+            if name == 'load':
+                self.addLoadArguments(command)
+
+            if name == 'revalidate':
+                command.add_argument('--results-file', required = True, help = 'the file recorded by run --results-file')
+                command.add_argument('--throttle', type = self.parseThrottle, default = None, help = 'the --throttle the results were recorded with, compared with the throttling of the steps with expectTime')
+
+        daemon = commands.add_parser('daemon', help = 'keep a pool of headless browsers for run and watch to attach to')
+        daemon.add_argument('--browsers', type = int, default = 2, help = 'the number of browsers in the pool, default 2')
+        daemon.add_argument('--port', type = int, default = 8765, help = 'the port of the daemon, default 8765')
+        daemon.add_argument('--debug-port', type = int, default = 9300, help = 'the remote debugging port of the first browser, default 9300')
+        daemon.add_argument('--window-size', default = '1920,1080', help = 'the browser window size, default 1920,1080')
+        daemon.add_argument('--chrome-binary', default = None, help = 'the Chrome executable, searched in PATH by default')
+
+        warmProfile = commands.add_parser('warm-profile', help = 'build a warm browser profile template and print the cold and warm load times')
+        warmProfile.add_argument('profile', help = 'the directory of the template, replaced if it exists')
+        warmProfile.add_argument('--url', action = 'append', required = True, help = 'a page to cache, can be given several times')
+        warmProfile.add_argument('--window-size', default = '1920,1080', help = 'the browser window size, default 1920,1080')
+        warmProfile.add_argument('--settle', type = float, default = 2, help = 'the seconds to stay on each page, default 2')
+
+        return parser
+
+    def addRunArguments(self, command):
+        """
+        Add the options of starter.run() to a command
+
+        Parameters
+        ----------
+        command : object
+            The sub parser of the command
+        """
+
+        command.add_argument('--headless', action = 'store_true', help = 'run the browser in headless mode')
+        command.add_argument('--window-size', default = '1920,1080', help = 'the browser window size, default 1920,1080')
+        command.add_argument('--step-timeout', type = float, default = None, help = 'the default time limit of a procedure in seconds')
+        command.add_argument('--run-budget', type = float, default = None, help = 'the time budget of a test run in seconds')
+        command.add_argument('--state-file', default = None, help = 'the file to keep saved browser states in')
+        command.add_argument('--result-cache-file', default = None, help = 'the file to keep cached subprocedure results in')
+        command.add_argument('--keep-results', action = 'store_true', help = 'keep all procedure results until the end of the run')
+        command.add_argument('--sessions', type = int, default = 1, help = 'the number of browser sessions running test runs in parallel')
+        command.add_argument('--daemon', default = None, help = 'the host:port of a browser daemon to lease the browsers from')
+        command.add_argument('--profile-template', default = None, help = 'the warm profile template every browser starts from a clone of')
+        command.add_argument('--start-mode', choices = ['lazy', 'background', 'eager'], default = 'lazy', help = 'when a browser is started: before the first procedure needing it (default), in the background while the run is prepared, or at once')
+        command.add_argument('--throttle', type = self.parseThrottle, default = None, help = 'throttle the browsers: a preset (' + ', '.join(Throttling.presets) + ') or a json profile {"latency", "download", "upload", "cpu"}')
+        command.add_argument('--leak-check', action = 'store_true', help = 'fail the test runs whose JS heap, DOM nodes or event listeners keep growing')
+        command.add_argument('--monitor-interval', type = float, default = None, help = 'the seconds between two samples of the browser RSS and CPU')
+        command.add_argument('--recycle-rss', type = float, default = None, help = 'recycle a browser session above this RSS in MB')
+        command.add_argument('--recycle-cpu', type = float, default = None, help = 'recycle a browser session above this mean CPU percent')
+        command.add_argument('--metrics-port', type = int, default = None, help = 'serve live metrics in the Prometheus format on this port')
+        command.add_argument('--metrics-file', default = None, help = 'the file to write the live metrics to every 5 seconds')
+
+    def addLoadArguments(self, command):
+        """
+        Add the options of starter.load() to a command
+
+        Parameters
+        ----------
+        command : object
+            The sub parser of the command
+        """
+
+        command.add_argument('--run', required = True, help = 'the test run to replay')
+        command.add_argument('--users', type = self.parseUsers, default = 10, help = 'the number of virtual users, default 10')
+        command.add_argument('--ramp-up', type = float, default = 0, help = 'the seconds over which the users are started')
+        command.add_argument('--hold', type = float, default = 60, help = 'the seconds all users keep running after the ramp-up, default 60')
+        command.add_argument('--think-time', type = float, default = 0, help = 'the seconds a user pauses after every procedure')
+        command.add_argument('--window-size', default = '1920,1080', help = 'the browser window size, default 1920,1080')
+        command.add_argument('--step-timeout', type = float, default = None, help = 'the default time limit of a procedure in seconds')
+        command.add_argument('--daemon', default = None, help = 'the host:port of a browser daemon to lease the browsers from')
+        command.add_argument('--profile-template', default = None, help = 'the warm profile template every browser starts from a clone of')
+        command.add_argument('--start-mode', choices = ['lazy', 'background', 'eager'], default = 'lazy', help = 'when a browser is started: before the first procedure needing it (default), in the background while the run is prepared, or at once')
+        command.add_argument('--throttle', type = self.parseThrottle, default = None, help = 'throttle the browsers: a preset (' + ', '.join(Throttling.presets) + ') or a json profile {"latency", "download", "upload", "cpu"}')
+        command.add_argument('--metrics-port', type = int, default = None, help = 'serve live metrics in the Prometheus format on this port')
+        command.add_argument('--metrics-file', default = None, help = 'the file to write the live metrics to every 5 seconds')
+
+    def parseUsers(self, value):
+        """
+        Parse the --users option
+
+        Parameters
+        ----------
+        value : string
+            The number of virtual users
+
+        Return
+        ----------
+        int
+        The number of users
+        """
+
+        try:
+            users = int(value)
+        except ValueError:
+            raise argparse.ArgumentTypeError("invalid int value: " + value)
+
+        if users < 1:
+            raise argparse.ArgumentTypeError("there must be at least 1 user")
+
+        return users
+
+    def parseThrottle(self, value):
+        """
+        Parse the --throttle option
+
+        Parameters
+        ----------
+        value : string
+            The name of a Throttling preset or a json profile
+
+        Return
+        ----------
+        string | dict
+        The preset name or the profile
+        """
+
+        try:
+            throttle = json.loads(value) if value.strip().startswith('{') else value
+            Throttling.getProfile(throttle)
+        except ValueError as e:
+            raise argparse.ArgumentTypeError(str(e))
+
+        return throttle
+
+    def main(self, argv = None):
+        """
+        Parse the arguments and execute the command
+
+        Parameters
+        ----------
+        argv : list
+            The arguments. Default to sys.argv[1:].
+
+        Return
+        ----------
+        int
+        The exit code
+        """
+
+        args = self.parser.parse_args(argv)
+
+        if args.command == 'warm-profile':
+            try:
+                ProfileTemplate(args.profile).build(args.url, windowSize = args.window_size, settle = args.settle)
+            except ValueError as e:
+                self.logUtil.log(str(e), 'warning')
+                return 1
+
+            return 0
+
+        if args.command == 'daemon':
+            BrowserDaemon(
+                browsers = args.browsers,
+                port = args.port,
+                firstDebugPort = args.debug_port,
+                windowSize = args.window_size,
+                chromeBinary = args.chrome_binary,
+            ).serve()
+            return 0
+
+        starter = JSONStarter(args.cases, args.custom)
+
+        if args.command == 'list':
+            for (runName, count) in starter.listCases().items():
+                self.logUtil.log(runName + " (" + str(count) + " procedures)")
+
+            return 0
+
+        errors = starter.validateCases()
+
+        for error in errors:
+            self.logUtil.log(error, 'warning')
+
+        if len(errors) > 0:
+            return 1
+
+        if args.command == 'validate':
+            self.logUtil.log(str(len(starter.funcList)) + " test runs are valid.", 'success')
+            return 0
+
+        if args.command == 'dry-run':
+            starter.plan()
+            return 0
+
+        if args.command == 'revalidate':
+            report = starter.revalidate(args.results_file, throttle = args.throttle)
+            return 1 if len(report['failing']) > 0 else 0
+
+        if args.command == 'load':
+            report = starter.load(
+                args.run,
+                users = args.users,
+                rampUp = args.ramp_up,
+                hold = args.hold,
+                thinkTime = args.think_time,
+                windowSize = args.window_size,
+                stepTimeOut = args.step_timeout,
+                daemonAddress = args.daemon,
+                profileTemplate = args.profile_template,
+                startMode = args.start_mode,
+                throttle = args.throttle,
+                metricsPort = args.metrics_port,
+                metricsFile = args.metrics_file,
+            )
+            return 1 if report is None or report['failedIterations'] > 0 else 0
+
+        if args.command == 'watch':
+            starter.watch(
+                isHeadless = args.headless,
+                windowSize = args.window_size,
+                stepTimeOut = args.step_timeout,
+                runTimeBudget = args.run_budget,
+                stateFile = args.state_file,
+                resultCacheFile = args.result_cache_file,
+                interval = args.interval,
+                daemonAddress = args.daemon,
+                profileTemplate = args.profile_template,
+                startMode = args.start_mode,
+                throttle = args.throttle,
+                leakCheck = args.leak_check or None,
+                monitorInterval = args.monitor_interval,
+                recycleRSS = args.recycle_rss,
+                recycleCPU = args.recycle_cpu,
+                metricsPort = args.metrics_port,
+                metricsFile = args.metrics_file,
+            )
+            return 0
+
+        return self.run(starter, args)
+
+    def run(self, starter, args):
+        """
+        Execute the run command
+
+        Parameters
+        ----------
+        starter : object
+            The JSONStarter
+
+        args : object
+            The parsed arguments
+
+        Return
+        ----------
+        int
+        The exit code
+        """
+
+        success = starter.run(
+            isHeadless = args.headless,
+            windowSize = args.window_size,
+            stepTimeOut = args.step_timeout,
+            runTimeBudget = args.run_budget,
+            stateFile = args.state_file,
+            resultCacheFile = args.result_cache_file,
+            releaseResults = not args.keep_results,
+            sessions = args.sessions,
+            daemonAddress = args.daemon,
+            profileTemplate = args.profile_template,
+            startMode = args.start_mode,
+            throttle = args.throttle,
+            leakCheck = args.leak_check or None,
+            monitorInterval = args.monitor_interval,
+            recycleRSS = args.recycle_rss,
+            recycleCPU = args.recycle_cpu,
+            metricsPort = args.metrics_port,
+            metricsFile = args.metrics_file,
+            checkpointFile = args.checkpoint_file,
+            resume = args.resume,
+            updateBaselines = args.update_baselines,
+            profileFile = args.profile_file,
+            profileInterval = args.profile_interval,
+            sharePrefixes = args.share_prefixes,
+            resultsFile = args.results_file,
+        )
+
+        if not success:
+            self.logUtil.log("Error during test.", 'warning')
+            return 1
+
+        res = starter.getSummary()
+
+        return 1 if res['failedNumber'] > 0 else 0
@@ -1,5 +1,20 @@
-import json, os
+import json, os, ast, time, copy, queue, threading
+from concurrent.futures import ThreadPoolExecutor
 from ..Base.FunnyProcedure import FunnyProcedure
+from ..Base.BrowserStateStore import BrowserStateStore
+from ..Base.ResultCache import ResultCache
+from ..Base.ProcedureRegistry import ProcedureRegistry
+from ..Base.LoopSource import LoopSource
+from ..Base.Metrics import Metrics
+from ..Base.LoadReport import LoadReport
+from ..Base.Checkpoint import Checkpoint
+from ..Base.Profiler import Profiler
+from ..Base.PrefixTree import PrefixTree
+from ..Base.Benchmark import Benchmark
+from ..Base.ResultRecord import ResultRecord
+from ..Base.Revalidator import Revalidator
+from ..Base.Throttling import Throttling
+from ..Base.LeakCheck import LeakCheck
 from ..Log.TestLog import TestLog
 
 class JSONStarter:
@@ -7,10 +22,14 @@ class JSONStarter:
     JSON converter for converting json to Funny Test understanderable procedure function lists
     """
 
+    procedureTypes = ['stdProcedure', 'customProcedure', 'loop', 'callSubprocedure']
+    stdCommands = None
+
     def __init__(self, testCasePath, customProcedurePath = None):
         self.casePath = testCasePath
         self.customProcedurePath = customProcedurePath
         self.logUtil = TestLog()
+        self.summaries = {}
 
     def loadCases(self):
         """
@@ -18,6 +37,8 @@ class JSONStarter:
         """
 
         data = {}
+        self.funcList = data
+
         for jsonFileName in os.listdir(self.casePath):
             if jsonFileName.endswith(".json"):
                 with open(self.casePath + '/' + jsonFileName, 'r') as jsonFile:
@@ -25,15 +46,493 @@ class JSONStarter:
 
                     if runName not in data:
                         data[runName] = json.load(jsonFile)
-                        self.funcList = data
                     else:
                         self.logUtil.log("The test run - " + runName + " already exists.", "warning")
                         continue
 
-    def run(self, isHeadless = False, windowSize = "1920,1080"):
+    @classmethod
+    def getStdCommands(cls):
+        """
+        Get the names of the standard commands, FunnyTestBase.standardCommands.
+        They are read from the source of FunnyTestBase so that selenium does not need to be imported.
+
+        Return
+        ----------
+        list
+        The command names
+        """
+
+        if cls.stdCommands is None:
+            basePath = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Base', 'FunnyTestBase.py')
+
+            with open(basePath, 'r') as baseFile:
+                tree = ast.parse(baseFile.read())
+
+            commands = []
+
+            for node in tree.body:
+                if isinstance(node, ast.ClassDef) and node.name == 'FunnyTestBase':
+                    for item in node.body:
+                        if isinstance(item, ast.Assign) and any(isinstance(target, ast.Name) and target.id == 'standardCommands' for target in item.targets):
+                            commands = ast.literal_eval(item.value)
+
+            cls.stdCommands = commands
+
+        return cls.stdCommands
+
+    def validateCases(self):
+        """
+        Check the loaded json files for structural errors without starting a browser
+
+        Return
+        ----------
+        list
+        The error messages. Empty if all test runs are valid.
+        """
+
+        self.loadCases()
+        stdCommands = self.getStdCommands()
+        errors = []
+
+        for runName in self.funcList:
+            funcs = self.getProcedures(self.funcList[runName])
+
+            if not isinstance(funcs, list):
+                errors.append(runName + ": a test run must be a list of procedures or an object with a procedures list")
+                continue
+
+            if isinstance(self.funcList[runName], dict) and 'dataset' in self.funcList[runName]:
+                try:
+                    self.expandRun(runName)
+                except Exception as e:
+                    errors.append(runName + ": dataset can not be read: " + str(e))
+
+            try:
+                Throttling.getProfile(self.getRunThrottle(runName))
+            except ValueError as e:
+                errors.append(runName + ": " + str(e))
+
+            subprocedures = set(func['subprocedure'] for func in funcs if isinstance(func, dict) and 'subprocedure' in func)
+            ids = set()
+
+            for (idx, func) in enumerate(funcs):
+                where = runName + "[" + str(idx) + "]"
+
+                if not isinstance(func, dict):
+                    errors.append(where + ": a procedure must be an object")
+                    continue
+
+                missing = [key for key in ['type', 'id', 'command'] if key not in func]
+
+                if len(missing) > 0:
+                    errors.append(where + ": missing " + ', '.join(missing))
+                    continue
+
+                where = runName + "[" + str(idx) + "] " + str(func['id'])
+                procedureType = func['type']
+                command = func['command']
+                idKey = (func.get('subprocedure'), func['id'])
+
+                if idKey in ids:
+                    errors.append(where + ": duplicated procedure id")
+
+                ids.add(idKey)
+
+                if procedureType not in self.procedureTypes:
+                    errors.append(where + ": unknown type " + str(procedureType))
+                elif procedureType == 'stdProcedure' and command not in stdCommands:
+                    errors.append(where + ": unknown standard command " + str(command))
+                elif procedureType in ['loop', 'callSubprocedure'] and command not in subprocedures:
+                    errors.append(where + ": subprocedure " + str(command) + " does not exist")
+
+                if procedureType == 'loop' and len(func.get('params', [])) <= 0:
+                    errors.append(where + ": a loop needs the list to loop through as the first param")
+
+                if 'params' in func and not isinstance(func['params'], list):
+                    errors.append(where + ": params must be a list")
+
+                if 'repeat' in func:
+                    if procedureType not in ['stdProcedure', 'customProcedure', 'callSubprocedure']:
+                        errors.append(where + ": repeat is only supported by stdProcedure, customProcedure and callSubprocedure")
+                    else:
+                        try:
+                            Benchmark.getOptions(func['repeat'])
+                        except ValueError as e:
+                            errors.append(where + ": " + str(e))
+
+                if 'throttle' in func:
+                    try:
+                        Throttling.getProfile(func['throttle'])
+                    except ValueError as e:
+                        errors.append(where + ": " + str(e))
+
+                if 'leakCheck' in func:
+                    if procedureType != 'loop':
+                        errors.append(where + ": leakCheck is only supported by loop")
+                    else:
+                        try:
+                            LeakCheck.getOptions(func['leakCheck'])
+                        except ValueError as e:
+                            errors.append(where + ": " + str(e))
+
+        return errors
+
+    def listCases(self):
+        """
+        List the loaded test runs without starting a browser
+
+        Return
+        ----------
+        dict
+        The number of procedures of each test run
+        """
+
+        self.loadCases()
+
+        return dict((runName, len(self.getProcedures(self.funcList[runName]))) for runName in sorted(self.funcList))
+
+    def plan(self):
+        """
+        Print the procedures each test run would execute, with the called subprocedures expanded, without starting a browser
+
+        Return
+        ----------
+        dict
+        The planned procedure lines of each test run
+        """
+
+        self.loadCases()
+        plans = {}
+
+        for runName in sorted(self.funcList):
+            funcs = self.getProcedures(self.funcList[runName])
+            subprocedures = {}
+            lines = []
+
+            for func in funcs:
+                if 'subprocedure' in func:
+                    subprocedures.setdefault(func['subprocedure'], []).append(func)
+
+            self.planProcedures([func for func in funcs if 'subprocedure' not in func], subprocedures, '', lines, [])
+            plans[runName] = lines
+
+            self.logUtil.log("Test Run: " + runName)
+            self.logUtil.log("++++++++++++++++++++++++++++++")
+
+            for line in lines:
+                self.logUtil.log(line)
+
+            self.logUtil.log("")
+
+        return plans
+
+    def planProcedures(self, funcs, subprocedures, indent, lines, callStack):
+        """
+        Append the plan lines of a procedure list
+
+        Parameters
+        ----------
+        funcs : list
+            The procedures
+
+        subprocedures : dict
+            The procedures of each subprocedure
+
+        indent : string
+            The prefix of the lines
+
+        lines : list
+            The list the lines are appended to
+
+        callStack : list
+            The names of the subprocedures being expanded, to stop recursion
+        """
+
+        for func in funcs:
+            line = indent + str(func.get('id')) + ": " + str(func.get('type')) + " " + str(func.get('command'))
+
+            if 'params' in func:
+                line += " " + json.dumps(func['params'])
+
+            if 'condition' in func:
+                line += " if " + str(func['condition'])
+
+            lines.append(line)
+
+            command = func.get('command')
+
+            if func.get('type') in ['loop', 'callSubprocedure'] and command in subprocedures and command not in callStack:
+                self.planProcedures(subprocedures[command], subprocedures, indent + '    ', lines, callStack + [command])
+
+    def getProcedures(self, runDefinition):
+        """
+        Get the procedure list of a test run.
+        A json file is either the list of procedures or an object with `procedures` and an optional `dataset`.
+
+        Parameters
+        ----------
+        runDefinition : list | dict
+            The content of the json file
+
+        Return
+        ----------
+        list
+        The procedures
+        """
+
+        if isinstance(runDefinition, dict):
+            return runDefinition.get('procedures', [])
+
+        return runDefinition
+
+    def getRunThrottle(self, runName):
+        """
+        Get the throttling declared by a test run: `"throttle"` of a json file with an object
+
+        Parameters
+        ----------
+        runName : string
+            The test run name
+
+        Return
+        ----------
+        string | dict
+        The Throttling preset or profile, or None if the test run has none
+        """
+
+        runDefinition = self.funcList.get(runName)
+
+        if isinstance(runDefinition, dict):
+            return runDefinition.get('throttle')
+
+        return None
+
+    def expandRun(self, runName):
+        """
+        Expand a test run into its logical runs: one per dataset row, or the run itself if it has no dataset
+
+        Parameters
+        ----------
+        runName : string
+            The test run name
+
+        Return
+        ----------
+        list
+        The logical runs as (logical run name, procedures, dataset row or None)
+        """
+
+        runDefinition = self.funcList[runName]
+        funcs = self.getProcedures(runDefinition)
+
+        if not isinstance(runDefinition, dict) or 'dataset' not in runDefinition:
+            return [(runName, funcs, None)]
+
+        dataset = runDefinition['dataset']
+
+        if isinstance(dataset, str):
+            dataset = {'jsonl' if dataset.endswith('.jsonl') else 'csv': dataset}
+
+        nameField = dataset.get('nameField')
+        rows = list(LoopSource(None, self.casePath).open(dataset))
+        rowNames = [str(row[nameField]) if nameField is not None and nameField in row else str(idx) for (idx, row) in enumerate(rows)]
+        duplicates = set(rowName for rowName in rowNames if rowNames.count(rowName) > 1)
+
+        if len(duplicates) > 0:
+            # the logical runs would share their summaries, results and checkpoint records
+            self.logUtil.log("Dataset of " + runName + " has duplicate " + nameField + " values: " + ', '.join(sorted(duplicates)) + ". Their rows are named value#index.", 'warning')
+
+        runs = []
+
+        for (idx, row) in enumerate(rows):
+            rowName = rowNames[idx] + '#' + str(idx) if rowNames[idx] in duplicates else rowNames[idx]
+            runs.append((runName + '[' + rowName + ']', copy.deepcopy(funcs), row))
+
+        return runs
+
+    def createProcedure(self, options, funnyTestBase = None):
+        """
+        Create the FunnyProcedure for a logical run
+
+        Parameters
+        ----------
+        options : dict
+            The keyword arguments for FunnyProcedure collected by run()
+
+        funnyTestBase : object
+            An already running FunnyTestBase to use
+
+        Return
+        ----------
+        object
+        The FunnyProcedure
+        """
+
+        funnyProc = FunnyProcedure(funnyTestBase = funnyTestBase, **options)
+
+        if self.customProcedurePath is not None:
+            funnyProc.loadCustomProcedures(self.customProcedurePath)
+
+        return funnyProc
+
+    def executeRun(self, funnyProc, logicalRun, datasetName = None):
+        """
+        Execute a logical run
+
+        Parameters
+        ----------
+        funnyProc : object
+            The FunnyProcedure to execute it with
+
+        logicalRun : tuple
+            (logical run name, procedures, dataset row or None)
+
+        datasetName : string
+            The name of the test run declaring the dataset, if the logical run is a dataset row
+
+        Return
+        ----------
+        bool
+        Return True if no error.
+        Otherwise False
+        """
+
+        (runName, funcs, row) = logicalRun
+
+        if funnyProc.checkpoint is not None and funnyProc.checkpoint.isRunDone(runName):
+            self.logUtil.log("Test run " + runName + " was completed in a previous invocation. Skipped.", 'success')
+            funnyProc.getRunSummary(runName)['resumedRun'] = True
+            funnyProc.restoreCases(runName)
+
+            # the run still leaves the queue
+            if funnyProc.metrics is not None:
+                funnyProc.metrics.runStarted()
+                funnyProc.metrics.runFinished()
+
+            if funnyProc.prefixTree is not None:
+                funnyProc.prefixTree.finishRun(runName)
+
+            return True
+
+        if row is not None:
+            funnyProc.setDataRow(runName, row)
+            funnyProc.getRunSummary(runName)['dataset'] = datasetName
+
+        runThrottle = self.getRunThrottle(datasetName if datasetName is not None else runName)
+
+        if runThrottle is not None:
+            funnyProc.setRunThrottle(runName, runThrottle)
+
+        self.logUtil.log("Test Run: " + runName)
+        self.logUtil.log("++++++++++++++++++++++++++++++\n")
+
+        if funnyProc.metrics is not None:
+            funnyProc.metrics.runStarted()
+
+        try:
+            return funnyProc.procedure(funcs, runName)
+        finally:
+            if funnyProc.metrics is not None:
+                funnyProc.metrics.runFinished()
+
+            # the runs forking from this one stop waiting for fork points it did not reach
+            if funnyProc.prefixTree is not None:
+                funnyProc.prefixTree.finishRun(runName)
+
+    def run(self, isHeadless = False, windowSize = "1920,1080", stepTimeOut = None, runTimeBudget = None, stateFile = None, resultCacheFile = None, releaseResults = True, sessions = 1, daemonAddress = None, monitorInterval = None, recycleRSS = None, recycleCPU = None, metricsPort = None, metricsFile = None, checkpointFile = None, resume = False, updateBaselines = False, profileTemplate = None, profileFile = None, profileInterval = 0.01, sharePrefixes = False, startMode = "lazy", resultsFile = None, throttle = None, leakCheck = None):
         """
         Run the procedure according to loaded json file
 
+        Parameters
+        ----------
+        isHeadless : bool
+            set the browser to headless mode
+
+        windowSize : string
+            set the window size for headless mode
+
+        stepTimeOut : number
+            The default seconds a std/custom procedure may take before its browser session is killed and replaced
+
+        runTimeBudget : number
+            The seconds each run may take before its remaining procedures are skipped
+
+        stateFile : string
+            The json file to keep the browser states of `saveState` subprocedures in between invocations.
+            If None, the states are only shared between the runs of this call.
+
+        resultCacheFile : string
+            The file to keep the results of `cache` subprocedures in between invocations.
+            If None, the results are only shared between the runs of this call.
+
+        releaseResults : bool
+            Release each procedure result as soon as no later procedure of its run can reference it
+
+        sessions : int
+            The number of browser sessions running the (logical) runs in parallel.
+            With 1, the runs are executed one after another, each with a new browser.
+
+        daemonAddress : string
+            The "host:port" of a running BrowserDaemon (python3 -m FunnyTest daemon).
+            If set, the browsers are leased from its pool instead of being launched.
+
+        monitorInterval : number
+            The seconds between two samples of the RSS and CPU of each browser. Needs psutil. None disables the monitoring.
+
+        recycleRSS : number
+            The RSS in MB above which a browser session is recycled between two procedures, keeping its cookies and storages
+
+        recycleCPU : number
+            The mean CPU percent of the latest samples above which a browser session is recycled
+
+        metricsPort : int
+            Serve live metrics in the Prometheus text format on http://127.0.0.1:metricsPort/metrics during the call
+
+        metricsFile : string
+            The file the live metrics are written to every 5 seconds and at the end
+
+        checkpointFile : string
+            The file the completed procedures, loop iterations and runs are recorded in, with their results.
+            It is removed when every run is completed.
+
+        resume : bool
+            Continue from the checkpointFile of an interrupted invocation: completed runs, procedures and
+            loop iterations are skipped and their recorded results restored
+
+        updateBaselines : bool
+            Replace the baseline images of compareScreenshot with the new screenshots instead of comparing them
+
+        profileTemplate : string
+            The directory of a warm profile template (python3 -m FunnyTest warm-profile). Every browser starts
+            from a fresh clone of it, with the HTTP cache, service workers and code cache of the template.
+
+        profileFile : string
+            Profile the Python code of the procedures and write the samples of all runs to this file in the collapsed-stack format.
+            The summary lists the hottest functions.
+
+        profileInterval : number
+            The seconds between two profile samples
+
+        sharePrefixes : bool
+            Execute the leading procedures shared by several runs once. The other runs start from a copy of the
+            url, cookies, storages and results after them. Procedures with `"fork": false` are never shared.
+
+        startMode : string
+            When each browser is started: "lazy" before the first procedure needing it, so runs without such procedures
+            never start one, "background" in a thread while the run is prepared, or "eager" before the run
+
+        resultsFile : string
+            Record the resolved params, raw return and time of every validated step in this file (gzip compressed if it ends with .gz),
+            so the expectations can be checked again by revalidate() without a browser. Appended to with resume.
+
+        throttle : string | dict
+            Throttle the network and CPU of the browsers of the test runs without their own `"throttle"`: the name of a Throttling preset
+            (slow-3g, fast-3g, slow-4g, mobile) or {"latency": ms, "download": kbit/s, "upload": kbit/s, "cpu": slowdown factor}
+
+        leakCheck : bool | dict
+            Sample the JS heap size, DOM nodes and event listeners of the page after every top-level procedure and fail a run whose
+            metrics keep growing. True for the default thresholds, or the options of LeakCheck.getOptions.
+
         Return
         ----------
         bool
@@ -43,24 +542,492 @@ class JSONStarter:
         try:
             self.loadCases()
 
+            options = {
+                'isHeadLess': isHeadless,
+                'windowSize': windowSize,
+                'stepTimeOut': stepTimeOut,
+                'runTimeBudget': runTimeBudget,
+                'summaries': self.summaries,
+                'stateStore': BrowserStateStore(stateFile),
+                'resultCache': ResultCache(path = resultCacheFile),
+                'releaseResults': releaseResults,
+                'daemonAddress': daemonAddress,
+                'monitorInterval': monitorInterval,
+                'recycleRSS': recycleRSS,
+                'recycleCPU': recycleCPU,
+                'metrics': None,
+                'checkpoint': Checkpoint(checkpointFile, resume) if checkpointFile is not None else None,
+                'updateBaselines': updateBaselines,
+                'profileTemplate': profileTemplate,
+                'profiler': None,
+                'prefixTree': PrefixTree() if sharePrefixes else None,
+                'startMode': startMode,
+                'resultRecord': ResultRecord(resultsFile, resume) if resultsFile is not None else None,
+                'throttle': throttle,
+                'leakCheck': leakCheck,
+                'casePath': self.casePath,
+            }
+
+            logicalRuns = []
+
             for runName in self.funcList:
-                self.funnyProc = FunnyProcedure(isHeadless, windowSize)
+                for logicalRun in self.expandRun(runName):
+                    logicalRuns.append((logicalRun, runName if logicalRun[2] is not None else None))
 
-                if self.customProcedurePath is not None:
-                    self.funnyProc.loadCustomProcedures(self.customProcedurePath)
+                    if options['prefixTree'] is not None:
+                        # the procedures of runs with different throttling are timed differently
+                        runThrottle = self.getRunThrottle(runName)
+                        options['prefixTree'].add(logicalRun[0], logicalRun[1], Throttling.getProfile(runThrottle if runThrottle is not None else throttle))
 
-                funcs = self.funcList[runName]
-                self.logUtil.log("Test Run: " + runName)
-                self.logUtil.log("++++++++++++++++++++++++++++++\n")
+            if metricsPort is not None or metricsFile is not None:
+                options['metrics'] = Metrics()
+                options['metrics'].setQueueDepth(len(logicalRuns))
+                options['metrics'].start(metricsPort, metricsFile)
 
-                if not self.funnyProc.procedure(funcs, runName):
-                    return False
-                
-            return True
+            if profileFile is not None:
+                options['profiler'] = Profiler(profileInterval)
+                options['profiler'].start()
+
+            try:
+                if sessions > 1:
+                    success = self.runParallel(logicalRuns, sessions, options)
+                else:
+                    success = True
+
+                    for (logicalRun, datasetName) in logicalRuns:
+                        self.funnyProc = self.createProcedure(options)
+
+                        if not self.executeRun(self.funnyProc, logicalRun, datasetName):
+                            success = False
+                            break
+
+                if success and options['checkpoint'] is not None:
+                    options['checkpoint'].remove()
+
+                return success
+            finally:
+                options['resultCache'].save()
+
+                if options['metrics'] is not None:
+                    options['metrics'].stop()
+
+                if options['profiler'] is not None:
+                    options['profiler'].stop()
+                    options['profiler'].write(profileFile)
+
+                if options['resultRecord'] is not None:
+                    options['resultRecord'].close()
         except Exception as e:
             self.logUtil.log(e)
             return False
 
+    def revalidate(self, resultsFile, throttle = None):
+        """
+        Evaluate the current expectations and conditions of the loaded json files against the steps recorded by run(resultsFile = ...),
+        without starting a browser
+
+        Parameters
+        ----------
+        resultsFile : string
+            The results file
+
+        throttle : string | dict
+            The Throttling preset or profile the test runs without their own `throttle` were recorded with, as in run()
+
+        Return
+        ----------
+        dict
+        {'counts': the number of steps by outcome (passing, failing, newlyPassing, newlyFailing, skipped, removed, unverifiable),
+        'failing': the ids of the failing steps of each run}
+        """
+
+        self.loadCases()
+        records = ResultRecord.load(resultsFile)
+        revalidator = Revalidator(throttle)
+        counts = {}
+        failing = {}
+        newlyFailing = {}
+        newlyPassing = {}
+
+        for (runName, record) in records.items():
+            # the runs of a dataset are recorded as `testRun[row]`
+            testRun = runName if runName in self.funcList else runName.rsplit('[', 1)[0]
+
+            if testRun not in self.funcList:
+                self.logUtil.log("Test run " + testRun + " no longer exists. Its " + str(len(record['steps'])) + " recorded steps are skipped.", 'warning')
+                counts['removed'] = counts.get('removed', 0) + len(record['steps'])
+                continue
+
+            runThrottle = self.getRunThrottle(testRun)
+
+            if runThrottle is not None:
+                revalidator.setRunThrottle(runName, runThrottle)
+
+            outcome = revalidator.revalidate(runName, self.getProcedures(self.funcList[testRun]), record)
+
+            for (name, ids) in outcome.items():
+                counts[name] = counts.get(name, 0) + len(ids)
+
+            if len(outcome['failing']) > 0:
+                failing[runName] = outcome['failing']
+
+            if len(outcome['newlyFailing']) > 0:
+                newlyFailing[runName] = outcome['newlyFailing']
+
+            if len(outcome['newlyPassing']) > 0:
+                newlyPassing[runName] = outcome['newlyPassing']
+
+        self.logUtil.log("++++++++++++++++++++++++++++++")
+        self.logUtil.log("Revalidation of " + resultsFile + ": " + str(len(records)) + " recorded runs")
+        self.logUtil.log("++++++++++++++++++++++++++++++")
+
+        for name in ['passing', 'failing', 'newlyPassing', 'newlyFailing', 'skipped', 'removed', 'unverifiable']:
+            self.logUtil.log(name + ": " + str(counts.get(name, 0)))
+
+        for (runName, ids) in newlyFailing.items():
+            self.logUtil.log("Newly failing in " + runName + ": " + ', '.join(ids), 'warning')
+
+        for (runName, ids) in newlyPassing.items():
+            self.logUtil.log("Newly passing in " + runName + ": " + ', '.join(ids), 'success')
+
+        return {'counts': counts, 'failing': failing}
+
+    def runParallel(self, logicalRuns, sessions, options):
+        """
+        Execute logical runs on a pool of browser sessions.
+        A session is started when no idle one is available and reused (after a reset) for the next runs.
+
+        Parameters
+        ----------
+        logicalRuns : list
+            The (logical run, dataset name) pairs
+
+        sessions : int
+            The maximum number of browser sessions
+
+        options : dict
+            The keyword arguments for FunnyProcedure
+
+        Return
+        ----------
+        bool
+        Return True if no run had an error.
+        Otherwise False
+        """
+
+        from ..Base.FunnyTestBase import FunnyTestBase
+
+        idleSessions = queue.Queue()
+        startedSessions = []
+        lock = threading.Lock()
+
+        def executeOnSession(logicalRun, datasetName):
+            try:
+                session = idleSessions.get_nowait()
+            except queue.Empty:
+                session = FunnyTestBase(options['isHeadLess'], options['windowSize'], options['daemonAddress'], options['profileTemplate'], startMode = options['startMode'])
+
+                with lock:
+                    startedSessions.append(session)
+
+            try:
+                # a session closed by the previous run is started again according to the start mode
+                session.autoStart()
+
+                funnyProc = self.createProcedure(options, session)
+
+                with lock:
+                    self.funnyProc = funnyProc
+
+                return self.executeRun(funnyProc, logicalRun, datasetName)
+            finally:
+                idleSessions.put(session)
+
+        try:
+            with ThreadPoolExecutor(max_workers = sessions) as executor:
+                futures = [executor.submit(executeOnSession, logicalRun, datasetName) for (logicalRun, datasetName) in logicalRuns]
+                results = []
+
+                for future in futures:
+                    try:
+                        results.append(future.result())
+                    except Exception as e:
+                        self.logUtil.log(e)
+                        results.append(False)
+
+            return all(results)
+        finally:
+            for session in startedSessions:
+                session.stopMonitor()
+                session.close()
+
+    def load(self, runName, users = 10, rampUp = 0, hold = 60, thinkTime = 0, windowSize = "1920,1080", stepTimeOut = None, daemonAddress = None, metricsPort = None, metricsFile = None, profileTemplate = None, startMode = "lazy", throttle = None):
+        """
+        Replay a test run as concurrent virtual users, each on its own headless browser session.
+        The users are started evenly over the ramp-up time and repeat the test run until the hold time is over
+        (an iteration in progress is finished). A test run with a dataset cycles through its rows.
+        Reports the throughput and the p50/p95/p99 latency of each step across all users, and the harness overhead.
+
+        Parameters
+        ----------
+        runName : string
+            The test run to replay
+
+        users : int
+            The number of virtual users
+
+        rampUp : number
+            The seconds over which the users are started
+
+        hold : number
+            The seconds all users keep running after the ramp-up
+
+        thinkTime : number
+            The seconds each user pauses after every top-level procedure
+
+        windowSize, stepTimeOut, daemonAddress, metricsPort, metricsFile, profileTemplate, startMode, throttle :
+            The same as run()
+
+        Return
+        ----------
+        dict
+        The load test report, or None if the test run does not exist
+
+        Raises
+        ----------
+        ValueError
+        If there is not at least one user
+        """
+
+        from ..Base.FunnyTestBase import FunnyTestBase
+
+        if not isinstance(users, int) or isinstance(users, bool) or users < 1:
+            raise ValueError("users must be an integer of at least 1")
+
+        self.loadCases()
+
+        if runName not in self.funcList:
+            self.logUtil.log("Test run " + runName + " does not exist.", 'warning')
+            return None
+
+        logicalRuns = self.expandRun(runName)
+        runThrottle = self.getRunThrottle(runName)
+        report = LoadReport()
+        metrics = None
+
+        if metricsPort is not None or metricsFile is not None:
+            metrics = Metrics()
+            metrics.start(metricsPort, metricsFile)
+
+        options = {
+            'stepTimeOut': stepTimeOut,
+            'stateStore': BrowserStateStore(),
+            'resultCache': ResultCache(),
+            'metrics': metrics,
+            'thinkTime': thinkTime,
+            'stepRecorder': report,
+            'throttle': runThrottle if runThrottle is not None else throttle,
+            'casePath': self.casePath,
+        }
+
+        report.start()
+        endTime = time.monotonic() + rampUp + hold
+
+        def virtualUser(userIdx):
+            time.sleep(userIdx * rampUp / users)
+
+            session = FunnyTestBase(True, windowSize, daemonAddress, profileTemplate, startMode = startMode)
+            iteration = 0
+
+            try:
+                while time.monotonic() < endTime:
+                    (logicalName, funcs, row) = logicalRuns[(userIdx + iteration) % len(logicalRuns)]
+                    iterationName = logicalName + '#' + str(userIdx) + '.' + str(iteration)
+
+                    # the steps are recorded by the report, the summary of the iteration is dropped with it
+                    funnyProc = self.createProcedure(dict(options, summaries = {}), session)
+                    iterationStart = time.monotonic()
+                    success = self.executeRun(funnyProc, (iterationName, copy.deepcopy(funcs), row))
+
+                    report.addIteration(iterationName, time.monotonic() - iterationStart, success, funnyProc.getRunSummary(iterationName).get('thinkTime'))
+                    iteration += 1
+            finally:
+                session.stopMonitor()
+                session.close()
+
+        try:
+            with ThreadPoolExecutor(max_workers = users) as executor:
+                for future in [executor.submit(virtualUser, userIdx) for userIdx in range(users)]:
+                    try:
+                        future.result()
+                    except Exception as e:
+                        self.logUtil.log(e)
+        finally:
+            report.finish()
+
+            if metrics is not None:
+                metrics.stop()
+
+        summary = report.summarize()
+        report.print(summary)
+
+        return summary
+
+    def getCaseMtimes(self):
+        """
+        Get the modification times of the json files
+
+        Return
+        ----------
+        dict
+        The mtime of each test run
+        """
+
+        mtimes = {}
+
+        for jsonFileName in os.listdir(self.casePath):
+            if jsonFileName.endswith(".json"):
+                try:
+                    mtimes[os.path.splitext(jsonFileName)[0]] = os.stat(self.casePath + '/' + jsonFileName).st_mtime
+                except OSError:
+                    # removed since it was listed
+                    continue
+
+        return mtimes
+
+    def getCustomCommands(self, funcs):
+        """
+        Get the custom procedure functions a test run uses
+
+        Parameters
+        ----------
+        funcs : list
+            The procedures of the test run
+
+        Return
+        ----------
+        set
+        The function names
+        """
+
+        if not isinstance(funcs, list):
+            return set()
+
+        return set(func.get('command') for func in funcs if isinstance(func, dict) and func.get('type') == 'customProcedure')
+
+    def watch(self, isHeadless = False, windowSize = "1920,1080", stepTimeOut = None, runTimeBudget = None, stateFile = None, resultCacheFile = None, interval = 1, daemonAddress = None, monitorInterval = None, recycleRSS = None, recycleCPU = None, metricsPort = None, metricsFile = None, profileTemplate = None, startMode = "lazy", throttle = None, leakCheck = None):
+        """
+        Run all test runs, then keep watching the json files and the custom procedure directory
+        and re-run only the test runs whose json file or used custom procedure modules changed.
+        The browser is started once and reused, changed custom modules are reloaded in place.
+        Stops on KeyboardInterrupt (Ctrl+C).
+
+        Parameters
+        ----------
+        isHeadless, windowSize, stepTimeOut, runTimeBudget, stateFile, resultCacheFile, daemonAddress, monitorInterval, recycleRSS, recycleCPU, metricsPort, metricsFile, profileTemplate, startMode, throttle, leakCheck :
+            The same as run()
+
+        interval : number
+            The seconds between two checks for changes
+        """
+
+        from ..Base.FunnyTestBase import FunnyTestBase
+
+        funnyTestBase = FunnyTestBase(isHeadless, windowSize, daemonAddress, profileTemplate, startMode = startMode)
+        stateStore = BrowserStateStore(stateFile)
+        resultCache = ResultCache(path = resultCacheFile)
+        registry = None
+        caseMtimes = {}
+        self.funcList = {}
+        metrics = None
+
+        if metricsPort is not None or metricsFile is not None:
+            metrics = Metrics()
+            metrics.start(metricsPort, metricsFile)
+
+        if self.customProcedurePath is not None:
+            registry = ProcedureRegistry.getRegistry(self.customProcedurePath)
+
+        try:
+            while True:
+                runNames = set()
+                mtimes = self.getCaseMtimes()
+
+                for runName in list(self.funcList):
+                    if runName not in mtimes:
+                        del self.funcList[runName]
+
+                for (runName, mtime) in mtimes.items():
+                    if caseMtimes.get(runName) != mtime:
+                        try:
+                            with open(self.casePath + '/' + runName + '.json', 'r') as jsonFile:
+                                self.funcList[runName] = json.load(jsonFile)
+
+                            runNames.add(runName)
+                        except (ValueError, OSError) as e:
+                            self.logUtil.log("Test run " + runName + " not loaded: " + str(e), 'warning')
+
+                caseMtimes = mtimes
+
+                if registry is not None:
+                    try:
+                        changedModules = set(registry.refresh())
+                    except Exception as e:
+                        self.logUtil.log("Custom procedures not reloaded: " + str(e), 'warning')
+                        changedModules = set()
+
+                    if len(changedModules) > 0:
+                        for runName in self.funcList:
+                            if any(registry.getSource(command) in changedModules for command in self.getCustomCommands(self.getProcedures(self.funcList[runName]))):
+                                runNames.add(runName)
+
+                if len(runNames) > 0:
+                    self.summaries = {}
+
+                    options = {
+                        'stepTimeOut': stepTimeOut,
+                        'runTimeBudget': runTimeBudget,
+                        'summaries': self.summaries,
+                        'stateStore': stateStore,
+                        'resultCache': resultCache,
+                        'monitorInterval': monitorInterval,
+                        'recycleRSS': recycleRSS,
+                        'recycleCPU': recycleCPU,
+                        'metrics': metrics,
+                        'throttle': throttle,
+                        'leakCheck': leakCheck,
+                        'casePath': self.casePath,
+                    }
+
+                    executed = False
+
+                    for runName in sorted(runNames):
+                        # a broken test run (e.g. a missing dataset) is reported and waits for its next change
+                        try:
+                            for logicalRun in self.expandRun(runName):
+                                self.funnyProc = self.createProcedure(options, funnyTestBase)
+                                executed = True
+                                self.executeRun(self.funnyProc, copy.deepcopy(logicalRun), runName if logicalRun[2] is not None else None)
+                        except Exception as e:
+                            self.logUtil.log("Test run " + runName + " not executed: " + str(e), 'warning')
+
+                    if executed:
+                        self.funnyProc.summary()
+
+                    self.logUtil.log("\nWatching " + self.casePath + " for changes. Press Ctrl+C to stop.\n")
+
+                time.sleep(interval)
+
+        except KeyboardInterrupt:
+            self.logUtil.log("Watch stopped.")
+        finally:
+            resultCache.save()
+            funnyTestBase.stopMonitor()
+            funnyTestBase.close()
+
+            if metrics is not None:
+                metrics.stop()
+
     def getSummary(self):
         """
         Get the summary info of the whole test.
@@ -0,0 +1,4 @@
+import sys
+from .Starter.CommandLine import CommandLine
+
+sys.exit(CommandLine().main())